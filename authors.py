@@ -0,0 +1,117 @@
+import sql_queries
+
+
+
+# Metadata key recording that the 'authors' and 'book_authors' tables ...
+# ...have been populated from the 'books' table
+INDEX_KEY = "authors_index"
+
+# Separator of the authors in the Author column, e.g. ...
+# ...'J.K. Rowling-Mary GrandPré'
+SEPARATOR = "-"
+
+# Number of records read at once when the tables are rebuilt
+BATCH_SIZE = 10_000
+
+
+
+def split_authors(author):
+    """Function to split the Author column of a record into the list of its
+    distinct author names, in the order they are credited. Names are
+    separated by hyphens in books.csv, so hyphenated names are split too.
+    """
+    if not author:
+        return []
+    names, keys = [], set()
+    for name in str(author).split(SEPARATOR):
+        name = " ".join(name.split())
+        # Whitespace is already collapsed, so the key is the folded name
+        key = name.casefold()
+        if name and key not in keys:
+            keys.add(key)
+            names.append(name)
+    return names
+
+
+def name_key(name):
+    """Function to return the case-folded key identifying an author name."""
+    return " ".join(name.casefold().split())
+
+
+def is_built(cur):
+    """Function to check whether the author tables have been populated, in
+    which case every edit of the 'books' table must be applied to them.
+    """
+    cur.execute(sql_queries.SELECT_METADATA)
+    return dict(cur.fetchall()).get(INDEX_KEY) == "1"
+
+
+def link_authors(cur, records, author_ids=None):
+    """Function to link (ID, Author) records to their authors, adding the
+    authors not known yet. author_ids optionally caches name key -> ID
+    across calls, e.g. while rebuilding the tables.
+    """
+    if author_ids is None:
+        author_ids = {}
+    links = []
+    for book_id, author in records:
+        for position, name in enumerate(split_authors(author)):
+            key = name_key(name)
+            author_id = author_ids.get(key)
+            if author_id is None:
+                row = cur.execute(sql_queries.SELECT_AUTHOR_ID,
+                                  (key,)).fetchone()
+                if row is None:
+                    cur.execute(sql_queries.INSERT_AUTHOR, (name, key))
+                    author_id = cur.lastrowid
+                else:
+                    author_id = row[0]
+                author_ids[key] = author_id
+            links.append((book_id, author_id, position))
+    cur.executemany(sql_queries.INSERT_BOOK_AUTHOR, links)
+
+
+def unlink_authors(cur, book_id):
+    """Function to unlink a book from its authors, e.g. before it is updated
+    or deleted, dropping the authors left without any book.
+    """
+    author_ids = [row[0] for row in cur.execute(
+        sql_queries.SELECT_BOOK_AUTHOR_IDS, (book_id,)).fetchall()]
+    cur.execute(sql_queries.DELETE_BOOK_AUTHORS, (book_id,))
+    cur.executemany(sql_queries.DELETE_UNUSED_AUTHOR,
+                    ((author_id, author_id) for author_id in author_ids))
+
+
+def rebuild(cur):
+    """Function to repopulate the author tables from every record of the
+    'books' table and mark them as built. It runs inside the caller's
+    transaction, e.g. right after a bulk load.
+    """
+    for statement in sql_queries.CLEAR_AUTHORS:
+        cur.execute(statement)
+    author_ids = {}
+    read_cur = cur.connection.execute(sql_queries.SELECT_IDS_AUTHORS_AFTER,
+                                      (0,))
+    while True:
+        records = read_cur.fetchmany(BATCH_SIZE)
+        if not records:
+            break
+        link_authors(cur, records, author_ids)
+    cur.execute(sql_queries.UPSERT_METADATA, (INDEX_KEY, "1"))
+
+
+def ensure_index(conn):
+    """Function to make sure the author tables are populated, e.g. in a
+    database created before they existed.
+    """
+    cur = conn.cursor()
+    if not is_built(cur):
+        with conn:
+            rebuild(cur)
+
+
+def by_author_conditions(name):
+    """Function to build the SQL conditions and values selecting every book
+    by the author with the given name, through the author indexes.
+    """
+    return (sql_queries.BY_AUTHOR_CONDITION,), (name_key(name),)
@@ -0,0 +1,143 @@
+import collections
+import csv
+import itertools
+import json
+import os
+import search
+import ingest
+
+
+
+# Operations of a batch file, upsert being the default
+UPSERT = "upsert"
+DELETE = "delete"
+OPERATIONS = (UPSERT, DELETE)
+
+# Number of rows of a batch file applied in each transaction
+CHUNK_SIZE = 5_000
+
+# Lowest and highest valid rating
+MIN_RATING = 0.0
+MAX_RATING = 5.0
+
+# Validated row of a batch file. record_id or isbn is the key of the ...
+# ...records it applies to; the fields left as None are not changed.
+Operation = collections.namedtuple(
+    "Operation", ["kind", "record_id", "isbn", "title", "author", "rating"])
+
+
+
+def clean_value(value):
+    """Function to strip a value read from a batch file, an empty value
+    being turned into None.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def parse_operation(row):
+    """Function to validate a row of a batch file, a dictionary keyed on
+    the lower-case column names (op, id, isbn, title, author, rating).
+    Values are cleaned like the rows of the CSV file by ingest.clean_row,
+    e.g. the ISBN normalized, so that a record is stored the same way
+    whichever path wrote it. Returns an Operation, or raises ValueError
+    describing why the row is invalid.
+    """
+    row = {str(key).strip().lower(): clean_value(value)
+           for key, value in row.items() if key is not None}
+    kind = (row.get("op") or UPSERT).lower()
+    if kind not in OPERATIONS:
+        raise ValueError(f"unknown operation {kind!r}, expected one of "
+                         f"{', '.join(OPERATIONS)}")
+
+    record_id = row.get("id")
+    if record_id is not None:
+        try:
+            record_id = int(record_id)
+        except ValueError:
+            raise ValueError(f"invalid ID {record_id!r}") from None
+        if record_id <= 0:
+            raise ValueError(f"invalid ID {record_id}")
+    isbn = row.get("isbn")
+    if record_id is None and (isbn is None or not search.normalize_isbn(isbn)):
+        raise ValueError("an ID or an ISBN is required")
+
+    rating = row.get("rating")
+    if rating is not None:
+        try:
+            rating = float(rating)
+        except ValueError:
+            raise ValueError(f"invalid rating {rating!r}") from None
+        if not MIN_RATING <= rating <= MAX_RATING:
+            raise ValueError(f"rating {rating} is not between {MIN_RATING} "
+                             f"and {MAX_RATING}")
+    title, author, rating, isbn = ingest.clean_row(
+        row.get("title"), row.get("author"), rating, isbn)
+    return Operation(kind, record_id, isbn, title, author, rating)
+
+
+def read_rows(in_file, path):
+    """Generator function to stream the rows of a CSV file with a header
+    row, or of a JSON-lines file, as (line number, dictionary) pairs. A
+    line which is not valid JSON is yielded with the error as its row.
+    """
+    if path.lower().endswith((".jsonl", ".json")):
+        for line_number, line in enumerate(in_file, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as error:
+                yield line_number, ValueError(f"invalid JSON: {error}")
+                continue
+            if not isinstance(row, dict):
+                row = ValueError("a JSON object is expected")
+            yield line_number, row
+    else:
+        reader = csv.DictReader(in_file)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def apply_file(store, path, chunk_size=CHUNK_SIZE, progress=None):
+    """Function to apply a CSV or JSON-lines batch file of upserts and
+    deletes to the store, chunk_size rows per transaction, with
+    executemany. Invalid rows are reported, with their line number,
+    without aborting the batch.
+    progress, if given, is called after each chunk with the report so
+    far and the fraction of the file read.
+    Returns the report: the number of rows read, of records inserted,
+    updated and deleted, and the list of errors.
+    """
+    report = {"rows": 0, "inserted": 0, "updated": 0, "deleted": 0,
+              "errors": []}
+    with open(path, newline="", encoding="utf-8") as in_file:
+        size = os.path.getsize(path) or 1
+        rows = read_rows(in_file, path)
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                break
+            operations = []
+            for line_number, row in chunk:
+                try:
+                    if isinstance(row, ValueError):
+                        raise row
+                    operations.append((line_number, parse_operation(row)))
+                except ValueError as error:
+                    report["errors"].append({"line": line_number,
+                                             "error": str(error)})
+            counts, errors = store.apply_operations(operations)
+            store.commit()
+            for name, count in counts.items():
+                report[name] += count
+            report["errors"].extend({"line": line_number, "error": error}
+                                    for line_number, error in errors)
+            report["rows"] += len(chunk)
+            if progress is not None:
+                # The buffered position runs slightly ahead of the rows read
+                progress(report, min(in_file.buffer.tell() / size, 1.0))
+    report["errors"].sort(key=lambda error: error["line"])
+    return report
@@ -0,0 +1,3 @@
+"""Benchmarks for the Book Search Engine. Run them from the repository root,
+e.g. ``python -m benchmarks.bench_fts``.
+"""
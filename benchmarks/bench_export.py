@@ -0,0 +1,79 @@
+"""Benchmark of the streaming export: throughput and peak memory of a
+full table export to each format at several catalog sizes. Each export
+runs in a fresh process, so that its peak resident memory shows whether
+memory stays flat as the catalog grows.
+
+Usage: python -m benchmarks.bench_export [--sizes 100000 1000000]
+       [--formats csv jsonl parquet]
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import export
+from book_store import BookStore
+from query_cache import QueryCache
+from benchmarks import synthetic
+
+
+
+def run_export(db_path, path, export_format, results):
+    """Function to export every record of the database to path, putting
+    the export report, with the peak resident memory of the process in
+    megabytes, on the results queue.
+    """
+    store = BookStore(db_path, cache=QueryCache(max_entries=0))
+    try:
+        report = export.export(store.iter_batches(), path, export_format)
+    except ImportError as error:
+        report = {"error": str(error)}
+    store.close()
+    # ru_maxrss is in kilobytes on Linux
+    report["max_rss_mb"] = resource.getrusage(
+        resource.RUSAGE_SELF).ru_maxrss / 1024
+    results.put(report)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[100_000, 1_000_000])
+    parser.add_argument("--formats", nargs="+", default=["csv", "jsonl",
+                                                         "parquet"],
+                        choices=sorted(export.WRITERS))
+    args = parser.parse_args()
+
+    # Spawned processes do not inherit the memory of this one
+    context = multiprocessing.get_context("spawn")
+    print(f"{'records':>10} {'format':>8} {'records/s':>12} {'seconds':>8} "
+          f"{'MB':>8} {'peak RSS MB':>12}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in args.sizes:
+            db_path = os.path.join(tmp_dir, f"books_{size}.db")
+            synthetic.create_catalog(db_path, size).close()
+            for export_format in args.formats:
+                path = os.path.join(tmp_dir, f"export.{export_format}")
+                results = context.Queue()
+                process = context.Process(
+                    target=run_export,
+                    args=(db_path, path, export_format, results))
+                process.start()
+                report = results.get()
+                process.join()
+                if "error" in report:
+                    print(f"{size:>10,} {export_format:>8} "
+                          f"{report['error']}")
+                    continue
+                print(f"{size:>10,} {export_format:>8} "
+                      f"{report['records_per_second']:>12,} "
+                      f"{report['seconds']:>8.2f} "
+                      f"{os.path.getsize(path) / 2**20:>8.1f} "
+                      f"{report['max_rss_mb']:>12.1f}")
+                os.remove(path)
+            os.remove(db_path)
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Benchmark comparing the LIKE scan with the token and trigram full-text
+index paths of the search, at several catalog sizes.
+
+Usage: python -m benchmarks.bench_fts [--sizes 10000 100000 1000000]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import search
+from benchmarks import synthetic
+
+
+
+# (title, author) searches timed at every catalog size
+QUERIES = [
+    ("harry", ""),
+    ("the lord", ""),
+    ("", "rowling"),
+    ("history", "smith"),
+]
+
+# Number of times each search is repeated
+REPEAT = 5
+
+
+
+def time_search(conn, search_mode, title, author):
+    """Function to return the median time in milliseconds taken to run
+    and fetch a search, together with the number of matching records.
+    """
+    conditions, values = search.build_search_conditions(
+        title, author, "", "", search_mode)
+    query = search.build_search_query(conditions)
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        rows = conn.execute(query, values).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'size':>10} {'mode':>8} {'query':>24} {'rows':>8} {'ms':>10}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in args.sizes:
+            db_path = os.path.join(tmp_dir, f"books_{size}.db")
+            conn = synthetic.create_catalog(db_path, size)
+            for search_mode in (search.LIKE_MODE, search.TOKEN_MODE,
+                                search.TRIGRAM_MODE):
+                search_mode = search.ensure_fts_index(conn, search_mode)
+                for title, author in QUERIES:
+                    elapsed, row_count = time_search(
+                        conn, search_mode, title, author)
+                    label = f"{title}|{author}"
+                    print(f"{size:>10} {search_mode:>8} {label:>24} "
+                          f"{row_count:>8} {elapsed:>10.2f}")
+            conn.close()
+
+
+
+if __name__ == "__main__":
+    main()
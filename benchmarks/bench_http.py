@@ -0,0 +1,157 @@
+"""Load test of the HTTP service: concurrent keep-alive clients send a mix
+of searches and edits, and the latency percentiles and throughput are
+reported.
+
+Usage: python -m benchmarks.bench_http [--size 100000] [--clients 16]
+       [--requests 5000] [--writes 0.05] [--pool-size 4]
+       [--url http://127.0.0.1:8080]
+Without --url, the service is started in-process on a synthetic catalog.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from urllib.parse import urlsplit, urlencode
+from http_service import BookService
+from benchmarks import synthetic
+
+
+
+# Searches sent by the clients, as query parameters
+SEARCHES = [
+    {"title": "the"},
+    {"title": "love", "rating": ">=4"},
+    {"author": "king"},
+    {"rating": "3.5-4"},
+    {"isbn": "12"},
+    {"title": "war", "author": "an"},
+    {},
+]
+
+
+
+def percentile(latencies, fraction):
+    """Function to return the latency below which the given fraction of the
+    sorted latencies fall.
+    """
+    index = min(int(len(latencies) * fraction), len(latencies) - 1)
+    return latencies[index]
+
+
+async def request(reader, writer, method, target, payload=None):
+    """Function to send one request on a kept-alive connection and read the
+    response. Returns the status code.
+    """
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(
+        f"{method} {target} HTTP/1.1\r\nHost: localhost\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def client(host, port, count, write_ratio, max_id, seed, latencies,
+                 errors):
+    """Function to send count requests one after the other over a single
+    keep-alive connection, recording the latency of each one.
+    """
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    for _ in range(count):
+        if rng.random() < write_ratio:
+            record_id = rng.randint(1, max_id)
+            method, target = "PUT", f"/books/{record_id}"
+            payload = {"title": f"Title {record_id}", "author": "Author",
+                       "rating": round(rng.uniform(0, 5), 2),
+                       "isbn": str(record_id)}
+        else:
+            method, payload = "GET", None
+            target = "/books?" + urlencode(rng.choice(SEARCHES))
+        start = time.perf_counter()
+        status = await request(reader, writer, method, target, payload)
+        latencies.append(time.perf_counter() - start)
+        if status >= 400 and status != 404:
+            errors.append(status)
+    writer.close()
+
+
+async def load_test(host, port, clients, requests, write_ratio, max_id):
+    """Function to run the clients concurrently and print the latency
+    percentiles and the throughput.
+    """
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        client(host, port, requests // clients, write_ratio, max_id, seed,
+               latencies, errors)
+        for seed in range(clients)
+    ))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(f"{len(latencies)} requests from {clients} clients "
+          f"in {elapsed:.2f} s: {len(latencies) / elapsed:,.0f} QPS")
+    print(f"latency p50 {percentile(latencies, 0.50) * 1000:.2f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.2f} ms, "
+          f"mean {statistics.mean(latencies) * 1000:.2f} ms, "
+          f"max {latencies[-1] * 1000:.2f} ms")
+    if errors:
+        print(f"{len(errors)} failed requests")
+
+
+async def run_in_process(db_path, args):
+    """Function to start the service on db_path, load test it and close
+    it.
+    """
+    service = BookService(db_path, pool_size=args.pool_size)
+    server = await service.start("127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        await load_test("127.0.0.1", port, args.clients, args.requests,
+                        args.writes, args.size)
+    finally:
+        await service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=100_000,
+                        help="synthetic catalog size, or the highest ID "
+                             "edited with --url")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=5_000)
+    parser.add_argument("--writes", type=float, default=0.05,
+                        help="fraction of the requests that are edits")
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--url", default=None,
+                        help="load test a running service instead")
+    args = parser.parse_args()
+
+    if args.url:
+        url = urlsplit(args.url)
+        asyncio.run(load_test(url.hostname, url.port or 80, args.clients,
+                              args.requests, args.writes, args.size))
+        return
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "books.db")
+        synthetic.create_catalog(db_path, args.size).close()
+        asyncio.run(run_in_process(db_path, args))
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Benchmark of the ingest throughput against the number of worker
+processes parsing the CSV file. For each worker count, the parse stage is
+timed alone, then the full load including the single SQLite writer, so
+that the curve shows where the writer becomes the bottleneck.
+
+Usage: python -m benchmarks.bench_ingest [--size 1000000]
+       [--workers 1 2 4 8] [--spark]
+"""
+import argparse
+import os
+import tempfile
+import time
+import ingest
+from book_store import BookStore
+from query_cache import QueryCache
+from benchmarks import synthetic
+
+
+
+def default_workers():
+    """Function to return the worker counts timed by default: powers of two
+    up to the number of cores, and the number of cores itself.
+    """
+    cores = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cores:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cores:
+        counts.append(cores)
+    return counts
+
+
+def time_parse(csv_path, workers):
+    """Function to return the seconds taken to parse and validate the
+    whole CSV file with the given number of workers, without inserting
+    anything.
+    """
+    start = time.perf_counter()
+    for _ in ingest.iter_csv_chunks(csv_path, workers):
+        pass
+    return time.perf_counter() - start
+
+
+def time_load(tmp_dir, csv_path, workers=1, spark=False):
+    """Function to return the seconds taken to load the CSV file into a new
+    database, full-text and author indexes included.
+    """
+    db_path = os.path.join(tmp_dir, "ingest.db")
+    store = BookStore(db_path, cache=QueryCache(max_entries=0))
+    start = time.perf_counter()
+    store.reset(force=True, csv_path=csv_path, workers=workers, spark=spark)
+    elapsed = time.perf_counter() - start
+    store.close()
+    os.remove(db_path)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=None,
+                        help="worker counts to time (default: powers of "
+                             "two up to the number of cores)")
+    parser.add_argument("--spark", action="store_true",
+                        help="also time the Spark ingest path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, "books.csv")
+        synthetic.write_csv(csv_path, args.size)
+        print(f"{'workers':>8} {'parse rows/s':>14} {'load rows/s':>14} "
+              f"{'load s':>8}")
+        for workers in args.workers or default_workers():
+            parse = time_parse(csv_path, workers)
+            load = time_load(tmp_dir, csv_path, workers)
+            print(f"{workers:>8} {args.size / parse:>14,.0f} "
+                  f"{args.size / load:>14,.0f} {load:>8.2f}")
+        if args.spark:
+            load = time_load(tmp_dir, csv_path, spark=True)
+            print(f"{'spark':>8} {'':>14} {args.size / load:>14,.0f} "
+                  f"{load:>8.2f}")
+
+
+
+if __name__ == "__main__":
+    main()
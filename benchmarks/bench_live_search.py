@@ -0,0 +1,163 @@
+"""Benchmark of the keystroke-to-result latency of the live search: every
+prefix of a few typed queries is searched the way the GUI does it, i.e.
+filtered in memory at once when it refines the previous result, skipped
+when the title or author is too short for the index, and otherwise
+fetched from the database (complete result or first page) once the
+typing pauses for the debounce delay. Both the query alone and the whole
+path to the rendered rows are timed: the query on a QueryWorker thread,
+the wait for the next poll of the results and the formatting of the
+rows, from the keystroke for a refinement, and from the end of the
+typing pause for a query, since the debounce delay is the pause itself.
+
+Usage: python -m benchmarks.bench_live_search [--size 1000000]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import search
+import live_search
+from book_store import BookStore
+from query_worker import QueryWorker
+from result_view import RecordStore, format_record
+from benchmarks import synthetic
+
+
+
+# Queries typed one character at a time, as (field index, text)
+TYPED_QUERIES = [
+    (0, "harry potter"),
+    (0, "the history of"),
+    (1, "rowling"),
+    (1, "tolkien"),
+    (3, "0439785960"),
+]
+
+# Keystroke-to-result latency target in milliseconds
+TARGET_MS = 50
+
+# Number of records displayed at once in the list box
+PAGE_SIZE = 100
+
+
+
+def search_keystroke(store, searcher, fields):
+    """Function to run the live search for the entry field values and
+    return the records it would display first, along with how they were
+    obtained.
+    """
+    conditions, values = search.build_search_conditions(
+        *fields, search_mode=searcher.search_mode)
+    records = searcher.refine(fields)
+    if records is not None:
+        return records[:PAGE_SIZE], "memory"
+    records = store.fetch_complete(conditions, values, searcher.refine_limit)
+    searcher.remember(fields, records)
+    if records is not None:
+        return records[:PAGE_SIZE], "complete"
+    return store.fetch_page(conditions, values, page_size=PAGE_SIZE), "page"
+
+
+def run_on_worker(worker, task):
+    """Function to run task on the worker thread and wait for its result
+    the way the GUI does, by delivering the finished results every poll
+    interval.
+    """
+    results = []
+    worker.submit(task, results.append, "search", results.append)
+    while not results:
+        time.sleep(worker.poll_interval / 1000)
+        worker.deliver()
+    if isinstance(results[0], Exception):
+        raise results[0]
+    return results[0]
+
+
+def keystroke_to_render(worker, searcher, fields):
+    """Function to time a keystroke until its first page of records is
+    rendered: the refinement in memory, or the query on the worker (then
+    the first page if the result is too big to keep) once the debounce
+    delay is over, and the formatting of the rows. Returns the
+    milliseconds elapsed from the keystroke for a refinement, or from the
+    end of the debounce delay for a query.
+    """
+    if not searcher.covers(fields):
+        time.sleep(live_search.DEBOUNCE_DELAY / 1000)
+    start = time.perf_counter()
+    conditions, values = search.build_search_conditions(
+        *fields, search_mode=searcher.search_mode)
+    records = searcher.refine(fields)
+    if records is None:
+        # The complete result, or the first page of a bigger one, in a ...
+        # ...single trip to the worker as in the GUI
+        def fetch(store):
+            complete = store.fetch_complete(conditions, values,
+                                            searcher.refine_limit)
+            if complete is not None:
+                return complete, complete
+            return None, store.fetch_page(conditions, values,
+                                          page_size=PAGE_SIZE)
+
+        complete, records = run_on_worker(worker, fetch)
+        searcher.remember(fields, complete)
+    page = records[:PAGE_SIZE]
+    RecordStore().insert(0, page)
+    [format_record(record) for record in page]
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--mode", default=search.TRIGRAM_MODE,
+                        choices=[search.TOKEN_MODE, search.TRIGRAM_MODE])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "books.db")
+        synthetic.create_catalog(db_path, args.size).close()
+        store = BookStore(db_path, args.mode)
+        search_mode = store.search_mode
+        worker = QueryWorker(lambda: BookStore(db_path, search_mode))
+
+        timings = []
+        end_to_end = []
+        print(f"{'query':>16} {'source':>9} {'rows':>6} {'query ms':>9} "
+              f"{'render ms':>10}")
+        for field, text in TYPED_QUERIES:
+            searcher = live_search.LiveSearch(search_mode)
+            gui_searcher = live_search.LiveSearch(search_mode)
+            for length in range(1, len(text) + 1):
+                fields = ["", "", "", ""]
+                fields[field] = text[:length]
+                if live_search.needs_table_scan(fields, search_mode):
+                    print(f"{text[:length]:>16} {'skipped':>9}")
+                    continue
+                start = time.perf_counter()
+                records, source = search_keystroke(store, searcher,
+                                                   tuple(fields))
+                elapsed = (time.perf_counter() - start) * 1000
+                timings.append(elapsed)
+                end_to_end.append(keystroke_to_render(worker, gui_searcher,
+                                                      tuple(fields)))
+                print(f"{text[:length]:>16} {source:>9} {len(records):>6} "
+                      f"{elapsed:>9.2f} {end_to_end[-1]:>10.2f}")
+        worker.close()
+        store.close()
+
+    print(f"\n{args.size} books, {len(timings)} keystrokes, debounce "
+          f"{live_search.DEBOUNCE_DELAY} ms:")
+    for label, values in (("query", timings),
+                          ("to render", end_to_end)):
+        values.sort()
+        p95 = values[int(len(values) * 0.95) - 1]
+        print(f"{label:>20}: median {statistics.median(values):.2f} ms, "
+              f"p95 {p95:.2f} ms, max {values[-1]:.2f} ms")
+    print(f"target {TARGET_MS} ms from keystroke, or typing pause, to "
+          f"render: {'met' if end_to_end[-1] < TARGET_MS else 'missed'}")
+
+
+
+if __name__ == "__main__":
+    main()
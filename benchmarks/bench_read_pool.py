@@ -0,0 +1,116 @@
+"""Benchmark of the search throughput of a ReadPool: the same searches run
+on a single read-only connection, then on pools of 1, 2, 4... worker
+processes up to the number of cores, reading the database directly or a
+snapshot copy of it, and the queries per second and the speedup over the
+single connection are reported.
+
+Usage: python -m benchmarks.bench_read_pool [--size 200000]
+       [--searches 2000] [--processes 1 2 4]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import search
+from book_store import BookStore
+from http_service import search_page
+from query_cache import QueryCache
+from read_pool import ReadPool
+from benchmarks import synthetic
+
+
+
+# Searches run, as the fields of a search request
+SEARCHES = [
+    {"title": "the"},
+    {"title": "love", "rating": ">=4"},
+    {"author": "king"},
+    {"rating": "3.5-4"},
+    {"isbn": "12"},
+    {"title": "war", "author": "an"},
+    {},
+]
+
+# Number of records returned by each search
+PAGE_SIZE = 100
+
+
+
+def build_searches(count, size, seed=0):
+    """Function to draw count searches, each starting after a random ID so
+    that no two are answered from the query cache.
+    """
+    rng = random.Random(seed)
+    return [(rng.choice(SEARCHES), rng.randint(0, size))
+            for _ in range(count)]
+
+
+def run_single(db_path, searches):
+    """Function to run the searches one after the other on a single
+    read-only connection. Returns the queries per second.
+    """
+    store = BookStore(db_path, search.TRIGRAM_MODE,
+                      QueryCache(max_entries=0), read_only=True)
+    start = time.perf_counter()
+    for fields, after_id in searches:
+        search_page(store, fields, after_id, 0, False, PAGE_SIZE)
+    elapsed = time.perf_counter() - start
+    store.close()
+    return len(searches) / elapsed
+
+
+def run_pool(db_path, searches, processes, snapshot):
+    """Function to run the searches on a warmed-up pool of worker
+    processes, all of them submitted at once. Returns the queries per
+    second.
+    """
+    pool = ReadPool(db_path, search.TRIGRAM_MODE, processes, snapshot)
+    try:
+        pool.warm_up()
+        start = time.perf_counter()
+        futures = [pool.submit(search_page, fields, after_id, 0, False,
+                               PAGE_SIZE)
+                   for fields, after_id in searches]
+        for future in futures:
+            future.result()
+        elapsed = time.perf_counter() - start
+    finally:
+        pool.close()
+    return len(searches) / elapsed
+
+
+def main():
+    cores = os.cpu_count() or 1
+    # Pools of 1, 2 and 4 processes, as far as the cores go, and one per core
+    default_processes = sorted({1, cores} | {n for n in (2, 4) if n <= cores})
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=200_000)
+    parser.add_argument("--searches", type=int, default=2_000)
+    parser.add_argument("--processes", type=int, nargs="+",
+                        default=default_processes)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "books.db")
+        synthetic.create_catalog(db_path, args.size).close()
+        # A writable store builds the full-text index the readers expect
+        BookStore(db_path, search.TRIGRAM_MODE).close()
+        searches = build_searches(args.searches, args.size)
+
+        print(f"{args.searches:,} searches on {args.size:,} records, "
+              f"{cores} cores")
+        baseline = run_single(db_path, searches)
+        print(f"{'mode':>10} {'processes':>10} {'QPS':>10} {'speedup':>8}")
+        print(f"{'single':>10} {'-':>10} {baseline:>10,.0f} {1:>8.2f}")
+        for snapshot in (False, True):
+            for processes in args.processes:
+                qps = run_pool(db_path, searches, processes, snapshot)
+                print(f"{'snapshot' if snapshot else 'direct':>10} "
+                      f"{processes:>10} {qps:>10,.0f} "
+                      f"{qps / baseline:>8.2f}")
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Benchmark comparing searches and aggregates run in SQLite with the same
+ones computed on the in-memory columnar snapshot.
+
+Usage: python -m benchmarks.bench_snapshot [--size 1000000]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from book_store import BookStore
+from query_cache import QueryCache
+from benchmarks import synthetic
+
+
+
+# (title, author, rating, isbn) searches timed on both paths
+SEARCHES = [
+    ("the", "", "4-4.5", ""),
+    ("love", "", ">=4", ""),
+    ("", "king", "3.5-5", ""),
+    ("", "", "", "12"),
+]
+
+# Number of times each operation is repeated, the median being reported
+REPEAT = 5
+
+
+
+def median_ms(run):
+    """Function to return the median time in milliseconds taken by run,
+    together with its last result.
+    """
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = run()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "books.db")
+        synthetic.create_catalog(db_path, args.size).close()
+        store = BookStore(db_path, cache=QueryCache(max_entries=0))
+        start = time.perf_counter()
+        snapshot = store.current_snapshot()
+        print(f"snapshot of {snapshot.size:,} records loaded in "
+              f"{time.perf_counter() - start:.2f} s")
+
+        print(f"{'search':>28} {'rows':>9} {'sqlite ms':>11} "
+              f"{'snapshot ms':>12}")
+        for fields in SEARCHES:
+            conditions, values = store.build_search(*fields)
+            sql_ms, records = median_ms(
+                lambda: list(store.iter_records(conditions, values)))
+            snapshot_ms, positions = median_ms(
+                lambda: snapshot.filter(*fields))
+            label = "|".join(fields)
+            print(f"{label:>28} {len(records):>9,} {sql_ms:>11.1f} "
+                  f"{snapshot_ms:>12.1f}")
+
+        # Average rating per author, in SQL through the author tables
+        sql_ms, _ = median_ms(lambda: store.conn.execute(
+            "SELECT a.Name, COUNT(*), AVG(b.Rating) FROM books b "
+            "JOIN book_authors ba ON ba.BookID = b.ID "
+            "JOIN authors a ON a.ID = ba.AuthorID "
+            "WHERE typeof(b.Rating) IN ('integer', 'real') "
+            "GROUP BY a.ID ORDER BY 3 DESC LIMIT 20").fetchall())
+        snapshot_ms, _ = median_ms(lambda: snapshot.ratings_by_author(
+            snapshot.filter(), 20))
+        print(f"{'mean rating per author':>28} {'':>9} {sql_ms:>11.1f} "
+              f"{snapshot_ms:>12.1f}")
+        store.close()
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Benchmark of the edit throughput with one commit per edit, as before,
+against the group commit of the query worker.
+
+Usage: python -m benchmarks.bench_writes [--size 100000] [--edits 5000]
+"""
+import argparse
+import os
+import tempfile
+import time
+from book_store import BookStore
+from query_worker import QueryWorker
+from benchmarks import synthetic
+
+
+
+def update_params(edit):
+    """Function to return the UPDATE_RECORD parameters of an edit."""
+    return (f"Title {edit}", "Author", 4.0, str(edit), edit + 1)
+
+
+def commit_per_edit(db_path, edits):
+    """Function to apply the edits committing each one separately and
+    return the elapsed time in seconds.
+    """
+    store = BookStore(db_path)
+    start = time.perf_counter()
+    for edit in range(edits):
+        params = update_params(edit)
+        store.update(params[-1], *params[:-1])
+        store.commit()
+    elapsed = time.perf_counter() - start
+    store.close()
+    return elapsed
+
+
+def group_commit(db_path, edits):
+    """Function to apply the edits through the query worker's group commit
+    and return the elapsed time in seconds until every edit has been
+    acknowledged.
+    """
+    worker = QueryWorker(lambda: BookStore(db_path))
+    acknowledged = []
+    start = time.perf_counter()
+    for edit in range(edits):
+        params = update_params(edit)
+        worker.submit(
+            lambda store, params=params: store.update(
+                params[-1], *params[:-1]),
+            acknowledged.append,
+            write=True,
+        )
+    while len(acknowledged) < edits:
+        time.sleep(0.001)
+        worker.deliver()
+    elapsed = time.perf_counter() - start
+    worker.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--edits", type=int, default=5_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "books.db")
+        synthetic.create_catalog(db_path, args.size).close()
+        for name, apply_edits in (("commit per edit", commit_per_edit),
+                                  ("group commit", group_commit)):
+            elapsed = apply_edits(db_path, args.edits)
+            print(f"{name:>16}: {args.edits} edits in {elapsed:.3f} s "
+                  f"({args.edits / elapsed:,.0f} edits/s)")
+
+
+
+if __name__ == "__main__":
+    main()
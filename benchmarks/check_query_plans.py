@@ -0,0 +1,79 @@
+"""Check that every indexed search predicate is served by an index seek,
+using EXPLAIN QUERY PLAN. Exits with a non-zero status if a predicate
+falls back to a full scan of the 'books' table.
+
+Usage: python -m benchmarks.check_query_plans
+"""
+import sqlite3
+import sys
+import sql_queries
+import migrations
+import search
+import authors
+
+
+
+# (title, author, rating, isbn) searches that must never scan the table
+INDEXED_SEARCHES = [
+    ("harry", "", "", ""),
+    ("", "rowling", "", ""),
+    ("potter", "rowling", "", ""),
+    ("", "", "4.5", ""),
+    ("", "", ">=4", ""),
+    ("", "", "<=2.5", ""),
+    ("", "", "3.5-4.5", ""),
+    ("", "", "", "0439785960"),
+    ("", "", "", "978-0-439"),
+    ("", "", "", "9780439785"),
+    ("harry", "", ">=4", "04"),
+]
+
+# Author names whose books must be listed through the author indexes
+INDEXED_AUTHORS = ["J.K. Rowling"]
+
+
+
+def check_query_plans(conn, search_mode=search.TRIGRAM_MODE):
+    """Function to return a list of (search, full scan steps) pairs for
+    the indexed searches and author listings whose query plan scans the
+    'books' table.
+    """
+    failures = []
+    for fields in INDEXED_SEARCHES:
+        conditions, values = search.build_search_conditions(
+            *fields, search_mode=search_mode)
+        query = search.build_search_query(conditions)
+        scans = search.full_table_scans(conn, query, values)
+        if scans:
+            failures.append((fields, scans))
+    for name in INDEXED_AUTHORS:
+        conditions, values = authors.by_author_conditions(name)
+        query = search.build_search_query(conditions)
+        scans = search.full_table_scans(conn, query, values)
+        if scans:
+            failures.append((name, scans))
+    return failures
+
+
+def main():
+    # Check the plans against an empty database with the current schema
+    conn = sqlite3.connect(":memory:")
+    conn.execute(sql_queries.CREATE_TABLE)
+    conn.execute(sql_queries.CREATE_METADATA_TABLE)
+    migrations.migrate(conn)
+
+    failed = False
+    for search_mode in (search.TOKEN_MODE, search.TRIGRAM_MODE):
+        search_mode = search.ensure_fts_index(conn, search_mode)
+        for fields, scans in check_query_plans(conn, search_mode):
+            failed = True
+            print(f"FULL SCAN ({search_mode}) {fields}: {scans}")
+    if not failed:
+        print(f"OK: {len(INDEXED_SEARCHES) + len(INDEXED_AUTHORS)} "
+              f"searches use indexes")
+    sys.exit(1 if failed else 0)
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""Reproducible benchmark suite of the start-up, ingest, search and
+materialization hot paths on synthetic catalogs shaped like books.csv,
+with results saved as JSON and compared against a stored baseline run.
+
+Usage:
+    python -m benchmarks.suite [--sizes 10k 1m 10m] [--output run.json]
+    python -m benchmarks.suite --compare baseline.json [--threshold 0.2]
+The compare mode exits with status 1 if any benchmark regressed.
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import ingest
+from book_store import BookStore
+from query_cache import QueryCache
+from benchmarks import synthetic
+
+
+
+# Catalog sizes run by default. 10m is supported but takes several ...
+# ...minutes and a few GB of disk space.
+SIZES = ["10k", "1m"]
+
+# Seed of the synthetic catalogs, so that every run times the same data
+SEED = 0
+
+# Number of times each search is repeated, the median being reported
+REPEAT = 5
+
+# Number of records of the first page of results, as shown by the GUI
+PAGE_SIZE = 100
+
+# Searches timed at every catalog size, one per predicate type, as ...
+# ...name -> (title, author, rating, isbn)
+SEARCHES = {
+    "title_substring": ("the", "", "", ""),
+    "author_substring": ("", "king", "", ""),
+    "rating_equal": ("", "", "4.5", ""),
+    "isbn_partial": ("", "", "", "12"),
+    "view_all": ("", "", "", ""),
+}
+
+# Modules imported by the GUI before its window is created, as ...
+# ...name -> Python statement timed in a fresh interpreter
+STARTUP_IMPORTS = {
+    "import_main": "import main",
+    "import_gui": "import main, customtkinter",
+}
+
+# Default relative slowdown beyond which a benchmark counts as regressed, ...
+# ...and the smallest absolute slowdown in milliseconds worth reporting, ...
+# ...so that timer noise on sub-millisecond timings is ignored
+THRESHOLD = 0.2
+MIN_DELTA_MS = 1.0
+
+
+
+def parse_size(text):
+    """Function to parse a catalog size such as 10000, 10k or 1m."""
+    multipliers = {"k": 1_000, "m": 1_000_000}
+    suffix = text[-1].lower()
+    if suffix in multipliers:
+        return int(float(text[:-1]) * multipliers[suffix])
+    return int(text)
+
+
+def median_ms(run, repeat=REPEAT):
+    """Function to call run repeatedly and return the median elapsed time
+    in milliseconds together with the result of the last call.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
+
+
+def bench_imports():
+    """Function to time the imports done before the GUI window is created,
+    each in a fresh interpreter, net of the interpreter's own start-up.
+    Returns the results as name -> {"ms": ..., "rows": 0}.
+    """
+    def run_python(statement):
+        subprocess.run([sys.executable, "-c", statement], check=True)
+
+    interpreter, _ = median_ms(lambda: run_python("pass"))
+    results = {}
+    for name, statement in STARTUP_IMPORTS.items():
+        elapsed, _ = median_ms(lambda: run_python(statement))
+        results[name] = {"ms": max(elapsed - interpreter, 0.0), "rows": 0}
+    return results
+
+
+def bench_size(tmp_dir, size):
+    """Function to run every benchmark on a catalog of the given size and
+    return the results as name -> {"ms": ..., "rows": ...}.
+    """
+    results = {}
+    csv_path = os.path.join(tmp_dir, f"books_{size}.csv")
+    db_path = os.path.join(tmp_dir, f"books_{size}.db")
+    synthetic.write_csv(csv_path, size, SEED)
+
+    # Bulk ingest of the CSV file, including the full-text index upkeep
+    store = BookStore(db_path, cache=QueryCache(max_entries=0))
+    start = time.perf_counter()
+    store.reset(force=True, csv_path=csv_path)
+    results["ingest"] = {"ms": (time.perf_counter() - start) * 1000,
+                         "rows": size}
+
+    # The cache keeps nothing, so that every repetition hits the database
+    for name, fields in SEARCHES.items():
+        conditions, values = store.build_search(*fields)
+        elapsed, page = median_ms(
+            lambda: store.fetch_page(conditions, values,
+                                     page_size=PAGE_SIZE))
+        results[f"{name}.first_page"] = {"ms": elapsed, "rows": len(page)}
+        elapsed, page = median_ms(
+            lambda: store.fetch_ranked(conditions, values, limit=PAGE_SIZE))
+        results[f"{name}.ranked_page"] = {"ms": elapsed, "rows": len(page)}
+        elapsed, records = median_ms(
+            lambda: list(store.iter_records(conditions, values)))
+        results[f"{name}.materialize"] = {"ms": elapsed,
+                                          "rows": len(records)}
+    store.close()
+
+    # Start-up work done before the GUI window is shown: opening the ...
+    # ...store, and the check deciding whether the CSV file is reloaded
+    elapsed, _ = median_ms(
+        lambda: BookStore(db_path, cache=QueryCache(max_entries=0)).close())
+    results["startup.open_store"] = {"ms": elapsed, "rows": 0}
+    store = BookStore(db_path, cache=QueryCache(max_entries=0))
+    elapsed, loaded = median_ms(
+        lambda: ingest.is_csv_loaded(store.cur, csv_path))
+    results["startup.reload_check"] = {"ms": elapsed, "rows": int(loaded)}
+    store.close()
+    os.remove(csv_path)
+    return results
+
+
+def run_suite(sizes):
+    """Function to run the suite at every size. Returns the run as a
+    JSON-serializable dictionary.
+    """
+    run = {
+        "environment": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+        },
+        "seed": SEED,
+        "results": {},
+    }
+    benchmarks = [("startup", bench_imports)]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        benchmarks += [(size, lambda size=size: bench_size(tmp_dir, size))
+                       for size in sizes]
+        for prefix, bench in benchmarks:
+            for name, result in bench().items():
+                key = f"{prefix}/{name}"
+                run["results"][key] = result
+                print(f"{key:>40} {result['rows']:>10} rows "
+                      f"{result['ms']:>12.2f} ms", file=sys.stderr)
+    return run
+
+
+def compare(run, baseline, threshold=THRESHOLD, min_delta=MIN_DELTA_MS):
+    """Function to compare a run with a baseline run. Returns the list of
+    (name, baseline ms, run ms) of the benchmarks that got slower by more
+    than the threshold, or whose row count changed.
+    """
+    regressions = []
+    for name, result in run["results"].items():
+        reference = baseline["results"].get(name)
+        if reference is None:
+            continue
+        slower = result["ms"] - reference["ms"]
+        if result["rows"] != reference["rows"] \
+                or slower > min_delta and slower > reference["ms"] * threshold:
+            regressions.append((name, reference["ms"], result["ms"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=SIZES,
+                        help="catalog sizes, e.g. 10k 1m 10m")
+    parser.add_argument("--output", default=None,
+                        help="file the JSON results are written to "
+                             "(standard output by default)")
+    parser.add_argument("--compare", default=None,
+                        help="baseline run to compare the results with")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="relative slowdown counted as a regression")
+    args = parser.parse_args()
+
+    run = run_suite(parse_size(size) for size in args.sizes)
+    if args.output:
+        with open(args.output, "w") as out_file:
+            json.dump(run, out_file, indent=2)
+    else:
+        json.dump(run, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(run, baseline, args.threshold)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: {before:.2f} ms -> {after:.2f} ms",
+                  file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("no regressions", file=sys.stderr)
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import csv
+import random
+import sqlite3
+import sql_queries
+import migrations
+import authors
+import facets
+
+
+
+# CSV file whose titles and authors provide the vocabulary of the ...
+# ...synthetic catalogs
+SOURCE_CSV = "./assets/books.csv"
+
+# Number of rows inserted per executemany call
+BATCH_SIZE = 50_000
+
+
+
+def load_vocabulary(csv_path=SOURCE_CSV):
+    """Function to collect the title words and author names found in the
+    CSV file, used to generate realistic looking synthetic books.
+    """
+    title_words = set()
+    authors = set()
+    with open(csv_path, newline="", encoding="utf-8") as csv_file:
+        for row in csv.DictReader(csv_file):
+            title_words.update((row["title"] or "").split())
+            authors.update((row["author"] or "").split("-"))
+    return sorted(title_words), sorted(author for author in authors if author)
+
+
+def generate_books(size, seed=0, csv_path=SOURCE_CSV):
+    """Generator function to yield size synthetic (title, author, rating,
+    isbn) tuples shaped like the rows of books.csv. The same seed always
+    produces the same catalog.
+    """
+    title_words, authors = load_vocabulary(csv_path)
+    rng = random.Random(seed)
+    for _ in range(size):
+        title = " ".join(rng.choices(title_words, k=rng.randint(1, 8)))
+        author = "-".join(rng.choices(authors, k=rng.choice((1, 1, 1, 2))))
+        rating = round(rng.uniform(0, 5), 2)
+        isbn = str(rng.randrange(10 ** 8, 10 ** 10))
+        yield title, author, rating, isbn
+
+
+def write_csv(csv_path, size, seed=0):
+    """Function to write size synthetic books to a CSV file laid out like
+    books.csv, e.g. to time loading it into the database.
+    """
+    with open(csv_path, "w", newline="", encoding="utf-8") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(("title", "author", "rating", "isbn", ""))
+        for book in generate_books(size, seed):
+            writer.writerow(book + ("",))
+
+
+def create_catalog(db_path, size, seed=0):
+    """Function to create an SQLite database at db_path holding a 'books'
+    table with size synthetic records, with the current schema and the
+    author tables. Returns the open connection.
+    """
+    conn = sqlite3.connect(db_path)
+    cur = conn.cursor()
+    cur.execute(sql_queries.CREATE_TABLE)
+    cur.execute(sql_queries.CREATE_METADATA_TABLE)
+    with conn:
+        batch = []
+        for book in generate_books(size, seed):
+            batch.append(book)
+            if len(batch) == BATCH_SIZE:
+                cur.executemany(sql_queries.INSERT_RECORD, batch)
+                batch = []
+        cur.executemany(sql_queries.INSERT_RECORD, batch)
+    migrations.migrate(conn)
+    authors.ensure_index(conn)
+    facets.ensure_index(conn)
+    return conn
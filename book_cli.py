@@ -0,0 +1,277 @@
+"""Command line interface to the book database, for scripting, batch jobs
+and profiling without the GUI. Records are written as JSON lines.
+
+Usage examples, from the repository root:
+    python -m book_cli search --title harry --rating ">=4"
+    python -m book_cli import new_books.csv
+    python -m book_cli batch corrections.csv
+    python -m book_cli export books.jsonl --author tolkien
+    python -m book_cli export all_books.parquet
+    python -m book_cli search --by-author "J.R.R. Tolkien"
+    python -m book_cli authors tolkien
+    python -m book_cli stats --title war --authors 10 --min-books 3
+    python -m book_cli facets --title war
+    python -m book_cli reset --force --workers 8
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import search
+import metrics
+import authors
+import export
+import batch
+import facets
+from book_store import BookStore, DATABASE_PATH, CSV_PATH, FIELDS
+from book_store import BATCH_SIZE
+from book_store import record_to_dict
+
+
+
+def write_jsonl(records, out):
+    """Function to write records to a text stream as JSON lines, one at a
+    time. Returns the number of records written.
+    """
+    count = 0
+    for record in records:
+        out.write(json.dumps(record_to_dict(record), ensure_ascii=False))
+        out.write("\n")
+        count += 1
+    return count
+
+
+def read_records(path):
+    """Generator function to stream (title, author, rating, isbn) records
+    from a CSV file with a header row or from a JSON-lines file.
+    """
+    with open(path, newline="", encoding="utf-8") as in_file:
+        if path.endswith((".jsonl", ".json")):
+            rows = (json.loads(line) for line in in_file if line.strip())
+        else:
+            rows = csv.DictReader(in_file)
+        for row in rows:
+            yield tuple(row.get(field) for field in FIELDS[1:])
+
+
+def add_search_arguments(parser, by_author=True):
+    """Function to add the search field options to a sub-command."""
+    parser.add_argument("--title", default="")
+    parser.add_argument("--author", default="")
+    parser.add_argument("--rating", default="",
+                        help="exact rating, bound or range, e.g. '>=4'")
+    parser.add_argument("--isbn", default="")
+    if by_author:
+        parser.add_argument("--by-author", default="",
+                            help="only the books by this exact author name")
+
+
+def uses_fuzzy_search(store, args):
+    """Function to check whether a search is run in fuzzy search mode."""
+    return store.search_mode == search.FUZZY_MODE and not args.by_author \
+        and bool(args.title.strip() or args.author.strip())
+
+
+def build_conditions(store, args):
+    """Function to build the SQL conditions and values of the search
+    options.
+    """
+    conditions, values = store.build_search(
+        args.title, args.author, args.rating, args.isbn)
+    if args.by_author.strip():
+        author_conditions, author_values = authors.by_author_conditions(
+            args.by_author)
+        conditions += author_conditions
+        values += author_values
+    return conditions, values
+
+
+def search_records(store, args):
+    """Function to stream the records matching the search options. In fuzzy
+    search mode, or with --ranked, the best matches are returned first.
+    """
+    if uses_fuzzy_search(store, args):
+        return iter(store.fuzzy_search(
+            args.title, args.author, args.rating, args.isbn,
+            getattr(args, "limit", None) or search.RANKED_LIMIT))
+    conditions, values = build_conditions(store, args)
+    if getattr(args, "ranked", False):
+        return iter(store.fetch_ranked(conditions, values,
+                                       limit=args.limit or search.RANKED_LIMIT))
+    return store.iter_records(conditions, values)
+
+
+def search_batches(store, args):
+    """Function to stream the records matching the search options in
+    batches, straight from the database cursor unless the search is
+    fuzzy.
+    """
+    if uses_fuzzy_search(store, args):
+        return export.batched(search_records(store, args))
+    conditions, values = build_conditions(store, args)
+    return store.iter_batches(conditions, values, args.batch_size)
+
+
+def build_parser():
+    """Function to build the command line argument parser."""
+    parser = argparse.ArgumentParser(
+        prog="python -m book_cli",
+        description=__doc__.splitlines()[0],
+    )
+    parser.add_argument("--database", default=DATABASE_PATH)
+    parser.add_argument(
+        "--mode",
+        default=search.TRIGRAM_MODE,
+        choices=search.SEARCH_MODES,
+        help="how titles and authors are matched",
+    )
+    parser.add_argument("--metrics", action="store_true",
+                        help="print operation timings to standard error")
+    parser.add_argument("--slow-query-ms", type=float,
+                        default=metrics.SLOW_QUERY_MS,
+                        help="log operations slower than this with --metrics")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    search_parser = commands.add_parser(
+        "search", help="write the matching records as JSON lines")
+    add_search_arguments(search_parser)
+    search_parser.add_argument("--limit", type=int, default=None)
+    search_parser.add_argument("--ranked", action="store_true",
+                               help="write the most relevant records first")
+
+    import_parser = commands.add_parser(
+        "import", help="add the records of a CSV or JSON-lines file")
+    import_parser.add_argument("path")
+
+    batch_parser = commands.add_parser(
+        "batch", help="apply a CSV or JSON-lines file of upserts and deletes "
+                      "keyed by ID or ISBN (columns: op, id, isbn, title, "
+                      "author, rating)")
+    batch_parser.add_argument("path")
+    batch_parser.add_argument("--chunk-size", type=int,
+                              default=batch.CHUNK_SIZE,
+                              help="rows applied per transaction")
+
+    export_parser = commands.add_parser(
+        "export", help="write the matching records, or every record, to a "
+                       "CSV, JSON-lines or Parquet file")
+    export_parser.add_argument("path")
+    add_search_arguments(export_parser)
+    export_parser.add_argument("--format", choices=sorted(export.WRITERS),
+                               default=None,
+                               help="defaults to the file extension; "
+                                    "parquet requires pyarrow")
+    export_parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                               help="records read from the database and "
+                                    "written at a time")
+
+    authors_parser = commands.add_parser(
+        "authors", help="write the authors whose name matches, with their "
+                        "number of books, as JSON lines")
+    authors_parser.add_argument("name")
+    authors_parser.add_argument("--limit", type=int, default=100)
+
+    facets_parser = commands.add_parser(
+        "facets", help="count the matching records, or every record, by "
+                       "rating band, title initial and author, as JSON")
+    add_search_arguments(facets_parser)
+    facets_parser.add_argument("--authors", type=int,
+                               default=facets.AUTHORS_LIMIT,
+                               help="number of authors with the most books "
+                                    "listed")
+
+    stats_parser = commands.add_parser(
+        "stats", help="aggregate the ratings of the matching records with "
+                      "the in-memory columnar snapshot; titles and authors "
+                      "are matched as substrings, case-folded like the "
+                      "search of --mode (like --mode like for the token "
+                      "and fuzzy modes)")
+    add_search_arguments(stats_parser, by_author=False)
+    stats_parser.add_argument("--authors", type=int, default=0,
+                              help="also write the N best rated authors")
+    stats_parser.add_argument("--min-books", type=int, default=1,
+                              help="fewest rated books of the authors listed")
+    stats_parser.add_argument("--top", type=int, default=0,
+                              help="also write the N best rated records")
+
+    reset_parser = commands.add_parser(
+        "reset", help="reload the database from the CSV file")
+    reset_parser.add_argument("--csv", default=CSV_PATH)
+    reset_parser.add_argument("--force", action="store_true")
+    reset_parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                              help="processes parsing the CSV file "
+                                   "(default: one per core)")
+    reset_parser.add_argument("--spark", action="store_true",
+                              help="parse the CSV file with Spark in local "
+                                   "mode (requires pyspark)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.metrics:
+        metrics.enable(args.slow_query_ms)
+    store = BookStore(args.database, args.mode)
+    try:
+        if args.command == "search":
+            records = search_records(store, args)
+            if args.limit is not None:
+                records = (record for _, record
+                           in zip(range(args.limit), records))
+            write_jsonl(records, sys.stdout)
+        elif args.command == "import":
+            count = store.import_records(read_records(args.path))
+            store.commit()
+            print(json.dumps({"imported": count}))
+        elif args.command == "batch":
+            report = batch.apply_file(store, args.path, args.chunk_size)
+            errors = report.pop("errors")
+            report["errors"] = len(errors)
+            print(json.dumps(report))
+            # One JSON line per row which could not be applied
+            for error in errors:
+                print(json.dumps(error, ensure_ascii=False))
+        elif args.command == "export":
+            report = export.export(search_batches(store, args), args.path,
+                                   args.format)
+            print(json.dumps(report))
+        elif args.command == "authors":
+            for author_id, name, books in store.find_authors(args.name,
+                                                             args.limit):
+                print(json.dumps({"id": author_id, "name": name,
+                                  "books": books}, ensure_ascii=False))
+        elif args.command == "facets":
+            conditions, values = build_conditions(store, args)
+            print(json.dumps(store.facet_counts(conditions, values,
+                                                args.authors),
+                             ensure_ascii=False))
+        elif args.command == "stats":
+            summary, by_author, top = store.snapshot_stats(
+                args.title, args.author, args.rating, args.isbn,
+                args.authors, args.top, args.min_books)
+            print(json.dumps(summary))
+            for name, books, mean in by_author:
+                print(json.dumps({"author": name, "books": books,
+                                  "mean_rating": round(mean, 4)},
+                                 ensure_ascii=False))
+            write_jsonl(top, sys.stdout)
+        elif args.command == "reset":
+            reloaded = store.reset(args.force, args.csv, args.workers,
+                                   args.spark)
+            print(json.dumps({"reloaded": reloaded}))
+    except ValueError as error:
+        # Invalid search input, e.g. a malformed rating
+        sys.exit(f"error: {error}")
+    except ImportError as error:
+        # Optional dependency missing, e.g. pyarrow for Parquet exports
+        sys.exit(f"error: {error}")
+    finally:
+        store.close()
+        if metrics.enabled:
+            print(metrics.registry.report(), file=sys.stderr)
+
+
+
+if __name__ == "__main__":
+    main()
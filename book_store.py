@@ -0,0 +1,686 @@
+import contextlib
+import copy
+import itertools
+import pathlib
+import sqlite3
+import sql_queries
+import ingest
+import search
+import migrations
+import metrics
+import fuzzy
+import authors
+import facets
+import batch
+from query_cache import QueryCache
+
+
+
+# Default location of the SQLite database
+DATABASE_PATH = "./assets/books.db"
+
+# Default location of the CSV file the database is populated from
+CSV_PATH = "./assets/books.csv"
+
+# Names of the columns of the 'books' table, in order
+COLUMNS = ("ID", "Title", "Author", "Rating", "ISBN")
+
+# Names of the fields of the records exchanged as dictionaries, e.g. in ...
+# ...JSON, in column order
+FIELDS = tuple(column.lower() for column in COLUMNS)
+
+# Number of records read from a cursor or written with executemany at once
+BATCH_SIZE = 10_000
+
+# Bytes of the database file memory-mapped by read-only connections
+MMAP_SIZE = 1 << 30
+
+
+
+def record_to_dict(record):
+    """Function to convert a record tuple into a dictionary keyed on the
+    lower-case column names.
+    """
+    return dict(zip(FIELDS, record))
+
+
+
+class BookStore:
+    """A class to encapsulate the book database independently of any user
+    interface: searching, paging, adding, updating, deleting, importing
+    and reloading book records. It is used by the GUI, through its query
+    worker, as well as by the command line interface.
+    Edits are not committed by the methods making them, so that several
+    of them can share one transaction; call commit() to make them durable.
+    """
+
+    def __init__(self, database=DATABASE_PATH, search_mode=search.TRIGRAM_MODE,
+                 cache=None, read_only=False, immutable=False):
+        """Initializes an instance of the BookStore class. The search mode
+        selects how titles and authors are matched: by substring through a
+        trigram full-text index (search.TRIGRAM_MODE), by token and token
+        prefix (search.TOKEN_MODE) or with a plain LIKE scan
+        (search.LIKE_MODE), or tolerating typos (search.FUZZY_MODE).
+        Stores opened on the same database may share a query cache.
+        A read-only store can only search; it expects the schema and the
+        full-text index to have been set up by a writable store, and may
+        be used from any thread, one at a time. It reads the file through
+        a memory map. With immutable set to True, the database file must
+        never change while the store is open (e.g. a snapshot copy), which
+        lets SQLite skip locking and change detection altogether.
+        """
+        self.database = database
+        # Cache the results of repeated queries until the table changes
+        self.cache = cache if cache is not None else QueryCache()
+        # Columnar snapshot of the table, loaded on first use and kept ...
+        # ...up to date by every edit from then on (see columnar.py)
+        self.snapshot = None
+        if read_only:
+            # Open the database read-only, leaving the schema alone
+            uri = pathlib.Path(database).resolve().as_uri() + "?mode=ro"
+            if immutable:
+                uri += "&immutable=1"
+            self.conn = sqlite3.connect(uri, uri=True,
+                                        check_same_thread=False)
+            self.conn.execute(sql_queries.SET_MMAP_SIZE.format(
+                size=MMAP_SIZE))
+            self.cur = self.conn.cursor()
+            self.search_mode = search_mode
+            self.fuzzy_index = fuzzy.is_built(self.cur)
+            return
+
+        # Establish a connection to the SQLite database
+        self.conn = sqlite3.connect(database=database)
+        # Switch the database to write-ahead logging, so that searches ...
+        # ...are not blocked while edits are being committed, and make ...
+        # ...every commit durable
+        self.conn.execute(sql_queries.ENABLE_WAL)
+        self.conn.execute(sql_queries.SYNCHRONOUS_FULL)
+        # Create a cursor object from the database connection to ...
+        # ...execute SQL commands
+        self.cur = self.conn.cursor()
+        # Execute the SQL command to create the 'books' table if it ...
+        # ...does not already exist
+        self.cur.execute(sql_queries.CREATE_TABLE)
+        # Execute the SQL command to create the 'metadata' table, which ...
+        # ...keeps track of the CSV file last loaded into the database
+        self.cur.execute(sql_queries.CREATE_METADATA_TABLE)
+        # Apply any pending schema migrations, e.g. the rating and ISBN ...
+        # ...indexes
+        migrations.migrate(self.conn)
+        # Build the full-text index used by title and author searches, ...
+        # ...falling back on LIKE scans if this SQLite build lacks FTS5
+        self.search_mode = search.ensure_fts_index(self.conn, search_mode)
+        # Build the vocabulary index of the fuzzy search if needed; once ...
+        # ...built, it is kept up to date by every edit, whatever the mode
+        if self.search_mode == search.FUZZY_MODE:
+            fuzzy.ensure_index(self.conn)
+        self.fuzzy_index = fuzzy.is_built(self.cur)
+        # Split the authors into the 'authors' and 'book_authors' tables ...
+        # ...if the database predates them
+        authors.ensure_index(self.conn)
+        # Count the books of every rating band, title initial and author ...
+        # ...if the database predates the 'facets' table
+        facets.ensure_index(self.conn)
+
+
+    def reset(self, force=False, csv_path=CSV_PATH, workers=1, spark=False):
+        """Method to reset the book database to a predefined state. It clears
+        all existing records in the 'books' table and then populates it with
+        the data from the CSV file, parsed by workers processes in parallel
+        or by Spark if spark is True.
+        The reload is skipped when the CSV file has not changed since it was
+        last loaded, unless force is set to True. Returns whether the table
+        was reloaded.
+        """
+        # Skip the reload if the CSV file has already been loaded as it is
+        if not force and ingest.is_csv_loaded(self.cur, csv_path):
+            return False
+        # Stream the CSV file into the 'books' table in batches, inside ...
+        # ...a single transaction
+        with metrics.timer("reset.bulk_load", params=(csv_path,)):
+            ingest.bulk_load(self.conn, csv_path, workers, spark)
+        # Rebuild the fuzzy index from scratch, or stop maintaining it ...
+        # ...if it is not needed in this search mode
+        if self.search_mode == search.FUZZY_MODE:
+            fuzzy.rebuild_index(self.conn)
+        elif self.fuzzy_index:
+            fuzzy.drop_index(self.conn)
+            self.fuzzy_index = False
+        # The snapshot is reloaded on next use
+        self.snapshot = None
+        # Cached results are no longer accurate
+        self.cache.invalidate("books")
+        return True
+
+
+    def build_search(self, title="", author="", rating="", isbn=""):
+        """Method to build the SQL conditions and values of a search from
+        the title, author, rating and ISBN to look for. Empty fields are
+        ignored. Raises ValueError if the rating is invalid.
+        """
+        return search.build_search_conditions(
+            title, author, rating, isbn, self.search_mode)
+
+
+    def query(self, operation, sql, params=()):
+        """Method to execute a query and fetch all of its rows, timing the
+        execution and the fetch separately when metrics are enabled.
+        """
+        with metrics.timer(operation + ".execute", sql, params):
+            cur = self.conn.execute(sql, params)
+        with metrics.timer(operation + ".fetchall", sql, params) as timing:
+            records = cur.fetchall()
+            timing.rows = len(records)
+        return records
+
+
+    def fetch_page(self, conditions=(), values=(), after_id=None,
+                   before_id=None, page_size=100):
+        """Method to fetch the page of records meeting the conditions that
+        follows after_id or precedes before_id, in ascending ID order.
+        Pages are served from the query cache when possible.
+        """
+        conditions, values = tuple(conditions), tuple(values)
+        query = search.build_page_query(conditions, after_id, before_id)
+        key = after_id if after_id is not None else before_id
+        params = values + ((key,) if key is not None else ()) + (page_size,)
+        with metrics.timer("fetch_page", query, params) as timing:
+            records = self.cache.cached(
+                (conditions, values, after_id, before_id, page_size),
+                lambda: self.query("fetch_page", query, params),
+            )
+            timing.rows = len(records)
+        if before_id is not None:
+            records.reverse()
+        return records
+
+
+    def fetch_complete(self, conditions, values, limit):
+        """Method to fetch every record meeting the conditions, in ID order,
+        or None when more than limit records match. A full-text match on
+        its own is counted in the index first, so that a result too big
+        to keep is not read at all. Results are served from the query
+        cache when possible.
+        """
+        conditions, values = tuple(conditions), tuple(values)
+        query = search.build_search_query(conditions) + " ORDER BY ID LIMIT ?"
+
+        def fetch():
+            if conditions == (sql_queries.FTS_MATCH_CONDITION,):
+                (count,), = self.query("fetch_complete.count",
+                                       sql_queries.COUNT_FTS_MATCHES,
+                                       values + (limit + 1,))
+                if count > limit:
+                    return None
+            records = self.query("fetch_complete", query, values + (limit + 1,))
+            return None if len(records) > limit else records
+
+        with metrics.timer("fetch_complete", query, values) as timing:
+            records = self.cache.cached((conditions, values, limit), fetch)
+            timing.rows = len(records) if records is not None else None
+        return records
+
+
+    def fetch_ranked(self, conditions=(), values=(), offset=0,
+                     limit=search.RANKED_LIMIT):
+        """Method to fetch limit records meeting the conditions, most
+        relevant first, skipping the offset best ones, so that further
+        ranked records can be fetched on request. Results are served from
+        the query cache when possible.
+        """
+        conditions, values = tuple(conditions), tuple(values)
+        query = search.build_ranked_query(conditions)
+        params = values + (limit, offset)
+        with metrics.timer("fetch_ranked", query, params) as timing:
+            records = self.cache.cached(
+                ("ranked", conditions, values, offset, limit),
+                lambda: self.query("fetch_ranked", query, params),
+            )
+            timing.rows = len(records)
+        return records
+
+
+    def fuzzy_search(self, title="", author="", rating="", isbn="",
+                     k=search.RANKED_LIMIT):
+        """Method to search with typos tolerated in the title and author:
+        every word entered is expanded into the close terms of the fuzzy
+        index, and the k records closest to the input are returned, best
+        first. The terms are ranked before any record is read, and the
+        records matching the closest ones are fetched first, by ascending
+        number of edits, until k of them are found, so that a close match
+        is never left out for a later ID. Rating and ISBN are matched as
+        in other searches. Results are served from the query cache when
+        possible. Raises ValueError if the rating is invalid.
+        """
+        if not self.fuzzy_index:
+            raise ValueError("The fuzzy index has not been built; open "
+                             "the database in fuzzy search mode first")
+        tiers = fuzzy.build_fuzzy_tiers(self.cur, title, author)
+        if (title.strip() or author.strip()) and not tiers:
+            # None of the words entered is close to any known term
+            return []
+        conditions, values = search.build_search_conditions(
+            "", "", rating, isbn, self.search_mode)
+        if not tiers and not conditions:
+            return []
+
+        def fetch():
+            records = {}
+            for _, fts_query in tiers or [(0, None)]:
+                tier_conditions, tier_values = conditions, values
+                if fts_query is not None:
+                    tier_conditions = \
+                        (sql_queries.FTS_MATCH_CONDITION,) + conditions
+                    tier_values = (fts_query,) + values
+                query = search.build_search_query(tier_conditions) \
+                    + " ORDER BY ID LIMIT ?"
+                # Up to k records, since those of the previous tiers may ...
+                # ...match this one too
+                for record in self.query("fuzzy_search", query,
+                                         tier_values + (k,)):
+                    if len(records) < k:
+                        records.setdefault(record[0], record)
+                if len(records) >= k:
+                    break
+            return fuzzy.rank(records.values(), title, author, k)
+
+        return self.cache.cached(("fuzzy", tuple(tiers), conditions, values,
+                                  title, author, k), fetch)
+
+
+    def find_authors(self, text, limit=100):
+        """Method to list the authors whose name matches text, as (ID, name,
+        number of books) tuples, most prolific first.
+        """
+        query, value = search.build_author_query(text, self.search_mode)
+        return self.query("find_authors", query, (value, limit))
+
+
+    def facet_counts(self, conditions=(), values=(),
+                     authors_limit=facets.AUTHORS_LIMIT):
+        """Method to count the records meeting the conditions by rating band,
+        title initial and author, as returned by facets.count. Results are
+        served from the query cache when possible, as a copy which callers
+        may modify.
+        """
+        conditions, values = tuple(conditions), tuple(values)
+        with metrics.timer("facet_counts", params=values):
+            return copy.deepcopy(self.cache.cached(
+                ("facets", conditions, values, authors_limit),
+                lambda: facets.count(self.conn, conditions, values,
+                                     authors_limit),
+            ))
+
+
+    def current_snapshot(self):
+        """Method to return the columnar snapshot of the table, loading it
+        if needed or if another connection has changed the table since.
+        """
+        if self.snapshot is None or not self.snapshot.is_current(self.conn):
+            # Imported on first use, since NumPy slows down the start of ...
+            # ...the GUI
+            import columnar
+            with metrics.timer("snapshot.load") as timing:
+                self.snapshot = columnar.ColumnarSnapshot.load(self.conn)
+                timing.rows = self.snapshot.size
+        return self.snapshot
+
+
+    def snapshot_search(self, title="", author="", rating="", isbn="",
+                        limit=None):
+        """Method to search the columnar snapshot, matching titles and
+        author names as substrings folded the way the SQL search of the
+        store's mode does (as in LIKE_MODE for the token modes). Returns
+        the matching records in ID order, or None when more than limit
+        records match, like fetch_complete. Raises ValueError if the
+        rating is invalid.
+        """
+        snapshot = self.current_snapshot()
+        with metrics.timer("snapshot.filter") as timing:
+            positions = snapshot.filter(title, author, rating, isbn,
+                                        self.search_mode)
+            timing.rows = len(positions)
+        if limit is not None and len(positions) > limit:
+            return None
+        return snapshot.records(positions)
+
+
+    def snapshot_stats(self, title="", author="", rating="", isbn="",
+                       authors_limit=0, top_limit=0, min_books=1):
+        """Method to aggregate the records matching a search with the
+        columnar snapshot: their rating summary, the authors_limit best
+        rated authors as (name, books, mean rating) tuples and the
+        top_limit best rated records. Raises ValueError if the rating is
+        invalid.
+        """
+        snapshot = self.current_snapshot()
+        with metrics.timer("snapshot.stats"):
+            positions = snapshot.filter(title, author, rating, isbn,
+                                        self.search_mode)
+            summary = snapshot.rating_summary(positions)
+            by_author = snapshot.ratings_by_author(
+                positions, authors_limit, min_books) if authors_limit else []
+            top = snapshot.records(snapshot.top_rated(positions, top_limit)) \
+                if top_limit else []
+        return summary, by_author, top
+
+
+    def refresh_snapshot(self, record_id):
+        """Method to apply the edit of a record to the snapshot, if loaded,
+        reading the record back as stored (e.g. with a numeric rating).
+        """
+        if self.snapshot is None:
+            return
+        record = self.fetch_record(record_id)
+        if record is None:
+            self.snapshot.remove(record_id)
+        else:
+            self.snapshot.put(record)
+
+
+    def iter_batches(self, conditions=(), values=(), batch_size=BATCH_SIZE):
+        """Generator method to stream every record meeting the conditions,
+        in ID order, as lists of batch_size records read at a time from
+        the cursor, so that memory stays flat whatever the number of
+        matches.
+        """
+        query = search.build_page_query(conditions, limit=False)
+        with metrics.timer("iter_records.execute", query, values):
+            cur = self.conn.execute(query, tuple(values))
+        while True:
+            records = cur.fetchmany(batch_size)
+            if not records:
+                break
+            yield records
+
+
+    def iter_records(self, conditions=(), values=(), batch_size=BATCH_SIZE):
+        """Generator method to stream every record meeting the conditions,
+        in ID order, one at a time, like iter_batches.
+        """
+        for records in self.iter_batches(conditions, values, batch_size):
+            yield from records
+
+
+    def add(self, title, author, rating, isbn):
+        """Method to add a new book record. Returns the ID of the record."""
+        params = (title, author, rating, isbn)
+        with metrics.timer("add", sql_queries.INSERT_RECORD, params):
+            cur = self.conn.execute(sql_queries.INSERT_RECORD, params)
+            authors.link_authors(self.cur, [(cur.lastrowid, author)])
+            if self.fuzzy_index:
+                fuzzy.index_records(self.cur, [(title, author)])
+            self.refresh_snapshot(cur.lastrowid)
+        self.cache.invalidate("books")
+        return cur.lastrowid
+
+
+    def update(self, record_id, title, author, rating, isbn):
+        """Method to update the book record with the given ID. Returns
+        whether such a record exists.
+        """
+        params = (title, author, rating, isbn, record_id)
+        with metrics.timer("update", sql_queries.UPDATE_RECORD, params):
+            old = self.fetch_title_author(record_id)
+            cur = self.conn.execute(sql_queries.UPDATE_RECORD, params)
+            if cur.rowcount:
+                authors.unlink_authors(self.cur, record_id)
+                authors.link_authors(self.cur, [(record_id, author)])
+            if old is not None:
+                fuzzy.reindex_record(self.cur, old, (title, author))
+            self.refresh_snapshot(record_id)
+        self.cache.invalidate("books")
+        return cur.rowcount > 0
+
+
+    def delete(self, record_id):
+        """Method to delete the book record with the given ID. Returns
+        whether such a record existed.
+        """
+        with metrics.timer("delete", sql_queries.DELETE_RECORD, (record_id,)):
+            old = self.fetch_title_author(record_id)
+            cur = self.conn.execute(sql_queries.DELETE_RECORD, (record_id,))
+            authors.unlink_authors(self.cur, record_id)
+            if old is not None:
+                fuzzy.unindex_record(self.cur, *old)
+            if self.snapshot is not None:
+                self.snapshot.remove(record_id)
+        self.cache.invalidate("books")
+        return cur.rowcount > 0
+
+
+    def fetch_record(self, record_id):
+        """Method to return the book record with the given ID, or None if
+        there is no such record.
+        """
+        return self.conn.execute(sql_queries.SELECT_RECORD,
+                                 (record_id,)).fetchone()
+
+
+    def fetch_title_author(self, record_id):
+        """Method to return the (title, author) of a record before it is
+        edited, if the fuzzy index must be updated, or None otherwise.
+        """
+        if not self.fuzzy_index:
+            return None
+        return self.conn.execute(sql_queries.SELECT_TITLE_AUTHOR,
+                                 (record_id,)).fetchone()
+
+
+    def import_records(self, records, batch_size=BATCH_SIZE):
+        """Method to add (title, author, rating, isbn) records from any
+        iterable, with executemany in batches of batch_size, inside a
+        single savepoint of the current transaction, so that they are
+        added all or none; they are committed with the transaction, e.g.
+        by commit(). Returns the number of records added.
+        """
+        count = 0
+        batch = []
+        # Records are appended after the highest ID, so the new ones ...
+        # ...can be linked to their authors and indexed by the fuzzy ...
+        # ...search afterwards
+        last_id = self.conn.execute(sql_queries.MAX_ID).fetchone()[0] or 0
+        with metrics.timer("import_records", sql_queries.INSERT_RECORD) \
+                as timing, self.savepoint("import_records"):
+            for record in records:
+                batch.append(tuple(record))
+                if len(batch) == batch_size:
+                    self.conn.executemany(sql_queries.INSERT_RECORD, batch)
+                    count += len(batch)
+                    batch = []
+            self.conn.executemany(sql_queries.INSERT_RECORD, batch)
+            count += len(batch)
+            timing.rows = count
+            authors.link_authors(self.cur, self.conn.execute(
+                sql_queries.SELECT_IDS_AUTHORS_AFTER, (last_id,)).fetchall())
+            if self.fuzzy_index:
+                fuzzy.index_records(self.cur, self.conn.execute(
+                    sql_queries.SELECT_TITLES_AUTHORS_AFTER, (last_id,)))
+            if self.snapshot is not None:
+                self.snapshot.extend(self.conn.execute(
+                    sql_queries.SELECT_RECORDS_AFTER, (last_id,)).fetchall())
+        self.cache.invalidate("books")
+        return count
+
+
+    def apply_operations(self, operations):
+        """Method to apply validated batch operations, (line number,
+        batch.Operation) pairs, inside a single savepoint of the current
+        transaction, committed with it, e.g. by commit(). An upsert
+        updates the record with its ID, or every record with its ISBN,
+        leaving the fields it does not give unchanged, and inserts a new
+        record if there is none. Rows are written with executemany; the
+        pending rows are flushed whenever an operation touches a record
+        or ISBN already pending, so that operations apply in file order.
+        Returns the number of records inserted, updated and deleted, and
+        the (line number, error message) pairs of the operations which
+        could not be applied.
+        """
+        counts = {"inserted": 0, "updated": 0, "deleted": 0}
+        errors = []
+        # Rows waiting to be written, as (ID, title, author, rating, ...
+        # ...ISBN) for inserts, (old record, new record) for updates and ...
+        # ...old records for deletes
+        inserts, updates, deletes = [], [], []
+        # IDs and ISBN keys of the records pending
+        pending_ids, pending_isbns = set(), set()
+
+        def flush():
+            if deletes:
+                self.cur.executemany(sql_queries.DELETE_RECORD,
+                                     [(old[0],) for old in deletes])
+                for old in deletes:
+                    authors.unlink_authors(self.cur, old[0])
+                    if self.fuzzy_index:
+                        fuzzy.unindex_record(self.cur, old[1], old[2])
+                    if self.snapshot is not None:
+                        self.snapshot.remove(old[0])
+            if updates:
+                self.cur.executemany(sql_queries.UPDATE_RECORD,
+                                     [new[1:] + new[:1] for _, new in updates])
+                # Only the records whose title or author changed need ...
+                # ...their authors and fuzzy terms updated
+                changed = [(old, new) for old, new in updates
+                           if old[1:3] != new[1:3]]
+                for old, new in changed:
+                    if old[2] != new[2]:
+                        authors.unlink_authors(self.cur, old[0])
+                    if self.fuzzy_index:
+                        fuzzy.reindex_record(self.cur, old[1:3], new[1:3])
+                authors.link_authors(self.cur, [(new[0], new[2])
+                                                for old, new in changed
+                                                if old[2] != new[2]])
+            if inserts:
+                self.cur.executemany(sql_queries.INSERT_RECORD_WITH_ID,
+                                     inserts)
+                authors.link_authors(self.cur,
+                                     [(new[0], new[2]) for new in inserts])
+                if self.fuzzy_index:
+                    fuzzy.index_records(self.cur,
+                                        [new[1:3] for new in inserts])
+            for new in itertools.chain((new for _, new in updates), inserts):
+                self.refresh_snapshot(new[0])
+            counts["inserted"] += len(inserts)
+            counts["updated"] += len(updates)
+            counts["deleted"] += len(deletes)
+            for pending in (inserts, updates, deletes, pending_ids,
+                            pending_isbns):
+                pending.clear()
+
+        def find(operation):
+            if operation.record_id is not None:
+                return self.cur.execute(sql_queries.SELECT_RECORD,
+                                        (operation.record_id,)).fetchall()
+            return self.cur.execute(
+                sql_queries.SELECT_RECORDS_BY_ISBN,
+                (search.normalize_isbn(operation.isbn),)).fetchall()
+
+        with metrics.timer("apply_operations") as timing, \
+                self.savepoint("apply_operations"):
+            next_id = (self.cur.execute(sql_queries.MAX_ID).fetchone()[0]
+                       or 0) + 1
+            for line_number, operation in operations:
+                isbn_key = search.normalize_isbn(operation.isbn) \
+                    if operation.isbn is not None else None
+                if operation.record_id in pending_ids \
+                        or isbn_key in pending_isbns:
+                    flush()
+                olds = find(operation)
+                if any(old[0] in pending_ids for old in olds):
+                    flush()
+                    olds = find(operation)
+
+                if operation.kind == batch.DELETE:
+                    if not olds:
+                        errors.append((line_number, "no such record"))
+                        continue
+                    deletes.extend(olds)
+                    news = ()
+                elif olds:
+                    news = [
+                        (old[0],
+                         old[1] if operation.title is None
+                         else operation.title,
+                         old[2] if operation.author is None
+                         else operation.author,
+                         old[3] if operation.rating is None
+                         else operation.rating,
+                         old[4] if operation.isbn is None
+                         else operation.isbn)
+                        for old in olds
+                    ]
+                    updates.extend(zip(olds, news))
+                elif operation.title is None:
+                    errors.append((line_number,
+                                   "a title is required to add a record"))
+                    continue
+                else:
+                    record_id = operation.record_id or next_id
+                    next_id = max(next_id, record_id + 1)
+                    news = [(record_id, operation.title, operation.author,
+                             operation.rating, operation.isbn)]
+                    inserts.extend(news)
+                for record in itertools.chain(olds, news):
+                    pending_ids.add(record[0])
+                    if record[4] is not None:
+                        pending_isbns.add(search.normalize_isbn(
+                            str(record[4])))
+            flush()
+            timing.rows = sum(counts.values())
+        self.cache.invalidate("books")
+        return counts, errors
+
+
+    @contextlib.contextmanager
+    def savepoint(self, name="edit"):
+        """Context manager method to run a block of edits inside a savepoint
+        of the current transaction, which is opened if needed. If the
+        block raises, only its own edits are rolled back; the edits made
+        before it stay pending, e.g. the writes the QueryWorker is about
+        to group-commit. Otherwise its edits join the transaction, to be
+        committed with it. Nothing is committed here.
+        """
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN")
+        self.conn.execute(sql_queries.SAVEPOINT.format(name=name))
+        try:
+            yield
+        except BaseException:
+            # Some errors, e.g. a full disk, roll back the whole ...
+            # ...transaction, savepoint included
+            if self.conn.in_transaction:
+                self.conn.execute(
+                    sql_queries.ROLLBACK_TO_SAVEPOINT.format(name=name))
+                self.conn.execute(
+                    sql_queries.RELEASE_SAVEPOINT.format(name=name))
+            # Cached results and the snapshot may include the edits ...
+            # ...rolled back
+            self.cache.invalidate("books")
+            self.snapshot = None
+            raise
+        self.conn.execute(sql_queries.RELEASE_SAVEPOINT.format(name=name))
+
+
+    def commit(self):
+        """Method to commit the pending edits."""
+        if self.conn.in_transaction:
+            with metrics.timer("commit"):
+                self.conn.commit()
+            # Results read by other connections before the commit are ...
+            # ...no longer accurate
+            self.cache.invalidate("books")
+
+
+    def rollback(self):
+        """Method to roll back the pending edits."""
+        self.conn.rollback()
+        # Cached results and the snapshot may include the edits rolled back
+        self.cache.invalidate("books")
+        self.snapshot = None
+
+
+    def close(self):
+        """Method to commit the pending edits and close the database."""
+        self.conn.commit()
+        self.conn.close()
@@ -0,0 +1,542 @@
+import math
+import re
+import numpy as np
+import sql_queries
+import search
+import authors
+
+
+
+# Number of records read at once while the snapshot is loaded
+BATCH_SIZE = 100_000
+
+# Separator of the values in the searchable text of a string column, ...
+# ...and of the author names within one value
+SEPARATOR = "\x01"
+NAME_SEPARATOR = "\x00"
+
+# Strings interned since the searchable text of a column was built are ...
+# ...tested one by one; beyond this number the text is rebuilt
+MAX_TAIL = 1_000
+
+# When fewer rows than this fraction of a column's distinct values remain ...
+# ...after the other filters, only their values are tested
+CANDIDATE_RATIO = 0.25
+
+# Factor by which the column arrays grow when records are appended
+GROWTH = 1.5
+
+# Vectorized rating comparisons, by operator of search.parse_rating
+COMPARISONS = {
+    "=": np.equal,
+    ">=": np.greater_equal,
+    "<=": np.less_equal,
+    ">": np.greater,
+    "<": np.less,
+}
+
+
+
+def title_text(title):
+    """Function to return the searchable text of a title, before it is
+    folded.
+    """
+    return str(title) if title is not None else ""
+
+
+def isbn_text(isbn):
+    """Function to return the searchable text of an ISBN, its normalized
+    key.
+    """
+    return search.normalize_isbn(str(isbn)) if isbn is not None else ""
+
+
+def rating_value(rating):
+    """Function to convert a rating into a float for vectorized comparison,
+    following SQLite's ordering: NULL (NaN) matches no comparison and
+    text sorts after every number.
+    """
+    if rating is None:
+        return math.nan
+    if isinstance(rating, (int, float)):
+        return float(rating)
+    return math.inf
+
+
+def clean_input(text):
+    """Function to strip a search input and drop the separator characters,
+    which no input may match.
+    """
+    return text.strip().replace(SEPARATOR, "").replace(NAME_SEPARATOR, "")
+
+
+def substring_matcher(text, search_mode):
+    """Function to build the (pattern, test) pair matching a title or author
+    input in the searchable texts the way the SQL search of search_mode
+    does: a literal substring, case-folded as by the trigram index, or a
+    LIKE pattern, ASCII letters only being folded and '%' and '_' being
+    wildcards within one value or author name. Returns the fold the texts
+    are to be matched in along with the pair.
+    """
+    fold = search.substring_fold(text, search_mode)
+    if fold is search.fold_case:
+        text = fold(text)
+        return fold, re.compile(re.escape(text)), lambda value: text in value
+    any_char = f"[^{SEPARATOR}{NAME_SEPARATOR}]"
+    pattern = re.compile("".join(
+        any_char + "*" if char == "%" else any_char if char == "_"
+        else re.escape(char) for char in fold(text)))
+    return fold, pattern, lambda value: pattern.search(value) is not None
+
+
+
+class StringColumn:
+    """A class to store a string column as categorical data: every distinct
+    value is interned once and rows hold its integer code. Substring and
+    prefix searches run once per distinct value, through a single
+    searchable text concatenating the values, folded the way the search
+    compares them.
+    """
+
+    def __init__(self, to_text):
+        """Initializes an instance of the StringColumn class. to_text turns a
+        value into the text searches are matched against, before it is
+        folded.
+        """
+        self.to_text = to_text
+        # Distinct values and their codes
+        self.values = []
+        self.codes = {}
+        # Searchable texts of the values, by fold function (None for the ...
+        # ...texts as they are), each built on the first search using it
+        self.folds = {}
+
+
+    def intern(self, value):
+        """Method to return the code of a value, interning it if new."""
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+    def intern_all(self, values):
+        """Method to return the codes of a sequence of values as an array,
+        interning the new ones in order of first appearance.
+        """
+        codes = self.codes
+        count = len(codes)
+        result = np.array([codes.setdefault(value, len(codes))
+                           for value in values], dtype=np.int32)
+        if len(codes) > count:
+            # Every occurrence of a new value writes it at its code
+            new = np.empty(len(codes) - count, dtype=object)
+            added = result >= count
+            new[result[added] - count] = np.array(values, dtype=object)[added]
+            self.values.extend(new.tolist())
+        return result
+
+
+    def fold_texts(self, fold):
+        """Method to return the searchable texts folded with fold, computing
+        those of the values interned since the last call. Texts are folded
+        lazily, on the first search.
+        """
+        searchable = self.folds.get(fold)
+        if searchable is None:
+            searchable = self.folds[fold] = SearchableText()
+        texts = searchable.texts
+        if len(texts) < len(self.values):
+            new = map(self.to_text, self.values[len(texts):])
+            texts.extend(map(fold, new) if fold is not None else new)
+        return searchable
+
+
+    def find(self, pattern, test, fold=None):
+        """Method to return a boolean array telling which distinct values
+        match: pattern is searched in the searchable text folded with
+        fold, and the values interned since it was built are tested with
+        test.
+        """
+        searchable = self.fold_texts(fold)
+        if searchable.text is None \
+                or len(self.values) - searchable.text_count > MAX_TAIL:
+            searchable.build()
+        texts = searchable.texts
+        matched = np.zeros(len(self.values), dtype=bool)
+        positions = np.fromiter(
+            (match.start() for match in pattern.finditer(searchable.text)),
+            dtype=np.int64)
+        if len(positions):
+            # Map every match to the value whose text it falls in
+            matched[np.searchsorted(searchable.starts, positions,
+                                    side="right") - 1] = True
+        for code in range(searchable.text_count, len(texts)):
+            matched[code] = test(texts[code])
+        return matched
+
+
+    def test(self, codes, test, fold=None):
+        """Method to return a boolean array telling which of the given
+        distinct values match test, applied to their searchable texts
+        folded with fold, every other value counting as not matching.
+        """
+        texts = self.fold_texts(fold).texts
+        matched = np.zeros(len(self.values), dtype=bool)
+        codes = codes.tolist()
+        matched[codes] = [test(texts[code]) for code in codes]
+        return matched
+
+
+
+class SearchableText:
+    """A class to hold the searchable texts of the distinct values of a
+    string column, folded one way, and the single text concatenating
+    them which patterns are searched in.
+    """
+
+    def __init__(self):
+        """Initializes an empty instance of the SearchableText class"""
+        self.texts = []
+        # Concatenated texts of the first text_count values and the ...
+        # ...position of the separator preceding each one
+        self.text = None
+        self.starts = None
+        self.text_count = 0
+
+
+    def build(self):
+        """Method to (re)build the concatenated text from every text."""
+        lengths = np.fromiter((len(text) + 1 for text in self.texts),
+                              dtype=np.int64, count=len(self.texts))
+        self.starts = np.cumsum(lengths) - lengths
+        self.text = SEPARATOR + SEPARATOR.join(self.texts) + SEPARATOR
+        self.text_count = len(self.texts)
+
+
+
+class ColumnarSnapshot:
+    """A class to hold an in-memory columnar copy of the 'books' table for
+    analytic queries: NumPy arrays of IDs and ratings, and categorical
+    title, author and ISBN columns. Searches and aggregates are computed
+    with vectorized operations over whole columns instead of reading
+    rows one at a time. Rows are kept in ID order; edits are applied in
+    place, and new records appended, as they are made.
+    """
+
+    def __init__(self):
+        """Initializes an empty instance of the ColumnarSnapshot class"""
+        self.size = 0
+        self.ids = np.empty(0, dtype=np.int64)
+        self.ratings = np.empty(0, dtype=np.float64)
+        # Whether each row is still in the table, deleted rows being ...
+        # ...only masked out
+        self.live = np.empty(0, dtype=bool)
+        self.titles = StringColumn(title_text)
+        self.authors = StringColumn(self.author_text)
+        self.isbns = StringColumn(isbn_text)
+        self.title_codes = np.empty(0, dtype=np.int32)
+        self.author_codes = np.empty(0, dtype=np.int32)
+        self.isbn_codes = np.empty(0, dtype=np.int32)
+        # Ratings stored as text, by row, returned as they are
+        self.rating_texts = {}
+        # Set when an edit cannot be applied in place and the snapshot ...
+        # ...must be reloaded
+        self.stale = False
+        # PRAGMA data_version of the connection when the snapshot was ...
+        # ...loaded, which changes once another connection commits
+        self.data_version = None
+        # Author names and, per author value, the codes of its names
+        self.names = []
+        self.name_codes = {}
+        self.value_names = []
+
+
+    @classmethod
+    def load(cls, conn, batch_size=BATCH_SIZE):
+        """Class method to load a snapshot of every record of the 'books'
+        table through the given connection.
+        """
+        snapshot = cls()
+        snapshot.data_version = conn.execute(
+            sql_queries.GET_DATA_VERSION).fetchone()[0]
+        cur = conn.execute(sql_queries.VIEW_RECORDS_BY_ID)
+        while True:
+            records = cur.fetchmany(batch_size)
+            if not records:
+                break
+            snapshot.append(records)
+        return snapshot
+
+
+    def is_current(self, conn):
+        """Method to check whether the snapshot still reflects the database,
+        i.e. no other connection has committed a change since it was
+        loaded and every edit could be applied.
+        """
+        return not self.stale and self.data_version == conn.execute(
+            sql_queries.GET_DATA_VERSION).fetchone()[0]
+
+
+    def reserve(self, count):
+        """Method to make room for count more rows in the column arrays."""
+        needed = self.size + count
+        if needed <= len(self.ids):
+            return
+        capacity = max(needed, int(len(self.ids) * GROWTH))
+        for name in ("ids", "ratings", "live", "title_codes", "author_codes",
+                     "isbn_codes"):
+            array = getattr(self, name)
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            setattr(self, name, grown)
+
+
+    def append(self, records):
+        """Method to append records whose IDs are greater than every ID in
+        the snapshot.
+        """
+        start, count = self.size, len(records)
+        if not count:
+            return
+        self.reserve(count)
+        end = start + count
+        ids, titles, authors_, ratings, isbns = zip(*records)
+        self.ids[start:end] = ids
+        try:
+            # NULL ratings convert to NaN; only text ratings need a ...
+            # ...conversion one by one
+            self.ratings[start:end] = np.array(ratings, dtype=np.float64)
+        except (TypeError, ValueError):
+            self.ratings[start:end] = [rating_value(rating)
+                                       for rating in ratings]
+            for position, rating in enumerate(ratings, start):
+                if isinstance(rating, str):
+                    self.rating_texts[position] = rating
+        self.live[start:end] = True
+        self.title_codes[start:end] = self.titles.intern_all(titles)
+        self.author_codes[start:end] = self.authors.intern_all(authors_)
+        self.isbn_codes[start:end] = self.isbns.intern_all(isbns)
+        self.size = end
+
+
+    def extend(self, records):
+        """Method to apply records added to the table, in ID order."""
+        if records and self.size and records[0][0] <= self.ids[self.size - 1]:
+            # Some IDs were held by records deleted since the load
+            for record in records:
+                self.put(record)
+        else:
+            self.append(records)
+
+
+    def position(self, record_id):
+        """Method to return the row of the record with the given ID, or None
+        if the snapshot never held it.
+        """
+        position = int(np.searchsorted(self.ids[:self.size], record_id))
+        if position < self.size and self.ids[position] == record_id:
+            return position
+        return None
+
+
+    def put(self, record):
+        """Method to apply an added or updated record, as stored in the
+        database.
+        """
+        position = self.position(record[0])
+        if position is None:
+            if self.size and record[0] < self.ids[self.size - 1]:
+                # Rows must stay in ID order; reload rather than shift them
+                self.stale = True
+            else:
+                self.append([record])
+            return
+        self.ratings[position] = rating_value(record[3])
+        self.live[position] = True
+        self.title_codes[position] = self.titles.intern(record[1])
+        self.author_codes[position] = self.authors.intern(record[2])
+        self.isbn_codes[position] = self.isbns.intern(record[4])
+        self.rating_texts.pop(position, None)
+        if isinstance(record[3], str):
+            self.rating_texts[position] = record[3]
+
+
+    def remove(self, record_id):
+        """Method to apply the deletion of a record."""
+        position = self.position(record_id)
+        if position is not None:
+            self.live[position] = False
+
+
+    def match(self, column, codes, mask, pattern, test, fold=None):
+        """Method to return the boolean mask of the rows whose value in a
+        string column matches, its searchable text being folded with
+        fold. When few rows are left by mask, only their distinct values
+        are tested; otherwise the pattern is searched once in the
+        searchable text of the whole column.
+        """
+        if np.count_nonzero(mask) < len(column.values) * CANDIDATE_RATIO:
+            seen = np.zeros(len(column.values), dtype=bool)
+            seen[codes[mask]] = True
+            matched = column.test(np.flatnonzero(seen), test, fold)
+        else:
+            matched = column.find(pattern, test, fold)
+        return matched[codes]
+
+
+    def filter(self, title="", author="", rating="", isbn="",
+               search_mode=search.TRIGRAM_MODE):
+        """Method to return the rows of the records matching a search, in
+        ID order, as an array of positions. Titles and author names are
+        matched as substrings, folded as by the SQL search of the given
+        substring mode: case-folded through the trigram index, or only
+        their ASCII letters lower-cased by LIKE, e.g. with an input too
+        short for the index. Ratings and ISBNs are matched as in the SQL
+        search. The cheap numeric filters run first. Raises ValueError if
+        the rating is invalid.
+        """
+        size = self.size
+        mask = self.live[:size].copy()
+        if rating.strip():
+            ratings = self.ratings[:size]
+            for operator, bound in search.parse_rating(rating):
+                mask &= COMPARISONS[operator](ratings, bound)
+
+        isbn_key = search.normalize_isbn(isbn)
+        if isbn_key:
+            pattern = re.compile(re.escape(SEPARATOR + isbn_key))
+            mask &= self.match(self.isbns, self.isbn_codes[:size], mask,
+                               pattern,
+                               lambda text: text.startswith(isbn_key))
+
+        for column, codes, text in (
+                (self.titles, self.title_codes, title),
+                (self.authors, self.author_codes, author)):
+            text = clean_input(text)
+            if text:
+                fold, pattern, test = substring_matcher(text, search_mode)
+                mask &= self.match(column, codes[:size], mask, pattern,
+                                   test, fold)
+        return np.flatnonzero(mask)
+
+
+    def records(self, positions):
+        """Method to return the records at the given rows as (ID, Title,
+        Author, Rating, ISBN) tuples, like the rows read from SQLite.
+        """
+        ratings = self.ratings[positions].tolist()
+        return [
+            (record_id,
+             self.titles.values[title],
+             self.authors.values[author],
+             self.rating_texts.get(position, None if math.isnan(rating)
+                                   else rating),
+             self.isbns.values[isbn])
+            for position, record_id, title, author, rating, isbn in zip(
+                positions.tolist(), self.ids[positions].tolist(),
+                self.title_codes[positions].tolist(),
+                self.author_codes[positions].tolist(), ratings,
+                self.isbn_codes[positions].tolist())
+        ]
+
+
+    def rating_summary(self, positions):
+        """Method to return the number of rows, of rated rows and the mean,
+        lowest and highest numeric rating of the given rows.
+        """
+        ratings = self.ratings[positions]
+        ratings = ratings[np.isfinite(ratings)]
+        summary = {"count": len(positions), "rated": len(ratings),
+                   "mean_rating": None, "min_rating": None,
+                   "max_rating": None}
+        if len(ratings):
+            summary.update(mean_rating=float(ratings.mean()),
+                           min_rating=float(ratings.min()),
+                           max_rating=float(ratings.max()))
+        return summary
+
+
+    def name_code(self, name):
+        """Method to return the code of an author name, the spelling of an
+        author being the first one seen, whatever its case.
+        """
+        key = authors.name_key(name)
+        code = self.name_codes.get(key)
+        if code is None:
+            code = self.name_codes[key] = len(self.names)
+            self.names.append(name)
+        return code
+
+
+    def author_text(self, author):
+        """Method to return the searchable text of an Author value, before it
+        is folded: the names of its authors, separated so that a search
+        never matches across two of them. Each author is spelled as first
+        seen, as the 'authors' table the SQL search matches keeps the
+        first spelling of every author.
+        """
+        return NAME_SEPARATOR.join(self.names[self.name_code(name)]
+                                   for name in authors.split_authors(author))
+
+
+    def index_names(self):
+        """Method to split the author values interned since the last call
+        into names, returning the flattened name codes of every value and
+        the offset of each value's codes in them.
+        """
+        for value in self.authors.values[len(self.value_names):]:
+            self.value_names.append([self.name_code(name) for name
+                                     in authors.split_authors(value)])
+        counts = np.fromiter((len(codes) for codes in self.value_names),
+                             dtype=np.int64, count=len(self.value_names))
+        flat = np.fromiter((code for codes in self.value_names
+                            for code in codes), dtype=np.int64,
+                           count=int(counts.sum()))
+        return flat, np.cumsum(counts) - counts, counts
+
+
+    def ratings_by_author(self, positions, limit=20, min_books=1):
+        """Method to return the authors of the given rows with their number
+        of rated books and mean rating, best mean first, as (name, books,
+        mean rating) tuples. Each author of a book is credited with its
+        rating.
+        """
+        flat, offsets, counts = self.index_names()
+        ratings = self.ratings[positions]
+        rated = np.isfinite(ratings)
+        values = self.author_codes[positions][rated]
+        ratings = ratings[rated]
+        # Expand every row into one entry per author name
+        repeats = counts[values]
+        ends = np.cumsum(repeats)
+        entries = np.repeat(offsets[values] - (ends - repeats), repeats) \
+            + np.arange(ends[-1] if len(ends) else 0)
+        names = flat[entries]
+        books = np.bincount(names, minlength=len(self.names))
+        totals = np.bincount(names, np.repeat(ratings, repeats),
+                             minlength=len(self.names))
+        eligible = np.flatnonzero(books >= max(min_books, 1))
+        means = totals[eligible] / books[eligible]
+        order = np.lexsort((-books[eligible], -means))[:limit]
+        return [(self.names[code], int(books[code]), float(mean))
+                for code, mean in zip(eligible[order].tolist(),
+                                      means[order].tolist())]
+
+
+    def top_rated(self, positions, k=10):
+        """Method to return the k best rated of the given rows, best first,
+        ties broken by ID.
+        """
+        ratings = self.ratings[positions]
+        positions = positions[np.isfinite(ratings)]
+        ratings = self.ratings[positions]
+        if 0 < k < len(positions):
+            best = np.argpartition(-ratings, k - 1)[:k]
+            # Keep every row tied with the k-th best, then sort them all
+            kth = ratings[best].min()
+            best = np.flatnonzero(ratings >= kth)
+            positions, ratings = positions[best], ratings[best]
+        order = np.lexsort((self.ids[positions], -ratings))[:k]
+        return positions[order]
@@ -0,0 +1,130 @@
+import csv
+import itertools
+import json
+import time
+from book_store import FIELDS, BATCH_SIZE, record_to_dict
+
+
+
+# Export formats, by file extension
+FORMATS = {
+    ".csv": "csv",
+    ".jsonl": "jsonl",
+    ".json": "jsonl",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+}
+
+
+
+def detect_format(path):
+    """Function to return the export format matching the extension of a
+    file path, JSON lines by default.
+    """
+    for extension, export_format in FORMATS.items():
+        if path.lower().endswith(extension):
+            return export_format
+    return "jsonl"
+
+
+def batched(records, batch_size=BATCH_SIZE):
+    """Generator function to group records streamed one at a time into
+    lists of at most batch_size records.
+    """
+    records = iter(records)
+    while True:
+        batch = list(itertools.islice(records, batch_size))
+        if not batch:
+            break
+        yield batch
+
+
+def write_csv(batches, path):
+    """Function to write batches of records to a CSV file with a header
+    row. Returns the number of records written.
+    """
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as out_file:
+        writer = csv.writer(out_file)
+        writer.writerow(FIELDS)
+        for batch in batches:
+            writer.writerows(batch)
+            count += len(batch)
+    return count
+
+
+def write_jsonl(batches, path):
+    """Function to write batches of records to a JSON-lines file, one
+    object keyed on the lower-case column names per line. Returns the
+    number of records written.
+    """
+    count = 0
+    with open(path, "w", encoding="utf-8") as out_file:
+        for batch in batches:
+            out_file.write("".join(
+                json.dumps(record_to_dict(record), ensure_ascii=False) + "\n"
+                for record in batch))
+            count += len(batch)
+    return count
+
+
+def write_parquet(batches, path):
+    """Function to write batches of records to a Parquet file, one row
+    group per batch, so that the file is never held in memory. Ratings
+    are stored as doubles, a rating which is not a number being written
+    as null. Returns the number of records written. Requires pyarrow.
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("the Parquet export requires pyarrow, "
+                          "e.g. pip install pyarrow") from None
+    schema = pyarrow.schema([
+        (FIELDS[0], pyarrow.int64()),
+        (FIELDS[1], pyarrow.string()),
+        (FIELDS[2], pyarrow.string()),
+        (FIELDS[3], pyarrow.float64()),
+        (FIELDS[4], pyarrow.string()),
+    ])
+    count = 0
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        for batch in batches:
+            ids, titles, authors, ratings, isbns = zip(*batch)
+            ratings = [rating if isinstance(rating, (int, float)) else None
+                       for rating in ratings]
+            columns = [ids, titles, authors, ratings, isbns]
+            writer.write_batch(pyarrow.record_batch(
+                [pyarrow.array(column, type=field.type)
+                 for column, field in zip(columns, schema)],
+                schema=schema))
+            count += len(batch)
+    return count
+
+
+# Writer of each export format
+WRITERS = {
+    "csv": write_csv,
+    "jsonl": write_jsonl,
+    "parquet": write_parquet,
+}
+
+
+def export(batches, path, export_format=None):
+    """Function to stream batches of records, e.g. from
+    BookStore.iter_batches, into a CSV, JSON-lines or Parquet file, one
+    batch at a time, so that memory stays flat whatever the number of
+    records. The format defaults to the file extension. Returns a report
+    of the number of records written and the throughput.
+    """
+    export_format = export_format or detect_format(path)
+    start = time.perf_counter()
+    count = WRITERS[export_format](batches, path)
+    seconds = time.perf_counter() - start
+    return {
+        "exported": count,
+        "path": path,
+        "format": export_format,
+        "seconds": round(seconds, 3),
+        "records_per_second": round(count / seconds) if seconds else None,
+    }
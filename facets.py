@@ -0,0 +1,132 @@
+import collections
+import sql_queries
+
+
+
+# Metadata key recording that the 'facets' table has been populated and ...
+# ...its triggers created
+INDEX_KEY = "facets_index"
+
+# Facets of the 'facets' table, as named in its triggers
+RATING = "rating"
+INITIAL = "initial"
+AUTHOR = "author"
+
+# Rating band of the records whose rating is not a number
+UNRATED = "unrated"
+
+# Width of the rating bands, the highest rating and the precision of ...
+# ...the ratings, e.g. 4.49 being the last rating of the 4-4.49 band
+BAND_WIDTH = 0.5
+MAX_RATING = 5.0
+RATING_STEP = 0.01
+
+# Default number of authors with the most books listed
+AUTHORS_LIMIT = 10
+
+
+
+def is_built(cur):
+    """Function to check whether the 'facets' table has been populated and
+    is kept in sync with every edit by its triggers.
+    """
+    cur.execute(sql_queries.SELECT_METADATA)
+    return dict(cur.fetchall()).get(INDEX_KEY) == "1"
+
+
+def drop_triggers(cur):
+    """Function to stop maintaining the facet counts row by row, e.g. while
+    a bulk load replaces every record, before rebuild() recounts them.
+    """
+    for statement in sql_queries.DROP_FACET_TRIGGERS:
+        cur.execute(statement)
+
+
+def rebuild(cur):
+    """Function to recount every facet value from the 'books' and
+    'book_authors' tables in one pass each, then keep the counts in sync
+    with every insert, update and delete through triggers. It runs inside
+    the caller's transaction, e.g. right after a bulk load.
+    """
+    drop_triggers(cur)
+    for statement in sql_queries.REBUILD_FACETS:
+        cur.execute(statement)
+    for statement in sql_queries.CREATE_FACET_TRIGGERS:
+        cur.execute(statement)
+    cur.execute(sql_queries.UPSERT_METADATA, (INDEX_KEY, "1"))
+
+
+def ensure_index(conn):
+    """Function to make sure the 'facets' table is populated, e.g. in a
+    database created before it existed.
+    """
+    cur = conn.cursor()
+    if not is_built(cur):
+        conn.commit()
+        with conn:
+            # Open the transaction explicitly, since sqlite3 does not do ...
+            # ...so for DDL statements
+            cur.execute("BEGIN")
+            rebuild(cur)
+
+
+def band_filter(band):
+    """Function to return the rating filter selecting the records of a
+    rating band, given by its lower bound, e.g. '4-4.49', or None for the
+    unrated records.
+    """
+    if band == UNRATED:
+        return None
+    high = MAX_RATING if band + BAND_WIDTH >= MAX_RATING \
+        else band + BAND_WIDTH - RATING_STEP
+    return f"{band:g}-{round(high, 2):g}"
+
+
+def format_counts(rating_bands, initials, top_authors):
+    """Function to arrange the (value, books) counts of the rating bands,
+    title initials and authors into the facets of a search, ready to be
+    written as JSON: the total number of records, the rating bands in
+    ascending order, named after the rating filter selecting each one
+    (the unrated records last), the initials in alphabetical order and
+    the authors with the most books.
+    """
+    # Unrated records last, the bands in ascending order before them
+    rating_bands = sorted(
+        rating_bands,
+        key=lambda count: (1, 0) if count[0] == UNRATED else (0, count[0]))
+    return {
+        "total": sum(books for _, books in rating_bands),
+        RATING: [{"band": band_filter(band) or UNRATED, "books": books}
+                 for band, books in rating_bands],
+        INITIAL: [{"initial": initial, "books": books}
+                  for initial, books in sorted(initials)],
+        AUTHOR: [{"author": name, "books": books}
+                 for name, books in top_authors],
+    }
+
+
+def count(conn, conditions=(), values=(), authors_limit=AUTHORS_LIMIT):
+    """Function to count the records meeting the conditions by rating band,
+    title initial and author. Without conditions, the counts are read
+    from the 'facets' table in roughly constant time; otherwise they are
+    aggregated over the IDs selected by the indexes serving the search.
+    See format_counts for the result.
+    """
+    conditions, values = tuple(conditions), tuple(values)
+    if not conditions and is_built(conn.cursor()):
+        return format_counts(
+            conn.execute(sql_queries.SELECT_FACET, (RATING,)).fetchall(),
+            conn.execute(sql_queries.SELECT_FACET, (INITIAL,)).fetchall(),
+            conn.execute(sql_queries.SELECT_TOP_AUTHORS,
+                         (authors_limit,)).fetchall())
+    where = " AND ".join(conditions) or "1"
+    rating_bands = collections.Counter()
+    initials = collections.Counter()
+    for band, initial, books in conn.execute(
+            sql_queries.COUNT_BANDS_INITIALS.format(where=where), values):
+        rating_bands[band] += books
+        initials[initial] += books
+    return format_counts(
+        rating_bands.items(), initials.items(),
+        conn.execute(sql_queries.COUNT_MATCHING_AUTHORS.format(where=where),
+                     values + (authors_limit,)).fetchall())
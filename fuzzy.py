@@ -0,0 +1,282 @@
+import heapq
+import itertools
+import math
+import re
+from collections import Counter
+import sql_queries
+import search
+import ingest
+
+
+
+# Metadata key recording that the fuzzy index is built and maintained
+INDEX_KEY = "fuzzy_index"
+
+# Terms shorter than this are left out of the vocabulary, e.g. initials
+MIN_TERM_LENGTH = 2
+
+# Number of closest terms a search word is expanded into
+MAX_EXPANSIONS = 8
+
+# Largest number of combinations of close terms, one per word entered, ...
+# ...spread over the queries of a fuzzy search, beyond which the words ...
+# ...entered last are no longer told apart by how close their terms are
+MAX_COMBINATIONS = 64
+
+# Number of records read at once when the index is rebuilt
+BATCH_SIZE = 10_000
+
+
+
+def terms(text):
+    """Function to split a title or author into case-folded terms, the
+    way the trigram full-text index compares them. Accents are kept, so
+    that every term can be looked up in that index as it is.
+    """
+    if not text:
+        return []
+    return [term for term in re.findall(r"[^\W_]+", str(text).casefold())
+            if len(term) >= MIN_TERM_LENGTH]
+
+
+def trigrams(term):
+    """Function to return the set of character trigrams of a term, padded
+    so that its first and last characters weigh as much as the others.
+    """
+    padded = f"${term}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_distance(word):
+    """Function to return how many typos are tolerated in a search word:
+    none in very short words, one in short words and two otherwise.
+    """
+    if len(word) <= 2:
+        return 0
+    return 1 if len(word) <= 5 else 2
+
+
+def edit_distance(a, b, limit):
+    """Function to compute the optimal string alignment distance between two
+    strings, i.e. the number of insertions, deletions, substitutions and
+    transpositions of adjacent characters turning one into the other
+    ('tolkein' is one edit away from 'tolkien'). Returns limit + 1 as soon
+    as the distance is known to exceed limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            distance = min(previous[j] + 1, current[j - 1] + 1,
+                           previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] \
+                    and a[i - 2] == b[j - 1]:
+                distance = min(distance, previous2[j - 2] + 1)
+            current[j] = distance
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+def is_built(cur):
+    """Function to check whether the fuzzy index has been built, in which
+    case every edit of the 'books' table must be applied to it.
+    """
+    return ingest.read_metadata(cur).get(INDEX_KEY) == "1"
+
+
+def record_terms(title, author):
+    """Function to return the set of distinct terms of a record."""
+    return set(terms(title)) | set(terms(author))
+
+
+def add_terms(cur, counts):
+    """Function to add the term counts of one or more records to the
+    vocabulary, indexing the trigrams of the terms seen for the first
+    time.
+    """
+    for term, count in counts.items():
+        cur.execute(sql_queries.UPDATE_FUZZY_FREQUENCY, (count, term))
+        if cur.rowcount == 0:
+            cur.execute(sql_queries.INSERT_FUZZY_TERM,
+                        (term, len(term), count))
+            cur.executemany(sql_queries.INSERT_FUZZY_TRIGRAM,
+                            ((trigram, term) for trigram in trigrams(term)))
+
+
+def remove_terms(cur, counts):
+    """Function to remove the term counts of one or more records from the
+    vocabulary, dropping the terms no record contains any more.
+    """
+    for term, count in counts.items():
+        cur.execute(sql_queries.UPDATE_FUZZY_FREQUENCY, (-count, term))
+        cur.execute(sql_queries.DELETE_FUZZY_TERM, (term,))
+        if cur.rowcount:
+            cur.executemany(sql_queries.DELETE_FUZZY_TRIGRAM,
+                            ((trigram, term) for trigram in trigrams(term)))
+
+
+def index_records(cur, records):
+    """Function to add the terms of new (title, author) records to the
+    index.
+    """
+    counts = Counter()
+    for title, author in records:
+        counts.update(record_terms(title, author))
+    add_terms(cur, counts)
+
+
+def unindex_record(cur, title, author):
+    """Function to remove the terms of a deleted record from the index."""
+    remove_terms(cur, Counter(record_terms(title, author)))
+
+
+def reindex_record(cur, old, new):
+    """Function to apply the change of a record's (title, author) to the
+    index, touching only the terms that were added or removed.
+    """
+    old_terms, new_terms = record_terms(*old), record_terms(*new)
+    remove_terms(cur, Counter(old_terms - new_terms))
+    add_terms(cur, Counter(new_terms - old_terms))
+
+
+def rebuild_index(conn, query=sql_queries.VIEW_RECORDS, params=()):
+    """Function to (re)build the fuzzy index from the records returned by
+    query, which defaults to the whole 'books' table, inside a single
+    transaction, and to mark it as built.
+    """
+    counts = Counter()
+    cur = conn.execute(query, params)
+    while True:
+        records = cur.fetchmany(BATCH_SIZE)
+        if not records:
+            break
+        for record in records:
+            counts.update(record_terms(record[1], record[2]))
+    with conn:
+        cur = conn.cursor()
+        for statement in sql_queries.CLEAR_FUZZY_INDEX:
+            cur.execute(statement)
+        cur.executemany(sql_queries.INSERT_FUZZY_TERM,
+                        ((term, len(term), count)
+                         for term, count in counts.items()))
+        cur.executemany(sql_queries.INSERT_FUZZY_TRIGRAM,
+                        ((trigram, term) for term in counts
+                         for trigram in trigrams(term)))
+        cur.execute(sql_queries.UPSERT_METADATA, (INDEX_KEY, "1"))
+
+
+def drop_index(conn):
+    """Function to empty the fuzzy index and stop maintaining it, e.g.
+    when the whole table is reloaded outside of the fuzzy search mode.
+    """
+    with conn:
+        for statement in sql_queries.CLEAR_FUZZY_INDEX:
+            conn.execute(statement)
+        conn.execute(sql_queries.UPSERT_METADATA, (INDEX_KEY, "0"))
+
+
+def ensure_index(conn):
+    """Function to make sure the fuzzy index is built, building it from the
+    'books' table if needed.
+    """
+    if not is_built(conn.cursor()):
+        rebuild_index(conn)
+
+
+def expand_word(cur, word):
+    """Function to return the vocabulary terms close enough to a search
+    word, closest and most frequent first, as (distance, term) tuples.
+    Candidates are the terms sharing enough trigrams with the word: each
+    edit changes at most four of its trigrams (a transposition).
+    """
+    limit = max_distance(word)
+    grams = trigrams(word)
+    min_shared = max(len(grams) - 4 * limit, 1)
+    cur.execute(
+        sql_queries.SELECT_FUZZY_CANDIDATES.format(
+            placeholders=", ".join("?" * len(grams))),
+        (*grams, len(word) - limit, len(word) + limit, min_shared),
+    )
+    expansions = []
+    for term, frequency in cur.fetchall():
+        distance = edit_distance(word, term, limit)
+        if distance <= limit:
+            expansions.append((distance, -frequency, term))
+    expansions.sort()
+    return [(distance, term)
+            for distance, _, term in expansions[:MAX_EXPANSIONS]]
+
+
+def build_fuzzy_tiers(cur, title, author):
+    """Function to rank the terms close to every word entered before any
+    record is read, and group them into full-text queries by the total
+    number of edits between the words and the terms they match: the first
+    query matches the records holding the closest term of every word, the
+    next ones the records a single edit further, and so on. Words without
+    any close term are ignored. Returns a list of (edits, query) tuples,
+    fewest edits first, each query to be bound to FTS_MATCH_CONDITION.
+    """
+    words = []
+    for column, text in (("Title", title), ("Author", author)):
+        for word in terms(text):
+            by_distance = {}
+            for distance, term in expand_word(cur, word):
+                if len(term) >= search.TRIGRAM_MIN_LENGTH:
+                    by_distance.setdefault(distance, []).append(
+                        search.quote_fts_phrase(term))
+            if by_distance:
+                words.append([(distance, column, phrases)
+                              for distance, phrases
+                              in sorted(by_distance.items())])
+    if not words:
+        return []
+    # Past MAX_COMBINATIONS, the close terms of the words entered last ...
+    # ...are matched at once, as if all of them were the closest one
+    for index in reversed(range(len(words))):
+        if math.prod(map(len, words)) <= MAX_COMBINATIONS:
+            break
+        distance, column, _ = words[index][0]
+        words[index] = [(distance, column,
+                         [phrase for _, _, phrases in words[index]
+                          for phrase in phrases])]
+    tiers = {}
+    for combination in itertools.product(*words):
+        edits = sum(distance for distance, _, _ in combination)
+        tiers.setdefault(edits, []).append(" AND ".join(
+            "{%s} : (%s)" % (column, " OR ".join(phrases))
+            for _, column, phrases in combination))
+    return [(edits, " OR ".join(f"({query})" for query in queries))
+            for edits, queries in sorted(tiers.items())]
+
+
+def score(record, title_words, author_words):
+    """Function to score how closely a record matches the words entered,
+    as the total number of edits between each word and the closest term
+    of the record (lower is better).
+    """
+    total = 0
+    for words, value in ((title_words, record[1]), (author_words, record[2])):
+        if not words:
+            continue
+        value_terms = set(terms(value))
+        for word in words:
+            limit = max_distance(word) + 1
+            total += min((edit_distance(word, term, limit)
+                          for term in value_terms), default=limit)
+    return total
+
+
+def rank(records, title, author, k=search.RANKED_LIMIT):
+    """Function to return the k records closest to the title and author
+    entered, best first, ties broken by ID.
+    """
+    title_words, author_words = terms(title), terms(author)
+    return heapq.nsmallest(
+        k, records,
+        key=lambda record: (score(record, title_words, author_words),
+                            record[0]))
@@ -0,0 +1,583 @@
+"""Local HTTP service exposing the book database to other tools as JSON.
+
+Endpoints:
+    GET    /books?title=&author=&rating=&isbn=&after=&limit=
+    GET    /books?...&ranked=1&offset=     most relevant first
+    GET    /books?by_author=               the books by an exact author name
+    GET    /books?...&facets=1             with the counts of the matching
+                                           records by rating band, title
+                                           initial and author
+    POST   /books           body: {"title", "author", "rating", "isbn"}
+    PUT    /books/<id>      body: any of {"title", "author", "rating",
+                            "isbn"}, the fields omitted being kept
+    DELETE /books/<id>
+    GET    /metrics         operation timings, when metrics are enabled
+
+Searches are paged by ID: pass the "next" value of a response as the
+"after" parameter to fetch the following page. Ranked searches are paged
+by rank: pass "next" as the "offset" parameter instead. Run from the repository
+root with:
+    python -m http_service --port 8080
+Add --processes N to serve searches from N worker processes instead of
+threads, and --snapshot-interval SECONDS to have them read a snapshot copy
+of the database refreshed at that interval.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import queue
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+import search
+import metrics
+import authors
+from book_store import BookStore, DATABASE_PATH, FIELDS, record_to_dict
+from query_worker import QueryWorker
+
+
+
+# Default address the service listens on, local connections only
+HOST = "127.0.0.1"
+PORT = 8080
+
+# Default number of read-only connections serving searches concurrently
+POOL_SIZE = 4
+
+# Seconds a request may take to be read and answered before it fails ...
+# ...with 504, and seconds an idle keep-alive connection is kept open
+REQUEST_TIMEOUT = 5.0
+KEEP_ALIVE_TIMEOUT = 15.0
+
+# Default and largest number of records returned by one search request
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Types of JSON value accepted for each field of a record, besides null
+FIELD_TYPES = {
+    "title": (str,),
+    "author": (str,),
+    "rating": (int, float, str),
+    "isbn": (str,),
+}
+
+# Largest request body accepted, in bytes
+MAX_BODY_SIZE = 64 * 1024
+
+# Delay in seconds between two checks of the writer for finished writes
+POLL_INTERVAL = 0.002
+
+# Reason phrases of the status codes the service answers with
+REASONS = {
+    200: "OK",
+    201: "Created",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    408: "Request Timeout",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    504: "Gateway Timeout",
+}
+
+
+
+class HTTPError(Exception):
+    """An exception carrying the HTTP status a request is answered with."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+
+def parse_record(body):
+    """Function to read the title, author, rating and isbn fields of a book
+    record from a JSON request body. Returns a dictionary of the fields
+    given, other keys being ignored. Raises HTTPError if the body is
+    invalid or a field is not of an accepted type.
+    """
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        raise HTTPError(400, "the request body is not valid JSON")
+    if not isinstance(data, dict):
+        raise HTTPError(400, "the request body must be a JSON object")
+    record = {}
+    for field, types in FIELD_TYPES.items():
+        if field not in data:
+            continue
+        value = data[field]
+        # JSON booleans are ints in Python, but never a rating
+        if value is not None and (isinstance(value, bool)
+                                  or not isinstance(value, types)):
+            expected = "a number or a string" if float in types \
+                else "a string"
+            raise HTTPError(400, f"{field} must be {expected} or null")
+        record[field] = value
+    return record
+
+
+def parse_int(fields, name, default=None, minimum=None):
+    """Function to read an integer query parameter, or return default if it
+    is absent or empty. Raises HTTPError if it is not an integer or is
+    below minimum.
+    """
+    value = fields.get(name)
+    if not value:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise HTTPError(400, f"{name} must be an integer, not {value!r}")
+    if minimum is not None and number < minimum:
+        raise HTTPError(400, f"{name} must be at least {minimum}")
+    return number
+
+
+def update_record(store, record_id, record):
+    """Function to update the fields given in record of the book record
+    with the given ID, keeping the stored value of the others. Returns
+    whether such a record exists.
+    """
+    stored = store.fetch_record(record_id)
+    if stored is None:
+        return False
+    merged = {**record_to_dict(stored), **record}
+    return store.update(record_id, *(merged[field] for field in FIELDS[1:]))
+
+
+def parse_record_id(path):
+    """Function to read the record ID from a /books/<id> path."""
+    try:
+        return int(path.rsplit("/", 1)[1])
+    except ValueError:
+        raise HTTPError(404, f"no such resource: {path}")
+
+
+def build_conditions(store, fields):
+    """Function to build the SQL conditions and values of a search, fields
+    mapping the title, author, rating, isbn and by_author parameters to
+    their values.
+    """
+    conditions, values = store.build_search(
+        fields.get("title", ""), fields.get("author", ""),
+        fields.get("rating", ""), fields.get("isbn", ""))
+    if fields.get("by_author", "").strip():
+        author_conditions, author_values = \
+            authors.by_author_conditions(fields["by_author"])
+        conditions += author_conditions
+        values += author_values
+    return conditions, values
+
+
+def search_page(store, fields, after_id, offset, ranked, limit):
+    """Function to run a search on a store, given the fields of
+    build_conditions. Returns one page of records and whether the search
+    is paged. A module-level function, so that it can also run in the
+    worker processes of a ReadPool.
+    """
+    title, author = fields.get("title", ""), fields.get("author", "")
+    if store.search_mode == search.FUZZY_MODE \
+            and not fields.get("by_author", "").strip() \
+            and (title.strip() or author.strip()):
+        return store.fuzzy_search(title, author, fields.get("rating", ""),
+                                  fields.get("isbn", ""), limit), False
+    conditions, values = build_conditions(store, fields)
+    if ranked:
+        return store.fetch_ranked(conditions, values, offset, limit), True
+    return store.fetch_page(conditions, values, after_id,
+                            page_size=limit), True
+
+
+def search_facets(store, fields):
+    """Function to count the records matching a search, given the fields of
+    build_conditions, by rating band, title initial and author.
+    """
+    conditions, values = build_conditions(store, fields)
+    return store.facet_counts(conditions, values)
+
+
+
+class BookService:
+    """A class to serve the book database over HTTP/1.1 with asyncio.
+    Searches run concurrently on a pool of read-only SQLite connections,
+    each used by one executor thread at a time, while every edit goes to
+    a single writer: a QueryWorker which group-commits the edits and
+    acknowledges each one only once it is committed. All the connections
+    share one query cache, which the writer invalidates on every edit.
+    With processes set, searches run on a ReadPool of worker processes
+    instead, so that they scale with the number of cores; the workers
+    read the database itself, or with snapshot_interval set, a snapshot
+    copy refreshed every snapshot_interval seconds, so that searches may
+    lag the edits by up to that long.
+    """
+
+    def __init__(self, database=DATABASE_PATH, search_mode=search.TRIGRAM_MODE,
+                 pool_size=POOL_SIZE, request_timeout=REQUEST_TIMEOUT,
+                 keep_alive_timeout=KEEP_ALIVE_TIMEOUT, processes=0,
+                 snapshot_interval=None):
+        """Initializes an instance of the BookService class. The writer is
+        opened first, as it sets up the schema and the full-text index the
+        read-only connections rely on.
+        """
+        self.request_timeout = request_timeout
+        self.keep_alive_timeout = keep_alive_timeout
+        self.snapshot_interval = snapshot_interval
+        self.worker = QueryWorker(
+            lambda: BookStore(database, search_mode))
+        cache = self.worker.store.cache
+        search_mode = self.worker.store.search_mode
+        # Idle read-only stores, taken by the executor threads in turn
+        self.readers = queue.Queue()
+        self.pool = None
+        if processes:
+            # Imported here, as multiprocessing is only needed with processes
+            from read_pool import ReadPool
+            self.pool = ReadPool(database, search_mode, processes,
+                                 snapshot=snapshot_interval is not None)
+        else:
+            for _ in range(pool_size):
+                self.readers.put(
+                    BookStore(database, search_mode, cache, read_only=True))
+        self.executor = ThreadPoolExecutor(max_workers=pool_size,
+                                           thread_name_prefix="reader")
+        self.server = None
+        self.poller = None
+        self.refresher = None
+
+
+    async def start(self, host=HOST, port=PORT):
+        """Method to start listening for connections and delivering the
+        outcomes of the writes. Returns the asyncio server.
+        """
+        self.server = await asyncio.start_server(
+            self.handle_connection, host, port)
+        self.poller = asyncio.create_task(self.poll_writer())
+        if self.pool is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.pool.warm_up)
+            if self.pool.snapshot:
+                self.refresher = asyncio.create_task(self.refresh_snapshot())
+        return self.server
+
+
+    async def close(self):
+        """Method to stop serving, commit the pending writes and close every
+        connection.
+        """
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        await asyncio.get_running_loop().run_in_executor(
+            None, self.worker.close)
+        if self.poller is not None:
+            self.poller.cancel()
+            self.worker.deliver()
+        if self.refresher is not None:
+            self.refresher.cancel()
+        self.executor.shutdown()
+        if self.pool is not None:
+            self.pool.close()
+        while not self.readers.empty():
+            self.readers.get_nowait().conn.close()
+
+
+    async def poll_writer(self):
+        """Method run as a task to deliver the outcomes of the committed
+        writes to the requests waiting for them.
+        """
+        while True:
+            self.worker.deliver()
+            await asyncio.sleep(POLL_INTERVAL)
+
+
+    async def refresh_snapshot(self):
+        """Method run as a task to replace the snapshot read by the worker
+        processes with a fresh copy every snapshot_interval seconds.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            with metrics.timer("read_pool.refresh"):
+                await loop.run_in_executor(self.executor, self.pool.refresh)
+
+
+    async def read(self, task, *args):
+        """Method to run task(store, *args) on an idle read-only store in the
+        executor, or on a worker process of the pool, and return its
+        result. A task still running on a thread when the request times
+        out is interrupted, so that it releases its connection; one
+        running on a worker process runs to completion. The store is
+        only interrupted while the task still holds it, never once it is
+        back among the idle stores, where another request may take it.
+        """
+        if self.pool is not None:
+            return await asyncio.wrap_future(self.pool.submit(task, *args))
+        running = []
+        lock = threading.Lock()
+
+        def run():
+            store = self.readers.get()
+            with lock:
+                running.append(store)
+            try:
+                return task(store, *args)
+            finally:
+                with lock:
+                    running.remove(store)
+                self.readers.put(store)
+
+        future = asyncio.get_running_loop().run_in_executor(self.executor, run)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            with lock:
+                for store in running:
+                    store.conn.interrupt()
+            raise
+
+
+    def write(self, task):
+        """Method to submit task to the writer. Returns a future resolved
+        with its result once it is committed.
+        """
+        future = asyncio.get_running_loop().create_future()
+
+        def resolve(result):
+            if not future.done():
+                future.set_result(result)
+
+        def reject(error):
+            if not future.done():
+                future.set_exception(error)
+
+        self.worker.submit(task, resolve, errback=reject, write=True)
+        return future
+
+
+    async def handle_connection(self, reader, writer):
+        """Method to serve the requests of one client connection, which is
+        kept open between requests unless the client asks otherwise.
+        """
+        try:
+            while True:
+                # Wait for the next request of a kept-alive connection
+                try:
+                    request_line = await asyncio.wait_for(
+                        reader.readline(), self.keep_alive_timeout)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line.strip():
+                    break
+                try:
+                    status, payload, keep_alive = await asyncio.wait_for(
+                        self.handle_request(request_line, reader),
+                        self.request_timeout)
+                except asyncio.TimeoutError:
+                    status, payload, keep_alive = \
+                        504, {"error": "the request timed out"}, False
+                self.send(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+    async def handle_request(self, request_line, reader):
+        """Method to read one request after its request line and answer it.
+        Returns the status, the JSON payload and whether the connection
+        should be kept open.
+        """
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError:
+            return 400, {"error": "malformed request line"}, False
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" \
+            else connection == "keep-alive"
+        try:
+            length = int(headers.get("content-length", 0))
+            if length > MAX_BODY_SIZE:
+                raise HTTPError(413, "the request body is too large")
+            body = await reader.readexactly(length) if length else b""
+            status, payload = await self.dispatch(method, target, body)
+        except HTTPError as error:
+            status, payload = error.status, {"error": str(error)}
+        except ValueError as error:
+            # Invalid input, e.g. a malformed rating or Content-Length
+            status, payload = 400, {"error": str(error)}
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            status, payload = 500, {"error": repr(error)}
+        return status, payload, keep_alive
+
+
+    async def dispatch(self, method, target, body):
+        """Method to route a request to the search, add, update or delete
+        operation. Returns the status and the JSON payload.
+        """
+        url = urlsplit(target)
+        path = url.path.rstrip("/")
+        if path == "/metrics" and method == "GET":
+            return 200, {"enabled": metrics.enabled,
+                         "operations": metrics.registry.snapshot()}
+        if path == "/books":
+            if method == "GET":
+                return 200, await self.search(parse_qs(url.query))
+            if method == "POST":
+                record = parse_record(body)
+                record_id = await self.write(lambda store: store.add(
+                    *(record.get(field) for field in FIELDS[1:])))
+                return 201, {"id": record_id}
+        elif path.startswith("/books/"):
+            record_id = parse_record_id(path)
+            if method == "PUT":
+                record = parse_record(body)
+                found = await self.write(
+                    lambda store: update_record(store, record_id, record))
+            elif method == "DELETE":
+                found = await self.write(
+                    lambda store: store.delete(record_id))
+            else:
+                raise HTTPError(405, f"method not allowed: {method}")
+            if not found:
+                raise HTTPError(404, f"no book with ID {record_id}")
+            return 200, {"id": record_id}
+        else:
+            raise HTTPError(404, f"no such resource: {url.path}")
+        raise HTTPError(405, f"method not allowed: {method}")
+
+
+    async def search(self, params):
+        """Method to answer a search with one page of matching records, in
+        ID order, along with the ID to continue from (None on the last
+        page). Ranked searches return the records most relevant first, and
+        the offset of the next page instead. In fuzzy search mode, the
+        closest matches are returned instead, best first, in a single page.
+        With facets=1, the counts of every matching record by rating band,
+        title initial and author are returned too, fetched alongside the
+        page.
+        """
+        fields = {name: values[0] for name, values in params.items()}
+        after_id = parse_int(fields, "after")
+        offset = parse_int(fields, "offset", 0, minimum=0)
+        ranked = fields.get("ranked", "").lower() in ("1", "true", "yes")
+        limit = min(parse_int(fields, "limit", PAGE_SIZE, minimum=1),
+                    MAX_PAGE_SIZE)
+
+        with_facets = fields.get("facets", "").lower() in ("1", "true", "yes")
+
+        page = self.read(search_page, fields, after_id, offset, ranked, limit)
+        if with_facets:
+            (records, paged), facet_counts = await asyncio.gather(
+                page, self.read(search_facets, fields))
+        else:
+            records, paged = await page
+        next_key = None
+        if paged and len(records) == limit:
+            next_key = offset + limit if ranked else records[-1][0]
+        response = {
+            "records": [record_to_dict(record) for record in records],
+            "next": next_key,
+        }
+        if with_facets:
+            response["facets"] = facet_counts
+        return response
+
+
+    def send(self, writer, status, payload, keep_alive):
+        """Method to write a JSON response to the client connection."""
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            f"\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+
+
+
+async def serve(service, host=HOST, port=PORT):
+    """Function to run the service until it is cancelled, e.g. with
+    Ctrl+C or SIGTERM, then close it.
+    """
+    # Stop as on Ctrl+C when terminated, e.g. by a service manager, so ...
+    # ...that the snapshot copies of the worker processes are deleted
+    with contextlib.suppress(NotImplementedError):
+        asyncio.get_running_loop().add_signal_handler(
+            signal.SIGTERM, asyncio.current_task().cancel)
+    server = await service.start(host, port)
+    try:
+        await server.serve_forever()
+    finally:
+        await service.close()
+
+
+def build_parser():
+    """Function to build the command line argument parser."""
+    parser = argparse.ArgumentParser(
+        prog="python -m http_service",
+        description=__doc__.splitlines()[0],
+    )
+    parser.add_argument("--database", default=DATABASE_PATH)
+    parser.add_argument(
+        "--mode",
+        default=search.TRIGRAM_MODE,
+        choices=search.SEARCH_MODES,
+        help="how titles and authors are matched",
+    )
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--pool-size", type=int, default=POOL_SIZE,
+                        help="number of read-only connections")
+    parser.add_argument("--processes", type=int, default=0,
+                        help="number of worker processes serving searches, "
+                             "instead of threads")
+    parser.add_argument("--snapshot-interval", type=float,
+                        help="with --processes, search a snapshot copy of "
+                             "the database refreshed every SECONDS")
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT,
+                        help="request timeout in seconds")
+    parser.add_argument("--metrics", action="store_true",
+                        help="record operation timings, served at /metrics")
+    parser.add_argument("--slow-query-ms", type=float,
+                        default=metrics.SLOW_QUERY_MS,
+                        help="log operations slower than this with --metrics")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.metrics:
+        metrics.enable(args.slow_query_ms)
+    if args.snapshot_interval is not None and not args.processes:
+        build_parser().error("--snapshot-interval requires --processes")
+    service = BookService(args.database, args.mode, args.pool_size,
+                          args.timeout, processes=args.processes,
+                          snapshot_interval=args.snapshot_interval)
+    print(f"Serving {args.database} on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+
+
+
+if __name__ == "__main__":
+    main()
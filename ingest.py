@@ -0,0 +1,304 @@
+import collections
+import csv
+import hashlib
+import io
+import os
+import sql_queries
+import authors
+import facets
+import search
+
+
+
+# Size in characters of the blocks of CSV lines parsed and inserted per ...
+# ...batch, about 50,000 rows of books.csv. Large enough to amortise the ...
+# ...per-call overhead of executemany and of handing a block to a worker ...
+# ...process, small enough to keep memory flat for catalogs with millions ...
+# ...of rows.
+BLOCK_SIZE = 1 << 22
+
+# Number of rows inserted per batch by the Spark ingest path
+CHUNK_SIZE = 50_000
+
+# Number of parsed blocks each worker process may have waiting for the ...
+# ...writer, which bounds memory when parsing outpaces the inserts
+BLOCKS_PER_WORKER = 2
+
+# Spark master of the optional Spark ingest path: local mode, one task ...
+# ...per core
+SPARK_MASTER = "local[*]"
+
+# Size of the blocks read from disk when computing the CSV checksum
+CHECKSUM_BLOCK_SIZE = 1 << 20
+
+# Columns read from the CSV file, in the order expected by INSERT_RECORD
+CSV_COLUMNS = ["title", "author", "rating", "isbn"]
+
+# PRAGMA statements applied for the duration of a bulk load. Syncing to disk
+# ...only at commit time and keeping temporary structures in memory removes
+# ...most of the per-row I/O cost.
+BULK_LOAD_PRAGMAS = [
+    "PRAGMA synchronous = OFF",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",
+]
+
+# PRAGMA statement restoring the default durability once the load is done
+RESTORE_PRAGMAS = ["PRAGMA synchronous = FULL"]
+
+
+
+def csv_fingerprint(csv_path):
+    """Function to return the size in bytes and the modification time in
+    nanoseconds of the CSV file, as a cheap way of detecting changes.
+    """
+    stat = os.stat(csv_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def csv_checksum(csv_path):
+    """Function to compute the SHA-256 checksum of the CSV file, reading it
+    in fixed-size blocks so that large files are never held in memory.
+    """
+    digest = hashlib.sha256()
+    with open(csv_path, "rb") as csv_file:
+        for block in iter(lambda: csv_file.read(CHECKSUM_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_metadata(cur):
+    """Function to return the key-value pairs stored in the 'metadata'
+    table as a dictionary.
+    """
+    cur.execute(sql_queries.SELECT_METADATA)
+    return dict(cur.fetchall())
+
+
+def is_csv_loaded(cur, csv_path):
+    """Function to check whether the CSV file has already been loaded into
+    the 'books' table. The file counts as unchanged when its size and
+    modification time match the last load, or when its content checksum
+    does (e.g. the file was only touched or copied).
+    """
+    # An empty table always needs loading, whatever the metadata says
+    cur.execute(sql_queries.HAS_RECORDS)
+    if not cur.fetchone()[0]:
+        return False
+
+    metadata = read_metadata(cur)
+    size, mtime = csv_fingerprint(csv_path)
+    # Compare the cheap fingerprint first
+    if metadata.get("csv_size") == str(size) \
+            and metadata.get("csv_mtime") == str(mtime):
+        return True
+    # Fall back on the checksum only when the size still matches, since a
+    # ...different size always means different content
+    if metadata.get("csv_size") == str(size) \
+            and metadata.get("csv_checksum") == csv_checksum(csv_path):
+        # Remember the new modification time to skip hashing next time
+        cur.execute(sql_queries.UPSERT_METADATA, ("csv_mtime", str(mtime)))
+        cur.connection.commit()
+        return True
+    return False
+
+
+def clean_row(title, author, rating, isbn):
+    """Function to validate one (title, author, rating, isbn) row: empty
+    values become NULL, ratings are coerced to float and ISBNs normalized
+    the same way as the indexed ISBN key. A rating which is not a number
+    is kept as text.
+    """
+    title = title or None
+    author = author or None
+    if rating:
+        try:
+            rating = float(rating)
+        except ValueError:
+            pass
+    else:
+        rating = None
+    if isbn:
+        isbn = search.normalize_isbn(isbn) or None
+    else:
+        isbn = None
+    return title, author, rating, isbn
+
+
+def read_header(csv_file):
+    """Function to read the header line of the CSV file and return the
+    positions of the CSV_COLUMNS in its rows. Raises ValueError if a
+    column is missing.
+    """
+    header = next(csv.reader([csv_file.readline()]), [])
+    try:
+        return [header.index(column) for column in CSV_COLUMNS]
+    except ValueError:
+        raise ValueError(f"{csv_file.name} must have the columns "
+                         f"{', '.join(CSV_COLUMNS)}") from None
+
+
+def iter_csv_blocks(csv_file, block_size=BLOCK_SIZE):
+    """Generator function to read the rest of the CSV file in blocks of
+    whole lines of about block_size characters. A block never ends inside
+    a quoted value, which may span several lines, so that each block can
+    be parsed on its own.
+    """
+    while True:
+        block = csv_file.read(block_size)
+        if not block:
+            break
+        block += csv_file.readline()
+        # An odd number of quotes means the block ends inside a quoted ...
+        # ...value: quotes inside values are doubled, so they cancel out
+        while block.count('"') % 2:
+            line = csv_file.readline()
+            if not line:
+                break
+            block += line
+        yield block
+
+
+def parse_block(block, positions):
+    """Function to parse a block of CSV lines into a list of validated
+    (title, author, rating, isbn) tuples ready to be passed to
+    executemany, taking the values at the given positions of each row.
+    It runs in the worker processes of a parallel load.
+    """
+    rows = []
+    for row in csv.reader(io.StringIO(block, newline="")):
+        if not row:
+            continue
+        # Values missing from short rows are stored as NULL
+        rows.append(clean_row(*(row[position] if position < len(row) else ""
+                                for position in positions)))
+    return rows
+
+
+def iter_csv_chunks(csv_path, workers=1, block_size=BLOCK_SIZE):
+    """Generator function to stream the CSV file in chunks, yielding each
+    chunk as a list of validated (title, author, rating, isbn) tuples
+    ready to be passed to executemany, in file order. With more than one
+    worker, the blocks of lines are parsed by a pool of worker processes,
+    at most BLOCKS_PER_WORKER blocks per worker ahead of the consumer.
+    """
+    with open(csv_path, encoding="utf-8", newline="") as csv_file:
+        positions = read_header(csv_file)
+        blocks = iter_csv_blocks(csv_file, block_size)
+        if workers <= 1:
+            for block in blocks:
+                yield parse_block(block, positions)
+            return
+
+        # Imported on use, since multiprocessing slows down the start ...
+        # ...of every program importing this module
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Blocks being parsed, oldest first, so that chunks are ...
+            # ...inserted in file order
+            pending = collections.deque()
+            try:
+                for block in blocks:
+                    if len(pending) == workers * BLOCKS_PER_WORKER:
+                        yield pending.popleft().result()
+                    pending.append(pool.submit(parse_block, block, positions))
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                # Stop parsing if the load failed or was abandoned
+                for future in pending:
+                    future.cancel()
+
+
+def iter_spark_chunks(csv_path, chunk_size=CHUNK_SIZE):
+    """Generator function to stream the CSV file in chunks like
+    iter_csv_chunks, parsing it with Spark in local mode, on every core,
+    for the biggest inputs. The rows are validated as they reach the
+    writer. Requires pyspark.
+    """
+    try:
+        from pyspark.sql import SparkSession
+    except ImportError:
+        raise ImportError("the Spark ingest path requires pyspark, "
+                          "e.g. pip install pyspark") from None
+    spark = SparkSession.builder.master(SPARK_MASTER) \
+        .appName("books-ingest").getOrCreate()
+    try:
+        frame = spark.read.csv(csv_path, header=True, multiLine=True,
+                               escape='"').select(*CSV_COLUMNS)
+        chunk = []
+        for row in frame.toLocalIterator():
+            chunk.append(clean_row(*row))
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        spark.stop()
+
+
+def bulk_load(conn, csv_path, workers=1, spark=False, block_size=BLOCK_SIZE):
+    """Function to replace the content of the 'books' table with the data
+    from the CSV file. The file is streamed in chunks, parsed by workers
+    worker processes (or by Spark if spark is True), and every chunk is
+    inserted by this single writer with executemany, all inside a single
+    transaction, so the table is never left half-loaded. The full-text
+    indexes are rebuilt once at the end rather than row by row. Returns
+    the number of rows inserted.
+    """
+    cur = conn.cursor()
+    # Make sure no implicit transaction is pending before changing PRAGMAs
+    conn.commit()
+    for pragma in BULK_LOAD_PRAGMAS:
+        cur.execute(pragma)
+    if spark:
+        chunks = iter_spark_chunks(csv_path)
+    else:
+        chunks = iter_csv_chunks(csv_path, workers, block_size)
+
+    row_count = 0
+    try:
+        # The connection context manager commits on success and rolls ...
+        # ...back if anything goes wrong
+        with conn:
+            # Open the transaction explicitly, since sqlite3 does not do ...
+            # ...so for DDL statements
+            cur.execute("BEGIN")
+            # Stop updating the full-text indexes row by row, if any
+            cur.execute(sql_queries.FTS_TABLE_EXISTS)
+            fts_index = cur.fetchone()[0] == 2
+            if fts_index:
+                for statement in sql_queries.DROP_FTS_TRIGGERS:
+                    cur.execute(statement)
+            # Likewise stop counting the facets row by row
+            facets.drop_triggers(cur)
+            cur.execute(sql_queries.TRUNCATE_TABLE)
+            for rows in chunks:
+                cur.executemany(sql_queries.INSERT_RECORD, rows)
+                row_count += len(rows)
+            # Split the authors of the records loaded into the 'authors' ...
+            # ...and 'book_authors' tables
+            authors.rebuild(cur)
+            # Count the books of every rating band, title initial and ...
+            # ...author in one pass, and keep counting them from now on
+            facets.rebuild(cur)
+            # Rebuild the full-text indexes in one pass and keep them in ...
+            # ...sync again from now on
+            if fts_index:
+                for statement in sql_queries.REBUILD_FTS:
+                    cur.execute(statement)
+                for statement in sql_queries.CREATE_FTS_TRIGGERS:
+                    cur.execute(statement)
+            # Record the fingerprint of the file that has just been loaded
+            size, mtime = csv_fingerprint(csv_path)
+            cur.executemany(sql_queries.UPSERT_METADATA, [
+                ("csv_size", str(size)),
+                ("csv_mtime", str(mtime)),
+                ("csv_checksum", csv_checksum(csv_path)),
+            ])
+    finally:
+        chunks.close()
+        for pragma in RESTORE_PRAGMAS:
+            cur.execute(pragma)
+    return row_count
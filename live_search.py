@@ -0,0 +1,221 @@
+import functools
+import re
+import unicodedata
+import search
+import authors
+
+
+
+# Delay in milliseconds between the last keystroke and a live search ...
+# ...querying the database, longer than the gap between the keystrokes ...
+# ...of fast typing (about 100 ms), so that a burst of typing runs a ...
+# ...single query. Refinements of the last result are filtered in memory ...
+# ...at once instead, without any delay.
+DEBOUNCE_DELAY = 150
+
+# Largest result kept in memory to filter refinements of the query from. ...
+# ...Bigger results are displayed page by page straight from the database. ...
+# ...Reading a complete result costs about 12 us per record on a 1M-row ...
+# ...catalog, so that this many are read well within the 50 ms budget.
+REFINE_LIMIT = 2000
+
+
+
+def fold(text):
+    """Function to fold text for case- and accent-insensitive comparison,
+    approximating how the unicode61 tokenizer normalizes text.
+    """
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+def tokens(text):
+    """Function to split folded text into tokens the way the unicode61
+    tokenizer does, i.e. on anything that is not a letter or a digit.
+    """
+    return re.findall(r"[^\W_]+", fold(text))
+
+
+@functools.lru_cache(maxsize=64)
+def like_pattern(text):
+    """Function to compile the regular expression matching what LIKE
+    '%text%' does, '%' and '_' being wildcards, once text is folded.
+    """
+    return re.compile("".join(".*" if char == "%" else "." if char == "_"
+                              else re.escape(char) for char in text),
+                      re.DOTALL)
+
+
+def text_matches(value, text, search_mode):
+    """Function to check whether a title or author value matches the text
+    entered for it, with the same semantics as the SQL search.
+    """
+    if value is None:
+        return False
+    if search_mode == search.TOKEN_MODE:
+        # Every word must match the start of a token of the value
+        value_tokens = tokens(value)
+        return all(any(token.startswith(word) for token in value_tokens)
+                   for word in tokens(text))
+    # Substring match for the trigram and LIKE modes, folded like the SQL ...
+    # ...search for text folds it
+    fold_text = search.substring_fold(text, search_mode)
+    if fold_text is search.fold_case:
+        return fold_text(text) in fold_text(str(value))
+    return like_pattern(fold_text(text)).search(fold_text(str(value))) \
+        is not None
+
+
+def author_matches(value, text, search_mode):
+    """Function to check whether one of the author names of an Author value
+    matches the text entered, each name being matched on its own like in
+    the SQL search.
+    """
+    return any(text_matches(name, text, search_mode)
+               for name in authors.split_authors(value))
+
+
+def rating_matches(value, comparisons):
+    """Function to check whether a rating value satisfies every (operator,
+    value) comparison, following SQLite's ordering in which text sorts
+    after every number and NULL matches nothing.
+    """
+    if value is None:
+        return False
+    if not isinstance(value, (int, float)):
+        value = float("inf")
+    for operator, bound in comparisons:
+        if operator == "=" and not value == bound \
+                or operator == ">=" and not value >= bound \
+                or operator == "<=" and not value <= bound \
+                or operator == ">" and not value > bound \
+                or operator == "<" and not value < bound:
+            return False
+    return True
+
+
+def isbn_matches(value, isbn_key):
+    """Function to check whether an ISBN value matches the normalized ISBN
+    entered, by prefix.
+    """
+    if value is None:
+        return False
+    return search.normalize_isbn(str(value)).startswith(isbn_key)
+
+
+def needs_table_scan(fields, search_mode):
+    """Function to check whether a search for the entry field values would
+    scan the whole 'books' table, i.e. a title or author too short for the
+    trigram index to serve. Live searches leave those to the Search
+    button rather than scanning the table on every keystroke.
+    """
+    return search_mode == search.TRIGRAM_MODE \
+        and any(0 < len(text.strip()) < search.TRIGRAM_MIN_LENGTH
+                for text in fields[:2])
+
+
+def is_refinement(previous, current, search_mode):
+    """Function to check whether every record matching the current entry
+    field values also matches the previous ones, i.e. the current query
+    only narrows down the previous one (e.g. 'harr' extended to 'harry').
+    """
+    for field, (old, new) in enumerate(zip(previous, current)):
+        old, new = old.strip(), new.strip()
+        if not old:
+            continue
+        if field < 2:
+            # Title and author
+            if search_mode == search.TOKEN_MODE:
+                new_tokens = tokens(new)
+                if not all(any(token.startswith(word) for token in new_tokens)
+                           for word in tokens(old)):
+                    return False
+            else:
+                # Both folded alike, by the trigram index or by LIKE
+                fold_old = search.substring_fold(old, search_mode)
+                if fold_old is not search.substring_fold(new, search_mode) \
+                        or fold_old(old) not in fold_old(new):
+                    return False
+                # The spellings of an author differing in case share the ...
+                # ...name stored first, which LIKE compares case-sensitively ...
+                # ...beyond ASCII: the database alone knows which one it is
+                if field == 1 and fold_old is search.fold_ascii \
+                        and not new.isascii():
+                    return False
+        elif field == 2:
+            # Rating: only the very same comparison is known to narrow
+            if old != new:
+                return False
+        else:
+            # ISBN: the same or a longer prefix
+            old, new = search.normalize_isbn(old), search.normalize_isbn(new)
+            if not new.startswith(old):
+                return False
+    return True
+
+
+
+class LiveSearch:
+    """A class to keep the complete result of the last live search when it
+    is small enough, so that a query which only extends the previous one
+    is answered by filtering that result in memory instead of querying
+    the database again.
+    """
+
+    def __init__(self, search_mode, refine_limit=REFINE_LIMIT):
+        """Initializes an instance of the LiveSearch class"""
+        self.search_mode = search_mode
+        self.refine_limit = refine_limit
+        self.clear()
+
+
+    def clear(self):
+        """Method to forget the last result, e.g. after the table has been
+        modified.
+        """
+        # Entry field values of the last search and its complete result
+        self.fields = None
+        self.records = None
+
+
+    def covers(self, fields):
+        """Method to check whether a search for the entry field values can
+        be answered from the last result, i.e. only narrows it down.
+        """
+        # Typo-tolerant results do not narrow down as the input grows
+        return self.search_mode != search.FUZZY_MODE \
+            and self.records is not None \
+            and is_refinement(self.fields, fields, self.search_mode)
+
+
+    def refine(self, fields):
+        """Method to answer a search from the last result when the entry
+        field values only narrow down the last search. Returns the matching
+        records in ID order, or None when the database must be queried.
+        Raises ValueError if the rating is invalid.
+        """
+        if not self.covers(fields):
+            return None
+        title, author, rating, isbn = (field.strip() for field in fields)
+        comparisons = search.parse_rating(rating) if rating else None
+        isbn_key = search.normalize_isbn(isbn)
+        records = [
+            record for record in self.records
+            if (not title
+                or text_matches(record[1], title, self.search_mode))
+            and (not author
+                 or author_matches(record[2], author, self.search_mode))
+            and (not comparisons or rating_matches(record[3], comparisons))
+            and (not isbn_key or isbn_matches(record[4], isbn_key))
+        ]
+        self.remember(fields, records)
+        return records
+
+
+    def remember(self, fields, records):
+        """Method to keep the complete result of a search, or to forget the
+        last one when records is None.
+        """
+        self.fields = tuple(fields) if records is not None else None
+        self.records = records
+
@@ -1,134 +1,420 @@
+import argparse
+import os
+import sys
 from tkinter import *
-import customtkinter
-import sqlite3
-import sql_queries
-import pandas as pd
+from tkinter import filedialog
+import search
+import live_search
+import authors
+import metrics
+import export
+import batch
+from book_store import BookStore, DATABASE_PATH, CSV_PATH
+from result_view import PagedResultView, format_record
+from query_worker import QueryWorker
+
+
+
+# Environment variable enabling the columnar snapshot, e.g. ...
+# ...BOOKS_SNAPSHOT=1 python main.py
+SNAPSHOT_VARIABLE = "BOOKS_SNAPSHOT"
 
 
 
 class BookSearchEngine:
     """A class to encapsulate the functionality of a desktop application
     designed for searching, viewing, adding, updating, and deleting book
-    records using a GUI. It interfaces with an SQLite database to perform
-    data operations, providing users with a visually appealing and
-    functional platform for managing their book collection.
+    records using a GUI. It interfaces with an SQLite database through a
+    BookStore to perform data operations, providing users with a visually
+    appealing and functional platform for managing their book collection.
     """
 
-    def __init__(self):
-        """Initializes an instance of the BookSearchEngine class"""
-        # Establish a connection to the SQLite database located ...
-        # ...at './assets/books.db'
-        self.conn = sqlite3.connect(database="./assets/books.db")
-        # Create a cursor object from the database connection to ...
-        # ...execute SQL commands
-        self.cur = self.conn.cursor()
-        # Execute the SQL command to create the 'books' table if it ...
-        # ...does not already exist
-        self.cur.execute(sql_queries.CREATE_TABLE)
+    def __init__(self, search_mode=search.TRIGRAM_MODE, snapshot=False):
+        """Initializes an instance of the BookSearchEngine class. The search
+        mode selects how titles and authors are matched: by substring
+        through a trigram full-text index (search.TRIGRAM_MODE), by token
+        and token prefix (search.TOKEN_MODE) or with a plain LIKE scan
+        (search.LIKE_MODE), or tolerating typos and ranking the closest
+        matches first (search.FUZZY_MODE).
+        With snapshot set to True, searches in the substring modes are
+        answered from an in-memory columnar snapshot of the table.
+        """
+        # Open the book database located at './assets/books.db'
+        self.store = BookStore(DATABASE_PATH, search_mode)
+        self.search_mode = self.store.search_mode
+        # Keep the complete result of small searches so that refinements ...
+        # ...typed into the entry fields are filtered in memory
+        self.live_search = live_search.LiveSearch(self.search_mode)
+        # Identifier of the pending debounced live search, if any
+        self.live_search_id = None
+        # Whether entry field changes currently trigger live searches
+        self.live_search_paused = False
+        # Whether searches are answered from the columnar snapshot, ...
+        # ...which reproduces substring matching only
+        self.use_snapshot = snapshot \
+            and self.search_mode in search.SUBSTRING_MODES
         # Assign None to selected_row as its default value
         self.selected_row = None
+        # Progress of the batch file being applied, as (rows read, ...
+        # ...errors, fraction of the file read), or None if there is none
+        self.batch_progress = None
 
 
-    def reset(self):
+    def reset(self, force=False):
         """Method to reset the book database to a predefined state. It clears
         all existing records in the 'books' table and then populates it with
         the data from the CSV file.
+        The reload is skipped when the database holds records and the CSV
+        file has not changed since it was last loaded, unless force is set
+        to True. It runs on the query worker, so the window stays
+        responsive meanwhile; searches submitted in the meantime run once
+        it is done.
         """
-        # Execute the SQL command to delete all records in ...
-        # ...the 'books' table
-        self.cur.execute(sql_queries.TRUNCATE_TABLE)
-        # Read book data from the CSV file into a pandas DataFrame
-        books_df = pd.read_csv("./assets/books.csv")
-        # Iterate over each row in the DataFrame and insert it into ...
-        # ...the 'books' table
-        for row_id in range(len(books_df)):
-            row = books_df.loc[row_id]
-            self.cur.execute(sql_queries.INSERT_RECORD,(row["title"],
-                                                        row["author"],
-                                                        row["rating"],
-                                                        row["isbn"]))
+        def reloaded(done):
+            if done:
+                # Results kept for refinements are no longer accurate
+                self.live_search.clear()
+                self.show_confirmation("The books have been reloaded from:",
+                                       (CSV_PATH,))
+
+        # Reload the CSV file into the 'books' table if needed
+        self.worker.submit(lambda store: store.reset(force), reloaded,
+                           errback=self.show_error)
 
 
     def view_all_records(self):
         """Method to retrieve and display all book records from the database
-        in the GUI list box.
+        in the GUI list box. Records are fetched one page at a time as the
+        list box is scrolled.
         """
         # Clear the list box
         self.clear_list_box()
-        # Execute the SQL command to query all book records available ...
-        # ...in the database
-        self.cur.execute(sql_queries.VIEW_RECORDS)
-        # Retrieve the records from the query result
-        records = self.cur.fetchall()
-        # Iterate over each record to insert them into the list box
-        for record in records:
-            self.list_box.insert(END, record)
+        # Display the first page of all book records available in ...
+        # ...the database, best rated first if results are ranked
+        if self.rank_results.get():
+            self.result_view.show_ranked(on_error=self.show_error)
+        else:
+            self.result_view.show(on_error=self.show_error)
 
 
-    def search_records(self):
+    def view_author_records(self):
+        """Method to display all book records by the first author of the
+        currently selected record, looked up through the author indexes.
+        """
+        # Check if any item in the list box has been selected
+        if self.selected_row is None:
+            return
+        names = authors.split_authors(self.selected_row[2])
+        if not names:
+            return
+        conditions, values = authors.by_author_conditions(names[0])
+        # Clear the list box, which also resets the selection
+        self.clear_list_box()
+        # Display the first page of the author's book records, best ...
+        # ...rated first if results are ranked
+        if self.rank_results.get():
+            self.result_view.show_ranked(conditions, values, self.show_error)
+        else:
+            self.result_view.show(conditions, values, self.show_error)
+
+
+    def search_records(self, keep_selection=False):
         """Method to search the book records in the database based on the
         user input in the GUI entry fields.
         The search is dynamic, allowing for partial and case-insensitive
-        matches.
+        matches. Titles and authors are looked up in the full-text index
+        rather than by scanning the whole table. The rating field also
+        accepts bounds and ranges such as '>=4' or '3.5-4.5'. Results are
+        fetched one page at a time as the list box is scrolled, and a
+        search which only narrows down the previous one is answered from
+        memory. With 'Best first' checked, the most relevant records are
+        displayed first instead.
+        With keep_selection set to True, e.g. for a live search run as
+        the selected record is being edited, the record stays selected so
+        that it can still be updated or deleted.
         """
         # Clear the list box to prepare for search results
-        self.clear_list_box()
+        self.clear_list_box(keep_selection)
 
         # Retrieve user input values from GUI entry fields
         title = self.title.get()
         author = self.author.get()
         rating = self.rating.get()
         isbn = self.isbn.get()
+        fields = (title, author, rating, isbn)
+
+        # Build the SQL query conditions and corresponding values for ...
+        # ...the non-empty entry fields
+        try:
+            with metrics.timer("search.build") as timing:
+                conditions, values = search.build_search_conditions(
+                    title, author, rating, isbn, self.search_mode)
+                # Record the generated SQL when metrics are enabled
+                if metrics.enabled:
+                    timing.sql = search.build_search_query(conditions)
+                    timing.params = values
+            # Filter the result of the previous search in memory if the ...
+            # ...user input only narrows it down and results are ...
+            # ...displayed in ID order
+            with metrics.timer("search.refine") as timing:
+                records = self.live_search.refine(fields) \
+                    if conditions and not self.rank_results.get() else None
+                timing.rows = len(records) if records is not None else None
+        except ValueError as error:
+            # Display the reason why the input is invalid in the list box
+            self.show_error(error, keep_selection)
+            return
+
+        # Display the filtered records if the database need not be queried
+        if records is not None:
+            self.result_view.show_records(records)
+        # In fuzzy search mode, display the records closest to the user ...
+        # ...input first, typos included
+        elif conditions and self.search_mode == search.FUZZY_MODE:
+            self.worker.submit(
+                lambda store: store.fuzzy_search(*fields),
+                self.result_view.show_records,
+                PagedResultView.CHANNEL,
+                self.show_error,
+            )
+        # Display the most relevant records first if results are ranked, ...
+        # ...fetching the next best ones as the list box is scrolled
+        elif conditions and self.rank_results.get():
+            self.result_view.show_ranked(conditions, values, self.show_error)
+        # Otherwise check if there are any conditions set
+        elif conditions:
+            # If so, fetch the book records in the database, or filter ...
+            # ...the snapshot, that match the user input, superseding ...
+            # ...any search still in flight. A result too big to be kept ...
+            # ...comes with its first page, in a single trip to the worker
+            def fetch(store):
+                if self.use_snapshot:
+                    records = store.snapshot_search(
+                        *fields, limit=self.live_search.refine_limit)
+                else:
+                    records = store.fetch_complete(
+                        conditions, values, self.live_search.refine_limit)
+                first_page = None
+                if records is None:
+                    first_page = store.fetch_page(
+                        conditions, values,
+                        page_size=self.result_view.page_size)
+                return records, first_page
+
+            self.worker.submit(
+                fetch,
+                lambda result: self.show_search_result(
+                    fields, conditions, values, *result),
+                PagedResultView.CHANNEL,
+                self.show_error,
+            )
+
+
+    def export_records(self):
+        """Method to export the book records matching the user input in the
+        GUI entry fields, or every record if they are empty, to a CSV,
+        JSON-lines or Parquet file chosen by the user. The records are
+        streamed from the database to the file by the query worker, a
+        batch at a time.
+        """
+        # Ask for the file to write, whose extension selects the format
+        path = filedialog.asksaveasfilename(
+            parent=self.window,
+            title="Export records",
+            defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("JSON lines", "*.jsonl"),
+                       ("Parquet", "*.parquet")],
+        )
+        if not path:
+            return
+        try:
+            conditions, values = search.build_search_conditions(
+                self.title.get(), self.author.get(), self.rating.get(),
+                self.isbn.get(), self.search_mode)
+        except ValueError as error:
+            # Display the reason why the input is invalid in the list box
+            self.show_error(error)
+            return
+        self.worker.submit(
+            lambda store: export.export(
+                store.iter_batches(conditions, values), path),
+            self.show_export_report,
+            errback=self.show_error,
+        )
+
+
+    def apply_batch_file(self):
+        """Method to apply a CSV or JSON-lines file of upserts and deletes
+        keyed by ID or ISBN, chosen by the user, to the database. The file
+        is applied by the query worker in chunks of batch.CHUNK_SIZE rows,
+        each committed on its own like with the command line interface,
+        while its progress is displayed in the list box; the rows which
+        could not be applied are listed once it is done.
+        """
+        # Apply one batch file at a time
+        if self.batch_progress is not None:
+            return
+        # Ask for the batch file to apply
+        path = filedialog.askopenfilename(
+            parent=self.window,
+            title="Apply batch file",
+            filetypes=[("CSV or JSON lines", "*.csv *.jsonl *.json")],
+        )
+        if not path:
+            return
+
+        def progress(report, fraction):
+            # Called on the worker thread: hand a copy of the counts over ...
+            # ...to the GUI thread, which alone displays them
+            self.worker.post(self.show_batch_progress,
+                             (report["rows"], len(report["errors"]),
+                              fraction))
+
+        def done(report):
+            self.batch_progress = None
+            # Results kept for refinements are no longer accurate
+            self.live_search.clear()
+            self.show_batch_report(report)
+
+        def failed(error):
+            self.batch_progress = None
+            # The chunks committed before the error are kept
+            self.live_search.clear()
+            self.show_error(error)
+
+        def apply(store):
+            # Commit the pending edits first, since every chunk is ...
+            # ...committed on its own
+            self.worker.commit()
+            return batch.apply_file(store, path, batch.CHUNK_SIZE, progress)
+
+        self.batch_progress = (0, 0, 0.0)
+        self.worker.submit(apply, done, errback=failed)
+        self.show_batch_progress(self.batch_progress)
+
+
+    def show_batch_progress(self, progress):
+        """Method to display the progress of the batch file being applied,
+        as (rows read, errors, fraction of the file read), in the list box.
+        """
+        # Ignore a late update of a batch file already done
+        if self.batch_progress is None:
+            return
+        self.batch_progress = progress
+        rows, errors, fraction = progress
+        # Clear the list box to remove any existing data
+        self.clear_list_box()
+        self.list_box.insert(
+            END,
+            f"Applying the batch file: {fraction:.0%} "
+            f"({rows:,} rows, {errors:,} errors)",
+        )
+        # Disable the list box to prevent further interactions
+        self.list_box.config(state=DISABLED)
 
-        # Initiate empty lists for SQL query conditions and ...
-        # ...corresponding values
-        list_entry_values = []
-        list_conditions = []
-
-        # Append the SQL query condition and value for Title to ...
-        # ...corresponding lists if the title entry field is not empty
-        if title.strip():
-            list_conditions.append("LOWER(title) LIKE ?")
-            list_entry_values.append(f"%{title}%")
-
-        # Append the SQL query condition and value for Author to ...
-        # ...corresponding lists if the author entry field is not empty
-        if author.strip():
-            list_conditions.append("LOWER(author) LIKE ?")
-            list_entry_values.append(f"%{author}%")
-
-        # Append the SQL query condition and value for Rating to ...
-        # ...corresponding lists if the rating entry field is not empty
-        if rating.strip():
-            list_conditions.append("rating = ?")
-            list_entry_values.append(rating)
-
-        # Append the SQL query condition and value for ISBN to ...
-        # ...corresponding lists if the isbn entry field is not empty
-        if isbn.strip():
-            list_conditions.append("isbn LIKE ?")
-            list_entry_values.append(f"%{isbn}%")
-
-        # Check if there are any conditions set
-        if list_entry_values:
-            # If so, form the full SQL query using the conditions
-            query = "SELECT * FROM books WHERE " \
-                    + " AND ".join(list_conditions)
-            # Convert the list of entry values to tuple
-            tuple_entry_values = tuple(list_entry_values)
-            # Execute the SQL command to search the book records ...
-            # ...in the database that match the user input
-            self.cur.execute(query, tuple_entry_values)
-            # Retrieve the records from the query result
-            records = self.cur.fetchall()
-            # Iterate over each record to insert them into the list box
-            for record in records:
-                self.list_box.insert(END, record)
+
+    def show_batch_report(self, report):
+        """Method to display the outcome of a batch file in the list box,
+        followed by the rows which could not be applied.
+        """
+        # Clear the list box to remove any existing data
+        self.clear_list_box()
+        self.list_box.insert(
+            END,
+            f"Batch file applied: {report['inserted']:,} added, "
+            f"{report['updated']:,} updated, {report['deleted']:,} deleted, "
+            f"{len(report['errors']):,} errors",
+        )
+        self.list_box.insert(END, *(f"Line {error['line']}: {error['error']}"
+                                    for error in report["errors"]))
+        # Disable the list box to prevent further interactions
+        self.list_box.config(state=DISABLED)
+
+
+    def show_export_report(self, report):
+        """Method to display the number of records exported and the export
+        throughput in the list box.
+        """
+        # Clear the list box to remove any existing data
+        self.clear_list_box()
+        self.list_box.insert(
+            END,
+            f"{report['exported']:,} records exported to {report['path']} "
+            f"in {report['seconds']:.1f} s "
+            f"({report['records_per_second'] or 0:,} records/s)",
+        )
+        # Disable the list box to prevent further interactions
+        self.list_box.config(state=DISABLED)
+
+
+    def show_search_result(self, fields, conditions, values, records,
+                           first_page=None):
+        """Method to display the result of a search. A complete result
+        small enough to be kept is displayed from memory and remembered
+        for refinements; a bigger one is displayed page by page from the
+        database, starting with first_page if it has been fetched.
+        """
+        # Remember the complete result, or forget the previous one
+        self.live_search.remember(fields, records)
+        if records is not None:
+            self.result_view.show_records(records)
+        else:
+            self.result_view.show(conditions, values, self.show_error,
+                                  first_page)
+
+
+    def schedule_live_search(self, *args):
+        """Callback method invoked whenever an entry field changes. A search
+        which only narrows down the last result is filtered in memory at
+        once; any other runs once the user has stopped typing for a short
+        delay, so that fast typing does not flood the database. A title or
+        author too short to be looked up in the index is left to the
+        Search button, since it would scan the whole table.
+        """
+        if self.live_search_paused:
+            return
+        # Drop the pending live search, if any
+        if self.live_search_id is not None:
+            self.window.after_cancel(self.live_search_id)
+            self.live_search_id = None
+        fields = (self.title.get(), self.author.get(), self.rating.get(),
+                  self.isbn.get())
+        if not self.rank_results.get() and self.live_search.covers(fields):
+            self.run_live_search()
+        elif live_search.needs_table_scan(fields, self.search_mode):
+            # Say why the results are not updated rather than leave ...
+            # ...those of the previous input on display
+            self.show_error(f"Type at least {search.TRIGRAM_MIN_LENGTH} "
+                            f"characters, or press Search",
+                            keep_selection=True)
+        else:
+            self.live_search_id = self.window.after(
+                live_search.DEBOUNCE_DELAY, self.run_live_search)
+
+
+    def run_live_search(self):
+        """Method to run the debounced live search, which keeps the
+        selected record, since the user may be editing its entry fields.
+        """
+        self.live_search_id = None
+        self.search_records(keep_selection=True)
+
+
+    def pause_live_search(self, paused):
+        """Method to stop, or resume, triggering live searches when the
+        entry fields are changed by the application rather than the user.
+        """
+        self.live_search_paused = paused
+        # Drop the live search scheduled before the pause
+        if paused and self.live_search_id is not None:
+            self.window.after_cancel(self.live_search_id)
+            self.live_search_id = None
 
 
     def add_record(self):
         """Method to add a new book record to the database using the
-        data entered by the user in the GUI input fields.
+        data entered by the user in the GUI input fields. The record is
+        written by the query worker and confirmed once it has been added.
         """
         # Collect the data from entry fields
         new_record = (
@@ -137,19 +423,14 @@ class BookSearchEngine:
             self.rating.get(),
             self.isbn.get(),
         )
-        # Execute the SQL command to add a new record to the database
-        self.cur.execute(sql_queries.INSERT_RECORD,new_record)
-        # Clear the list box
-        self.clear_list_box()
-        # Display confirmation message and details of the added record in ...
-        # ...the list box
-        self.list_box.insert(
-            END,
+        # Execute the SQL command to add a new record to the database, ...
+        # ...then display confirmation message and details of the added ...
+        # ...record in the list box
+        self.submit_write(
+            lambda store: store.add(*new_record),
             "The following record has successfully been added:",
+            new_record,
         )
-        self.list_box.insert(END, new_record)
-        # Disable the list box to prevent further interactions
-        self.list_box.config(state=DISABLED)
 
 
     def update_record(self):
@@ -166,28 +447,18 @@ class BookSearchEngine:
                 self.rating.get(),
                 self.isbn.get(),
             ]
+            record_id = self.selected_row[0]
             # Execute the SQL command to update the selected record ...
-            # ...in the database with the new data
-            self.cur.execute(
-                sql_queries.UPDATE_RECORD,
-                tuple(updated_record + [self.selected_row[0]]),
-            )
-            # Clear the list box
-            self.list_box.delete(0, END)
-            # Display confirmation message and details of the updated ...
-            # ...record in the list box
-            self.list_box.insert(
-                END,
+            # ...in the database with the new data, then display ...
+            # ...confirmation message and details of the updated record ...
+            # ...in the list box
+            self.submit_write(
+                lambda store: store.update(record_id, *updated_record),
                 "The following record has been updated:",
-            )
-            self.list_box.insert(
-                END,
-                tuple([self.selected_row[0]] + updated_record),
+                tuple([record_id] + updated_record),
             )
             # Reset the selected_row variable to the default None
             self.selected_row = None
-            # Disable the list box to prevent further interactions
-            self.list_box.config(state=DISABLED)
 
 
     def delete_record(self):
@@ -196,31 +467,66 @@ class BookSearchEngine:
         """
         # Check if any item in the list box has been selected
         if self.selected_row:
+            deleted_record = self.selected_row
             # Execute the SQL command to delete the selected record ...
-            # ...from the database
-            self.cur.execute(
-                sql_queries.DELETE_RECORD,(self.selected_row[0],))
-            # Clear the list box to remove any existing data
-            self.list_box.delete(0, END)
-            # Inform the user which record was deleted by displaying ...
-            # ...the record details in the list box
-            self.list_box.insert(
-                END,
+            # ...from the database, then inform the user which record ...
+            # ...was deleted by displaying the record details in the ...
+            # ...list box
+            self.submit_write(
+                lambda store: store.delete(deleted_record[0]),
                 "The following record has been deleted:",
+                deleted_record,
             )
-            self.list_box.insert(END, self.selected_row)
             # Reset the selected_row variable to the default None
             self.selected_row = None
-            # Disable the list box to prevent further interactions
-            self.list_box.config(state=DISABLED)
+
+
+    def submit_write(self, write, message, record):
+        """Method to run a function modifying the 'books' table through the
+        query worker's store, then display a confirmation message followed
+        by the details of the record concerned once the change has been
+        committed together with the other pending edits.
+        """
+        def confirm(result):
+            # Results kept for refinements may no longer be accurate
+            self.live_search.clear()
+            self.show_confirmation(message, record)
+
+        self.worker.submit(write, confirm, errback=self.show_error,
+                           write=True)
+
+
+    def show_confirmation(self, message, record):
+        """Method to display a confirmation message followed by the details
+        of the record it refers to in the list box.
+        """
+        # Clear the list box to remove any existing data
+        self.clear_list_box()
+        # Display the message and the record details
+        self.list_box.insert(END, message)
+        self.list_box.insert(END, format_record(record))
+        # Disable the list box to prevent further interactions
+        self.list_box.config(state=DISABLED)
+
+
+    def show_error(self, error, keep_selection=False):
+        """Method to display an error message in the list box."""
+        # Clear the list box to remove any existing data
+        self.clear_list_box(keep_selection)
+        # Display the reason of the error
+        self.list_box.insert(END, str(error))
+        # Disable the list box to prevent further interactions
+        self.list_box.config(state=DISABLED)
 
 
     def clear(self):
         """Method to clear both the list box and all entry fields
         in the GUI.
         """
-        # Clear all entry fields in the GUI
+        # Clear all entry fields in the GUI without triggering a search
+        self.pause_live_search(True)
         self.clear_all_entries()
+        self.pause_live_search(False)
         # Clear all items in the list box and reset its state ...
         # ...back to NORMAL
         self.clear_list_box()
@@ -237,30 +543,41 @@ class BookSearchEngine:
             # Retrieve the index of the currently selected item ...
             # ...in the list box
             selected_index = self.list_box.curselection()[0]
-            # Retrieve the data tuple for the selected item through ...
-            # ...its index
-            self.selected_row = self.list_box.get(selected_index)
+            # Retrieve the record displayed by the selected item ...
+            # ...from the result view's record store
+            record = self.result_view.record(selected_index)
+            if record is None:
+                return
+            self.selected_row = record
+            # Fill in the entry fields without triggering a search
+            self.pause_live_search(True)
             # Clear all entry values
             self.clear_all_entries()
             # Input data from the selected row into each corresponding ...
-            # ...entry field
-            self.title_entry.insert(END, self.selected_row[1])
-            self.author_entry.insert(END, self.selected_row[2])
-            self.rating_entry.insert(END, self.selected_row[3])
-            self.ISBN_entry.insert(END, self.selected_row[4])
+            # ...entry field, leaving missing values blank
+            for entry, value in zip((self.title_entry, self.author_entry,
+                                     self.rating_entry, self.ISBN_entry),
+                                    self.selected_row[1:]):
+                if value is not None:
+                    entry.insert(END, value)
+            self.pause_live_search(False)
 
 
-    def clear_list_box(self):
+    def clear_list_box(self, keep_selection=False):
         """Method to clear all the contents of the list box and reset its state
-        to NORMAL.
+        to NORMAL. The selected record is reset too, unless keep_selection
+        is set to True.
         """
         # Reset the state of list box to NORMAL to ensure the items ...
         # ...can be selected
         self.list_box.config(state=NORMAL)
         # Clear all items from the list box
         self.list_box.delete(0, END)
+        # Stop fetching further pages of the previous result
+        self.result_view.reset()
         # Reset the selected_row to the default None
-        self.selected_row = None
+        if not keep_selection:
+            self.selected_row = None
 
 
     def clear_all_entries(self):
@@ -272,16 +589,24 @@ class BookSearchEngine:
         self.ISBN_entry.delete(0, END)
 
 
-    def run(self):
+    def run(self, reload=False):
         """Method to run the main GUI for the Book Search Engine application.
         It sets up the interface window, labels, entry fields, list box,
         scrollbars, and buttons for user interaction, and configures all
         visual elements using the customtkinter library and binds functions
         to buttons and other interactive components.
+        The database is reloaded from the CSV file in the background once
+        the window is shown, if reload is set to True or if the database is
+        empty or older than the file.
         """
+        # Import customtkinter only once the window is needed, so that ...
+        # ...importing this module stays cheap
+        import customtkinter
+
         # Create a new window using the CTk class from the customtkinter ...
         # ...module
         window = customtkinter.CTk(fg_color="#2B2D31")
+        self.window = window
         # Set the title of the window
         window.title("Book Search Engine")
         # Set the size of the window
@@ -293,6 +618,19 @@ class BookSearchEngine:
         # Set default color theme
         customtkinter.set_default_color_theme("blue")
 
+        # Start the query worker, which runs the SQL commands on its own ...
+        # ...thread and connection so that the window never freezes
+        self.worker = QueryWorker(
+            # The worker's store shares the query cache, so that the ...
+            # ...results of both are invalidated by any edit
+            lambda: BookStore(DATABASE_PATH, self.search_mode,
+                              self.store.cache),
+            window,
+        )
+        # Commit the pending edits and stop the query worker before the ...
+        # ...window is closed
+        window.protocol("WM_DELETE_WINDOW", self.close)
+
         # Create a frame to hold entry fields within the main window
         frame_entries = customtkinter.CTkFrame(master=window,
                                                fg_color="#2B2D31")
@@ -399,6 +737,10 @@ class BookSearchEngine:
         # Position the entry appropriately inside the frame
         self.ISBN_entry.grid(row=1, column=3, padx=10, pady=10)
 
+        # Search as the user types into any of the entry fields
+        for variable in (self.title, self.author, self.rating, self.isbn):
+            variable.trace_add("write", self.schedule_live_search)
+
         # Create a second frame for managing the data display and buttons
         frame_data_mgmt = customtkinter.CTkFrame(master=window,
                                                  fg_color="#2B2D31")
@@ -418,7 +760,7 @@ class BookSearchEngine:
             selectbackground="#5865f2",
         )
         # Position the list box inside the second frame
-        self.list_box.grid(row=0, column=0, rowspan=6)
+        self.list_box.grid(row=0, column=0, rowspan=10)
 
         # Create a horizontal scrollbar for the list box
         x_scrollbar = customtkinter.CTkScrollbar(
@@ -427,7 +769,7 @@ class BookSearchEngine:
             command=self.list_box.xview,
         )
         # Position the horizontal scrollbar to the bottom of the list box
-        x_scrollbar.grid(row=7, column=0, sticky=W + E + N)
+        x_scrollbar.grid(row=10, column=0, sticky=W + E + N)
         # Create a vertical scrollbar for the list box
         y_scrollbar = customtkinter.CTkScrollbar(
             master=frame_data_mgmt,
@@ -435,12 +777,13 @@ class BookSearchEngine:
             command=self.list_box.yview,
         )
         # Position the vertical scrollbar to the right of the list box
-        y_scrollbar.grid(row=0, column=1, rowspan=6, sticky=N + S + W)
-        # Configure the list box to link to the horizontal and vertical ...
-        # ...scrollbars
-        self.list_box.configure(
-            xscrollcommand=x_scrollbar.set, yscrollcommand=y_scrollbar.set
-        )
+        y_scrollbar.grid(row=0, column=1, rowspan=10, sticky=N + S + W)
+        # Configure the list box to link to the horizontal scrollbar
+        self.list_box.configure(xscrollcommand=x_scrollbar.set)
+        # Link the list box to the vertical scrollbar through a paged ...
+        # ...view, which fetches further records as the list box scrolls
+        self.result_view = PagedResultView(self.list_box, y_scrollbar,
+                                           self.worker)
 
         # Bind the list box selection change event to the ...
         # ...get_selected_row method
@@ -520,20 +863,102 @@ class BookSearchEngine:
         # Position the button appropriately inside the second frame
         clear_button.grid(row=5, column=2, padx=10)
 
+        # Set up a button that displays all records by the author of the ...
+        # ...selected record
+        author_button = customtkinter.CTkButton(
+            master=frame_data_mgmt,
+            text="By Author",
+            fg_color="#5865f2",
+            hover_color="#2133ee",
+            height=40,
+            command=self.view_author_records,
+        )
+        # Position the button appropriately inside the second frame
+        author_button.grid(row=6, column=2, padx=10)
+
+        # Set up a button that exports the records meeting attribute ...
+        # ...conditions, or all records, to a file
+        export_button = customtkinter.CTkButton(
+            master=frame_data_mgmt,
+            text="Export",
+            fg_color="#5865f2",
+            hover_color="#2133ee",
+            height=40,
+            command=self.export_records,
+        )
+        # Position the button appropriately inside the second frame
+        export_button.grid(row=7, column=2, padx=10)
+
+        # Set up a button that applies a file of upserts and deletes to ...
+        # ...the database
+        batch_button = customtkinter.CTkButton(
+            master=frame_data_mgmt,
+            text="Batch Edit",
+            fg_color="#5865f2",
+            hover_color="#2133ee",
+            height=40,
+            command=self.apply_batch_file,
+        )
+        # Position the button appropriately inside the second frame
+        batch_button.grid(row=8, column=2, padx=10)
+
+        # Create a BooleanVar object to store whether results are ranked
+        self.rank_results = BooleanVar(value=False)
+        # Set up a check box that displays the most relevant results ...
+        # ...first, ranked by title and author match and by rating
+        rank_check_box = customtkinter.CTkCheckBox(
+            master=frame_data_mgmt,
+            text="Best first",
+            text_color="#CCCCCC",
+            fg_color="#5865f2",
+            hover_color="#2133ee",
+            variable=self.rank_results,
+            command=self.search_records,
+        )
+        # Position the check box below the buttons
+        rank_check_box.grid(row=9, column=2, padx=10)
+
+        # Reload the CSV file if needed, then load the snapshot, on the ...
+        # ...query worker while the window is shown, so that neither ...
+        # ...delays it nor the first search waits for the snapshot
+        self.reset(reload)
+        if self.use_snapshot:
+            self.worker.submit(lambda store: store.current_snapshot())
+
         # Start the tkinter event loop, which keeps the application ...
         # ...running and handles user interactions
         window.mainloop()
 
-        # Close the database connection when the application is closed
-        self.conn.close()
+        # Close the database when the application is closed
+        self.store.close()
+        # Print the timings collected if metrics are enabled
+        if metrics.enabled:
+            print(metrics.registry.report(), file=sys.stderr)
+
+
+    def close(self):
+        """Method to close the application window once the query worker has
+        finished the SQL commands already submitted and committed every
+        pending edit.
+        """
+        # Wait for the pending SQL commands, commit the pending edits and ...
+        # ...stop the query worker
+        self.worker.close()
+        # Destroy the window, which ends the tkinter event loop
+        self.window.destroy()
 
 
 
 # Check if this script is being run directly (and not imported as a module)
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Book Search Engine")
+    parser.add_argument("--reload", action="store_true",
+                        help="reload the database from the CSV file even if "
+                             "it has not changed")
+    args = parser.parse_args()
     # Instantiate the book search engine application
-    engine = BookSearchEngine()
-    # Reset the database to a default state with initial data
-    engine.reset()
-    # Start the GUI and the application's event loop
-    engine.run()
+    engine = BookSearchEngine(
+        snapshot=bool(os.environ.get(SNAPSHOT_VARIABLE)))
+    # Start the GUI and the application's event loop, reloading the ...
+    # ...database with the initial data in the background if needed
+    engine.run(reload=args.reload)
@@ -0,0 +1,218 @@
+import bisect
+import logging
+import os
+import threading
+import time
+
+
+
+# Upper bounds in milliseconds of the latency histogram buckets, the last ...
+# ...bucket holding everything slower
+BUCKETS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000,
+           2500, 5000, 10000]
+
+# Default duration in milliseconds from which an operation is written to ...
+# ...the slow-query log
+SLOW_QUERY_MS = 100.0
+
+# Environment variables turning the instrumentation on at import time, ...
+# ...e.g. BOOKS_METRICS=1 BOOKS_SLOW_QUERY_MS=50 python main.py
+ENABLE_VARIABLE = "BOOKS_METRICS"
+THRESHOLD_VARIABLE = "BOOKS_SLOW_QUERY_MS"
+
+# Logger the slow operations are written to, with their SQL and parameters
+slow_query_log = logging.getLogger("books.slow_query")
+
+
+
+class Histogram:
+    """A class to accumulate the durations and row counts of one operation
+    into fixed latency buckets, from which percentiles are estimated.
+    """
+
+    def __init__(self):
+        """Initializes an instance of the Histogram class"""
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+
+
+    def observe(self, elapsed_ms, rows=None):
+        """Method to add one measurement to the histogram."""
+        self.counts[bisect.bisect_left(BUCKETS, elapsed_ms)] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        if rows is not None:
+            self.rows += rows
+
+
+    def percentile(self, fraction):
+        """Method to estimate the duration below which the given fraction of
+        the measurements fall, as the upper bound of its bucket.
+        """
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(BUCKETS[bucket], self.max_ms) \
+                    if bucket < len(BUCKETS) else self.max_ms
+        return self.max_ms
+
+
+    def summary(self):
+        """Method to return the statistics of the histogram as a
+        dictionary.
+        """
+        return {
+            "count": self.count,
+            "rows": self.rows,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max_ms,
+        }
+
+
+
+class MetricsRegistry:
+    """A class to collect the measurements of every instrumented operation
+    in the process, one histogram per operation name, and to log the
+    operations slower than the threshold along with their SQL.
+    """
+
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS):
+        """Initializes an instance of the MetricsRegistry class"""
+        self.slow_query_ms = slow_query_ms
+        self.histograms = {}
+        # Operations are recorded from the GUI, worker and reader threads
+        self.lock = threading.Lock()
+
+
+    def record(self, operation, elapsed_ms, rows=None, sql=None, params=None):
+        """Method to record one run of an operation, logging it if it is
+        slower than the threshold.
+        """
+        with self.lock:
+            histogram = self.histograms.get(operation)
+            if histogram is None:
+                histogram = self.histograms[operation] = Histogram()
+            histogram.observe(elapsed_ms, rows)
+        if self.slow_query_ms is not None and elapsed_ms >= self.slow_query_ms:
+            slow_query_log.warning(
+                "%s took %.1f ms (%s rows) SQL: %s params: %r", operation,
+                elapsed_ms, "?" if rows is None else rows, sql, params)
+
+
+    def snapshot(self):
+        """Method to return the summary of every operation's histogram."""
+        with self.lock:
+            return {operation: histogram.summary()
+                    for operation, histogram in sorted(self.histograms.items())}
+
+
+    def report(self):
+        """Method to format the summaries as a text table."""
+        lines = [f"{'operation':<28} {'count':>8} {'rows':>10} {'mean ms':>9} "
+                 f"{'p50 ms':>8} {'p99 ms':>8} {'max ms':>9}"]
+        for operation, summary in self.snapshot().items():
+            lines.append(
+                f"{operation:<28} {summary['count']:>8} {summary['rows']:>10} "
+                f"{summary['mean_ms']:>9.2f} {summary['p50_ms']:>8.2f} "
+                f"{summary['p99_ms']:>8.2f} {summary['max_ms']:>9.2f}")
+        return "\n".join(lines)
+
+
+    def clear(self):
+        """Method to drop every measurement."""
+        with self.lock:
+            self.histograms = {}
+
+
+
+class Timer:
+    """A class of context managers timing one run of an operation. Set the
+    rows attribute inside the block to record the number of rows handled.
+    """
+    __slots__ = ("operation", "sql", "params", "rows", "start")
+
+    def __init__(self, operation, sql, params):
+        self.operation = operation
+        self.sql = sql
+        self.params = params
+        self.rows = None
+
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+
+    def __exit__(self, *exc_info):
+        registry.record(self.operation,
+                        (time.perf_counter() - self.start) * 1000,
+                        self.rows, self.sql, self.params)
+
+
+
+class NullTimer:
+    """A class of context managers doing nothing, returned by timer() while
+    the instrumentation is disabled so that the hot paths pay no more than
+    a function call.
+    """
+    rows = None
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+    def __setattr__(self, name, value):
+        # Row counts set by the instrumented code are discarded
+        pass
+
+
+
+# Registry of the process, and whether operations are recorded into it
+registry = MetricsRegistry()
+enabled = False
+
+NULL_TIMER = NullTimer()
+
+
+
+def enable(slow_query_ms=SLOW_QUERY_MS):
+    """Function to start recording the instrumented operations. A threshold
+    of None turns the slow-query log off.
+    """
+    global enabled
+    registry.slow_query_ms = slow_query_ms
+    enabled = True
+
+
+def disable():
+    """Function to stop recording the instrumented operations."""
+    global enabled
+    enabled = False
+
+
+def timer(operation, sql=None, params=None):
+    """Function to return a context manager timing one run of an operation,
+    e.g. 'fetch_page.fetchall', along with the SQL it runs, if any.
+    """
+    if not enabled:
+        return NULL_TIMER
+    return Timer(operation, sql, params)
+
+
+
+if os.environ.get(ENABLE_VARIABLE):
+    enable(float(os.environ.get(THRESHOLD_VARIABLE, SLOW_QUERY_MS)))
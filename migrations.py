@@ -0,0 +1,69 @@
+import sql_queries
+
+
+
+# Ordered list of schema migrations. The migration at position i upgrades
+# ...the database from schema version i to version i + 1; each one is a list
+# ...of SQL statements run inside a single transaction. New migrations must
+# ...only ever be appended.
+MIGRATIONS = [
+    # Version 1: B-tree indexes for rating and ISBN searches
+    [
+        sql_queries.CREATE_RATING_INDEX,
+        sql_queries.CREATE_ISBN_INDEX,
+    ],
+    # Version 2: vocabulary and trigram index of the fuzzy search
+    [
+        sql_queries.CREATE_FUZZY_TERMS_TABLE,
+        sql_queries.CREATE_FUZZY_TRIGRAMS_TABLE,
+    ],
+    # Version 3: authors split out of the Author column, with indexes
+    [
+        sql_queries.CREATE_AUTHORS_TABLE,
+        sql_queries.CREATE_BOOK_AUTHORS_TABLE,
+        sql_queries.CREATE_BOOK_AUTHORS_INDEX,
+    ],
+    # Version 4: full-text index only updated when a title or an author ...
+    # ...changes; the trigger is recreated by search.ensure_fts_index
+    [
+        sql_queries.DROP_FTS_UPDATE_TRIGGER,
+    ],
+    # Version 5: facet counts of the rating bands, title initials and ...
+    # ...authors; populated and kept in sync by facets.ensure_index
+    [
+        sql_queries.CREATE_FACETS_TABLE,
+        sql_queries.CREATE_FACETS_INDEX,
+    ],
+]
+
+# Schema version of a fully migrated database
+LATEST_VERSION = len(MIGRATIONS)
+
+
+
+def get_schema_version(conn):
+    """Function to return the schema version of the database, stored in
+    SQLite's user_version header field (0 for a new database).
+    """
+    return conn.execute(sql_queries.GET_SCHEMA_VERSION).fetchone()[0]
+
+
+def migrate(conn):
+    """Function to bring the database schema up to date by applying, in
+    order, every migration newer than its current schema version. Each
+    migration is committed together with the version bump, so an
+    interrupted upgrade resumes where it stopped. Returns the number of
+    migrations applied.
+    """
+    current_version = get_schema_version(conn)
+    for version in range(current_version, LATEST_VERSION):
+        # Make sure no implicit transaction is pending, then open one ...
+        # ...explicitly since sqlite3 does not do so for DDL statements
+        conn.commit()
+        with conn:
+            conn.execute("BEGIN")
+            for statement in MIGRATIONS[version]:
+                conn.execute(statement)
+            conn.execute(sql_queries.SET_SCHEMA_VERSION.format(
+                version=version + 1))
+    return max(LATEST_VERSION - current_version, 0)
@@ -0,0 +1,137 @@
+import sys
+import threading
+from collections import OrderedDict
+
+
+
+# Default maximum number of cached query results
+MAX_ENTRIES = 256
+
+# Default maximum total size in bytes of the cached query results
+MAX_BYTES = 32 * 1024 * 1024
+
+
+
+def estimate_size(value):
+    """Function to estimate the memory in bytes taken by a query result,
+    i.e. a list of record tuples (or None), including the values held.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        for row in value:
+            size += sys.getsizeof(row)
+            if isinstance(row, tuple):
+                size += sum(sys.getsizeof(item) for item in row)
+    return size
+
+
+
+class QueryCache:
+    """A class to cache query results in memory, keyed on the normalized
+    (conditions, values) of the search that produced them, with a least
+    recently used eviction policy bounded in entries and bytes. Every
+    table has a generation counter which is bumped whenever the table is
+    modified; the results read from a table are dropped as soon as its
+    generation changes, so a cached result is never stale.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        """Initializes an instance of the QueryCache class"""
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # Cached results from least to most recently used, as ...
+        # ...key -> (tables, generations, value, size)
+        self.entries = OrderedDict()
+        self.size = 0
+        # Generation counter of each table
+        self.generations = {}
+        # Hit, miss, eviction and invalidation counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # The cache is shared by the GUI thread and the query worker
+        self.lock = threading.Lock()
+
+
+    def snapshot(self, tables):
+        """Method to return the current generations of the given tables."""
+        return tuple(self.generations.get(table, 0) for table in tables)
+
+
+    def lookup(self, key):
+        """Method to look up a cached result. Returns a (hit, value) tuple
+        and marks the entry as the most recently used on a hit.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[2]
+
+
+    def store(self, key, value, tables, generations):
+        """Method to cache a result read from the given tables when they
+        were at the given generations. The result is discarded if any of
+        these tables has been modified since, and the least recently used
+        entries are evicted to make room for it.
+        """
+        size = estimate_size(value)
+        with self.lock:
+            if generations != self.snapshot(tables) or size > self.max_bytes:
+                return
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[3]
+            self.entries[key] = (tables, generations, value, size)
+            self.size += size
+            while len(self.entries) > self.max_entries \
+                    or self.size > self.max_bytes:
+                self.size -= self.entries.popitem(last=False)[1][3]
+                self.evictions += 1
+
+
+    def cached(self, key, compute, tables=("books",)):
+        """Method to return the cached result for key, calling compute to
+        produce and cache it on a miss. Lists are cached as tuples, and a
+        fresh list is returned each time so callers may modify it.
+        """
+        hit, value = self.lookup(key)
+        if not hit:
+            with self.lock:
+                generations = self.snapshot(tables)
+            value = compute()
+            if isinstance(value, list):
+                value = tuple(value)
+            self.store(key, value, tables, generations)
+        return list(value) if isinstance(value, tuple) else value
+
+
+    def invalidate(self, table="books"):
+        """Method to record that a table has been modified: its generation
+        is bumped and every result read from it is dropped.
+        """
+        with self.lock:
+            self.generations[table] = self.generations.get(table, 0) + 1
+            for key, entry in list(self.entries.items()):
+                if table in entry[0]:
+                    del self.entries[key]
+                    self.size -= entry[3]
+                    self.invalidations += 1
+
+
+    def stats(self):
+        """Method to return the hit, miss, eviction and invalidation
+        counters along with the current number of entries and bytes.
+        """
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self.entries),
+                "bytes": self.size,
+            }
@@ -0,0 +1,243 @@
+import queue
+import sqlite3
+import threading
+import time
+
+
+
+class QueryWorker:
+    """A class to run database tasks on a background thread with its own
+    BookStore and SQLite connection, so that slow queries never block the
+    Tk mainloop.
+    Results are handed back to the GUI thread, where the callbacks run,
+    by polling with window.after. Tasks submitted on the same channel
+    supersede each other: a stale task is skipped or interrupted and its
+    result is discarded.
+    Write tasks are group-committed: they run inside a shared transaction
+    which is committed once enough writes have accumulated or the oldest
+    of them has waited long enough, and their callbacks only run after
+    the commit, so an acknowledged edit is never lost. Each write task
+    runs inside its own savepoint, so that a failed one leaves nothing
+    behind for the commit while the writes before it stay pending.
+    Edits are to be made in write tasks and committed by the worker. A
+    task managing its own transactions, e.g. a batch file committed in
+    chunks, must not be a write task and must call commit() first, so
+    that it never commits or rolls back the pending writes behind the
+    worker's back.
+    """
+
+    def __init__(self, open_store, window=None, poll_interval=15,
+                 commit_interval=0.05, commit_batch_size=500):
+        """Initializes an instance of the QueryWorker class and starts its
+        thread, on which open_store is called to open the BookStore the
+        tasks run against. The poll interval is the delay in milliseconds
+        between two checks of the window for finished tasks. Pending
+        writes are committed after commit_interval seconds or as soon as
+        commit_batch_size of them are pending.
+        """
+        self.open_store = open_store
+        self.window = window
+        self.poll_interval = poll_interval
+        self.commit_interval = commit_interval
+        self.commit_batch_size = commit_batch_size
+        # Outcomes of the writes waiting for the next commit, and the ...
+        # ...time by which they must be committed
+        self.pending_writes = []
+        self.commit_deadline = None
+        # Tasks waiting to run and results waiting to be delivered
+        self.tasks = queue.Queue()
+        self.results = queue.Queue()
+        # Latest generation submitted on each channel
+        self.generations = {}
+        # (channel, generation) of the task currently running, if any
+        self.running = None
+        self.lock = threading.Lock()
+        # The store is opened on the worker thread, which owns it
+        self.store = None
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self.work, daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        # Without a window, results are delivered by calling deliver()
+        self.poll_id = None
+        if self.window is not None:
+            self.poll_id = self.window.after(self.poll_interval, self.poll)
+
+
+    def submit(self, task, callback=None, channel=None, errback=None,
+               write=False):
+        """Method to queue a task for the worker thread. The task is called
+        with the worker's BookStore and its return value is passed to the
+        callback on the GUI thread; an exception is passed to the errback
+        instead. Submitting on a channel supersedes any task previously
+        submitted on that channel which has not delivered its result yet.
+        A write task is committed with the next batch of writes and only
+        then acknowledged through its callback; it is never superseded.
+        """
+        generation = None
+        if channel is not None and not write:
+            with self.lock:
+                generation = self.generations.get(channel, 0) + 1
+                self.generations[channel] = generation
+                # Stop the stale task of this channel if it is running
+                if self.running is not None and self.running[0] == channel:
+                    self.store.conn.interrupt()
+        else:
+            channel = None
+        self.tasks.put((task, callback, errback, channel, generation, write))
+
+
+    def post(self, callback, value):
+        """Method to pass a value to a callback on the GUI thread, e.g. the
+        progress of a task reported while it is running.
+        """
+        self.results.put(((callback, value), None, None))
+
+
+    def flush(self, callback=None):
+        """Method to commit the pending writes without waiting for the time
+        or size threshold. The callback, if any, runs once they are.
+        """
+        self.submit(lambda store: self.commit(), callback)
+
+
+    def cancel(self, channel):
+        """Method to discard every task submitted on the channel that has
+        not delivered its result yet, interrupting it if it is running.
+        """
+        with self.lock:
+            self.generations[channel] = self.generations.get(channel, 0) + 1
+            if self.running is not None and self.running[0] == channel:
+                self.store.conn.interrupt()
+
+
+    def is_current(self, channel, generation):
+        """Method to check whether a task is still the latest one submitted
+        on its channel. Tasks without a channel are never superseded.
+        """
+        return channel is None or self.generations.get(channel) == generation
+
+
+    def work(self):
+        """Method run by the worker thread: it executes the queued tasks one
+        at a time until it receives the None sentinel, committing the
+        pending writes whenever a threshold is reached and before exiting.
+        """
+        self.store = self.open_store()
+        self.ready.set()
+        while True:
+            # Wake up in time to commit the pending writes
+            timeout = None
+            if self.pending_writes:
+                timeout = max(self.commit_deadline - time.monotonic(), 0)
+            try:
+                job = self.tasks.get(timeout=timeout)
+            except queue.Empty:
+                self.commit()
+                continue
+            if job is None:
+                break
+            task, callback, errback, channel, generation, write = job
+            with self.lock:
+                # Skip tasks superseded while waiting in the queue
+                if not self.is_current(channel, generation):
+                    continue
+                self.running = (channel, generation)
+            try:
+                if write:
+                    with self.store.savepoint("task"):
+                        outcome = (callback, task(self.store))
+                else:
+                    outcome = (callback, task(self.store))
+            except Exception as error:
+                outcome = (errback, error)
+                if write and not self.store.conn.in_transaction:
+                    # The error rolled back the whole transaction, with ...
+                    # ...the writes pending before this one
+                    self.abort(error)
+                write = False
+            finally:
+                with self.lock:
+                    self.running = None
+            if write:
+                # Hold the acknowledgement back until the write is committed
+                if not self.pending_writes:
+                    self.commit_deadline = \
+                        time.monotonic() + self.commit_interval
+                self.pending_writes.append((outcome, errback))
+                if len(self.pending_writes) >= self.commit_batch_size:
+                    self.commit()
+            # An interrupted task was superseded: drop its outcome
+            elif self.is_current(channel, generation):
+                self.results.put((outcome, channel, generation))
+        self.commit()
+        self.store.close()
+
+
+    def commit(self):
+        """Method run on the worker thread to commit the pending writes in
+        one transaction and acknowledge them. If the commit fails, the
+        writes are rolled back and their errbacks receive the error.
+        """
+        if not self.pending_writes:
+            return
+        try:
+            self.store.commit()
+        except sqlite3.Error as error:
+            self.abort(error)
+            return
+        for outcome, errback in self.pending_writes:
+            self.results.put((outcome, None, None))
+        self.pending_writes = []
+
+
+    def abort(self, error):
+        """Method run on the worker thread to roll back the pending writes
+        and pass the error to their errbacks.
+        """
+        self.store.rollback()
+        for outcome, errback in self.pending_writes:
+            self.results.put(((errback, error), None, None))
+        self.pending_writes = []
+
+
+    def deliver(self):
+        """Method to deliver the results of finished tasks to their
+        callbacks, on the calling thread.
+        """
+        while True:
+            try:
+                (handler, value), channel, generation = \
+                    self.results.get_nowait()
+            except queue.Empty:
+                break
+            # Drop results superseded after the task finished
+            if not self.is_current(channel, generation):
+                continue
+            if handler is not None:
+                handler(value)
+            elif isinstance(value, Exception):
+                if self.window is None:
+                    raise value
+                # Report errors nobody handles the way Tk reports ...
+                # ...exceptions raised in callbacks
+                self.window.report_callback_exception(
+                    type(value), value, value.__traceback__)
+
+
+    def poll(self):
+        """Method run periodically on the GUI thread to deliver the results
+        of finished tasks to their callbacks.
+        """
+        self.deliver()
+        self.poll_id = self.window.after(self.poll_interval, self.poll)
+
+
+    def close(self):
+        """Method to stop polling, let the worker thread finish the tasks
+        already queued, commit the pending writes and close its store.
+        """
+        if self.poll_id is not None:
+            self.window.after_cancel(self.poll_id)
+        self.tasks.put(None)
+        self.thread.join()
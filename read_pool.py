@@ -0,0 +1,156 @@
+import multiprocessing
+import os
+import sqlite3
+import sql_queries
+from concurrent.futures import ProcessPoolExecutor
+from book_store import BookStore
+from query_cache import QueryCache
+
+
+
+# Suffix of the snapshot copies of the database read by a pool, followed ...
+# ...by the process ID of the pool's owner and a generation number
+SNAPSHOT_SUFFIX = ".snapshot"
+
+# Read-only store of the current worker process, opened by open_reader
+reader = None
+
+
+
+def open_reader(database, search_mode, immutable):
+    """Function run in every worker process as it starts, to open its
+    read-only, memory-mapped store. Results are only cached when the
+    database is an immutable snapshot, since a worker cannot tell when
+    another process changes the database itself.
+    """
+    global reader
+    cache = QueryCache() if immutable else QueryCache(max_entries=0)
+    reader = BookStore(database, search_mode, cache, read_only=True,
+                       immutable=immutable)
+
+
+def run(task, args):
+    """Function run in a worker process to call task with the process's
+    read-only store, followed by args.
+    """
+    return task(reader, *args)
+
+
+def process_id(store):
+    """Function to return the ID of the worker process it runs in."""
+    return os.getpid()
+
+
+def copy_database(database, path):
+    """Function to copy the database to path with SQLite's online backup,
+    which yields a consistent copy even while the database is written.
+    The copy is switched out of write-ahead logging, so that it can be
+    opened as immutable: a single file, read without any lock.
+    """
+    source = sqlite3.connect(database)
+    target = sqlite3.connect(path)
+    try:
+        source.backup(target)
+        target.execute(sql_queries.DISABLE_WAL)
+    finally:
+        target.close()
+        source.close()
+
+
+
+class ReadPool:
+    """A class to run read-only tasks, such as searches, on a pool of
+    worker processes, so that read throughput scales with the number of
+    cores instead of being capped at one query at a time. Each worker
+    opens its own read-only, memory-mapped connection, either to the
+    database itself, whose write-ahead log gives every query a consistent
+    view of the last commit, or to a snapshot copy of it opened as
+    immutable, which refresh() replaces with a fresh copy.
+    Tasks must be module-level functions, so that they can be sent to
+    the workers; they are called with the worker's BookStore followed by
+    the arguments they were submitted with.
+    """
+
+    def __init__(self, database, search_mode, processes=None, snapshot=False):
+        """Initializes an instance of the ReadPool class with the given
+        number of worker processes (one per core by default). With
+        snapshot set to True, the workers read a snapshot copy of the
+        database, which does not see the later commits until refresh()
+        is called.
+        """
+        self.database = database
+        self.search_mode = search_mode
+        self.processes = processes or os.cpu_count() or 1
+        self.snapshot = snapshot
+        # Number of snapshot copies made, to name the next one
+        self.generation = 0
+        self.snapshot_path = None
+        self.executor = None
+        self.start()
+
+
+    def start(self):
+        """Method to start a new set of worker processes, on a new snapshot
+        copy in snapshot mode, which serve every task submitted from then
+        on. Returns the previous executor and snapshot path, if any.
+        """
+        previous = self.executor, self.snapshot_path
+        path = self.database
+        if self.snapshot:
+            self.generation += 1
+            path = self.snapshot_path = (f"{self.database}{SNAPSHOT_SUFFIX}-"
+                                         f"{os.getpid()}-{self.generation}")
+            copy_database(self.database, path)
+        # Spawned rather than forked, since the owner may run threads ...
+        # ...and hold connections of its own
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=open_reader,
+            initargs=(path, self.search_mode, self.snapshot),
+        )
+        return previous
+
+
+    def refresh(self):
+        """Method to serve the next tasks from a fresh snapshot copy of the
+        database. The tasks already submitted finish on the previous
+        workers, whose copy is deleted once they are done. Blocks until
+        then, so it is best called from a background thread.
+        """
+        executor, path = self.start()
+        self.stop(executor, path)
+
+
+    def warm_up(self):
+        """Method to start the worker processes and open their connections
+        ahead of the first tasks. Returns the IDs of the processes which
+        answered.
+        """
+        futures = [self.submit(process_id) for _ in range(self.processes)]
+        return {future.result() for future in futures}
+
+
+    def submit(self, task, *args):
+        """Method to run task(store, *args) on a worker process. Returns a
+        concurrent.futures.Future of its result.
+        """
+        return self.executor.submit(run, task, args)
+
+
+    @staticmethod
+    def stop(executor, path):
+        """Static method to wait for the tasks of an executor, stop its
+        worker processes and delete their snapshot copy, if any.
+        """
+        if executor is not None:
+            executor.shutdown(wait=True)
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+
+
+    def close(self):
+        """Method to stop the worker processes once their tasks are done."""
+        self.stop(self.executor, self.snapshot_path)
+        self.executor = None
+        self.snapshot_path = None
@@ -0,0 +1,343 @@
+from array import array
+from tkinter import END
+import metrics
+
+
+
+# Separator of the fields of a record in its list box row
+FIELD_SEPARATOR = "  |  "
+
+
+
+def format_record(record):
+    """Function to return the string displaying a record in the list box,
+    a missing value being left blank.
+    """
+    return FIELD_SEPARATOR.join("" if value is None else str(value)
+                                for value in record)
+
+
+
+class RecordStore:
+    """A class to hold the records displayed in the list box, row for row,
+    in parallel columns: an array of IDs and one list per text field. The
+    list box itself only holds the display strings, and a selected row is
+    read back from the store through its index, so the data never depends
+    on how rows are displayed.
+    """
+
+    __slots__ = ("ids", "titles", "authors", "ratings", "isbns")
+
+    def __init__(self):
+        """Initializes an empty instance of the RecordStore class"""
+        self.clear()
+
+
+    def __len__(self):
+        return len(self.ids)
+
+
+    def clear(self):
+        """Method to remove every record."""
+        self.ids = array("q")
+        self.titles = []
+        self.authors = []
+        self.ratings = []
+        self.isbns = []
+
+
+    def insert(self, index, records):
+        """Method to insert (ID, Title, Author, Rating, ISBN) records before
+        the given row, in order.
+        """
+        if not records:
+            return
+        ids, titles, authors, ratings, isbns = zip(*records)
+        self.ids[index:index] = array("q", ids)
+        self.titles[index:index] = titles
+        self.authors[index:index] = authors
+        self.ratings[index:index] = ratings
+        self.isbns[index:index] = isbns
+
+
+    def delete(self, start, end=None):
+        """Method to remove the rows from start up to, but excluding, end
+        (the last row if end is None).
+        """
+        for column in (self.ids, self.titles, self.authors, self.ratings,
+                       self.isbns):
+            del column[start:end]
+
+
+    def get(self, index):
+        """Method to return the record at the given row as an (ID, Title,
+        Author, Rating, ISBN) tuple.
+        """
+        return (self.ids[index], self.titles[index], self.authors[index],
+                self.ratings[index], self.isbns[index])
+
+
+
+class PagedResultView:
+    """A class to display the result of a query in a list box one page at a
+    time. Pages are fetched with keyset pagination on the ID column when
+    the view is scrolled close to either end of the rows currently held,
+    and rows scrolled far out of view are dropped, so memory stays flat
+    whatever the number of matching records. Queries run on the query
+    worker's thread; showing a new result supersedes any page of the
+    previous one still being fetched. The records displayed are kept in a
+    RecordStore aligned with the rows of the list box.
+    """
+
+    # Query worker channel of the page fetches
+    CHANNEL = "results"
+
+    def __init__(self, list_box, scrollbar, worker, page_size=100,
+                 max_pages=5):
+        """Initializes an instance of the PagedResultView class for the
+        given list box, its vertical scrollbar and the query worker used
+        to fetch the pages.
+        """
+        self.list_box = list_box
+        self.scrollbar = scrollbar
+        self.worker = worker
+        # Number of records fetched per query
+        self.page_size = page_size
+        # Maximum number of records held in the list box at any time
+        self.max_rows = page_size * max_pages
+        # Records displayed, row for row
+        self.rows = RecordStore()
+        # Route every change of the list box view through this class, ...
+        # ...whatever its origin (scrollbar, mouse wheel or keyboard)
+        self.list_box.configure(yscrollcommand=self.on_view_changed)
+        self.reset()
+
+
+    def reset(self):
+        """Method to forget the current query, so that scrolling the list
+        box no longer fetches any records, and discard any page of it
+        still being fetched.
+        """
+        self.worker.cancel(self.CHANNEL)
+        self.rows.clear()
+        self.active = False
+        self.on_error = None
+        # Records held in memory when the result does not come from the ...
+        # ...database, and the position of each record ID among them
+        self.records = None
+        self.positions = None
+        self.conditions = ()
+        self.values = ()
+        # Whether the records held in memory are the best ranked ones, ...
+        # ...to be extended with the next best on request, and whether ...
+        # ...every ranked record has been fetched
+        self.ranked = False
+        self.ranked_complete = False
+        # IDs of the first and last records held in the list box
+        self.first_id = None
+        self.last_id = None
+        # Whether matching records exist before and after those held
+        self.has_previous = False
+        self.has_next = False
+        # Guard against fetching again while a page is on its way
+        self.loading = False
+
+
+    def show(self, conditions=(), values=(), on_error=None, first_page=None):
+        """Method to display the records meeting the given SQL conditions,
+        starting with the first page, which is fetched unless it is given
+        (e.g. fetched along with another query). The list box is expected
+        to be empty. A query error is passed to on_error, if given.
+        """
+        self.reset()
+        self.active = True
+        self.conditions = tuple(conditions)
+        self.values = tuple(values)
+        self.on_error = on_error
+        self.has_next = True
+        if first_page is not None:
+            self.insert_next_page(first_page)
+        else:
+            self.load_next_page()
+
+
+    def show_records(self, records):
+        """Method to display records already held in memory, in the given
+        order (e.g. by ID, or best match first), page by page like a result
+        fetched from the database.
+        """
+        self.reset()
+        self.active = True
+        self.records = records
+        self.positions = {record[0]: position
+                          for position, record in enumerate(records)}
+        self.has_next = True
+        self.load_next_page()
+
+
+    def show_ranked(self, conditions=(), values=(), on_error=None):
+        """Method to display the records meeting the given SQL conditions,
+        most relevant first. Only the best ranked page is fetched at
+        first; the next best records are fetched as the list box is
+        scrolled past those already fetched. A query error is passed to
+        on_error, if given.
+        """
+        self.reset()
+        self.active = True
+        self.conditions = tuple(conditions)
+        self.values = tuple(values)
+        self.on_error = on_error
+        self.records = []
+        self.positions = {}
+        self.ranked = True
+        self.has_next = True
+        self.load_next_page()
+
+
+    def fetch_page(self, after_id=None, before_id=None):
+        """Method to fetch the page of matching records following after_id
+        or preceding before_id, on the query worker unless the records are
+        held in memory. The records are passed to the callback in
+        display order.
+        """
+        def task(store):
+            return store.fetch_page(self.conditions, self.values, after_id,
+                                    before_id, self.page_size)
+
+        offset = len(self.records) if self.records is not None else 0
+
+        def ranked_task(store):
+            return store.fetch_ranked(self.conditions, self.values, offset,
+                                      self.page_size)
+
+        def extend_ranked(records):
+            self.ranked_complete = len(records) < self.page_size
+            for record in records:
+                # Skip records moved down the ranking by a concurrent edit
+                if record[0] not in self.positions:
+                    self.positions[record[0]] = len(self.records)
+                    self.records.append(record)
+            callback(memory_task())
+
+        def memory_task():
+            if before_id is not None:
+                end = self.positions[before_id]
+                return self.records[max(end - self.page_size, 0):end]
+            start = 0
+            if after_id is not None:
+                start = self.positions[after_id] + 1
+            return self.records[start:start + self.page_size]
+
+        def callback(records):
+            self.loading = False
+            if before_id is not None:
+                self.insert_previous_page(records)
+            else:
+                self.insert_next_page(records)
+
+        def errback(error):
+            self.loading = False
+            self.has_next = self.has_previous = False
+            if self.on_error is not None:
+                self.on_error(error)
+
+        if self.records is not None:
+            start = 0
+            if after_id is not None:
+                start = self.positions[after_id] + 1
+            # Fetch the next best ranked records first if the page goes ...
+            # ...past those held
+            if self.ranked and before_id is None and not self.ranked_complete \
+                    and start + self.page_size > len(self.records):
+                self.loading = True
+                self.worker.submit(ranked_task, extend_ranked, self.CHANNEL,
+                                   errback)
+                return
+            callback(memory_task())
+            return
+        self.loading = True
+        self.worker.submit(task, callback, self.CHANNEL, errback)
+
+
+    def load_next_page(self):
+        """Method to request the page of records following those held."""
+        self.fetch_page(after_id=self.last_id)
+
+
+    def load_previous_page(self):
+        """Method to request the page of records preceding those held."""
+        self.fetch_page(before_id=self.first_id)
+
+
+    def insert_next_page(self, records):
+        """Method to append a page of records to the list box, dropping
+        records from the top if it grows beyond its limit.
+        """
+        self.has_next = len(records) == self.page_size
+        with metrics.timer("listbox.insert") as timing:
+            self.list_box.insert(END, *map(format_record, records))
+            self.rows.insert(len(self.rows), records)
+            timing.rows = len(records)
+        if records:
+            self.last_id = records[-1][0]
+            if self.first_id is None:
+                self.first_id = records[0][0]
+        # Drop the records furthest from the view
+        excess = self.list_box.size() - self.max_rows
+        if excess > 0:
+            top = self.list_box.nearest(0)
+            self.list_box.delete(0, excess - 1)
+            self.rows.delete(0, excess)
+            # Keep the same records on screen
+            self.list_box.yview(max(top - excess, 0))
+            self.first_id = self.rows.ids[0]
+            self.has_previous = True
+
+
+    def insert_previous_page(self, records):
+        """Method to prepend a page of records to the list box, dropping
+        records from the bottom if it grows beyond its limit.
+        """
+        self.has_previous = len(records) == self.page_size
+        top = self.list_box.nearest(0)
+        with metrics.timer("listbox.insert") as timing:
+            self.list_box.insert(0, *map(format_record, records))
+            self.rows.insert(0, records)
+            timing.rows = len(records)
+        if records:
+            self.first_id = records[0][0]
+            # Keep the same records on screen
+            self.list_box.yview(top + len(records))
+        # Drop the records furthest from the view
+        excess = self.list_box.size() - self.max_rows
+        if excess > 0:
+            self.list_box.delete(self.max_rows, END)
+            self.rows.delete(self.max_rows)
+            self.last_id = self.rows.ids[-1]
+            self.has_next = True
+
+
+    def record(self, index):
+        """Method to return the record displayed at the given row of the list
+        box, or None if the row does not show a record.
+        """
+        if 0 <= index < len(self.rows):
+            return self.rows.get(index)
+        return None
+
+
+    def on_view_changed(self, first, last):
+        """Callback method invoked by the list box whenever its view changes.
+        It updates the scrollbar and fetches another page when the view
+        gets close to either end of the records held.
+        """
+        self.scrollbar.set(first, last)
+        if not self.active or self.loading:
+            return
+        first, last = float(first), float(last)
+        # Fraction of the held records treated as being close to an end
+        margin = (last - first) / 2
+        if self.has_next and last >= 1.0 - margin:
+            self.load_next_page()
+        elif self.has_previous and first <= margin:
+            self.load_previous_page()
@@ -0,0 +1,358 @@
+import re
+import sqlite3
+import string
+import sql_queries
+import ingest
+
+
+
+# Search mode matching titles and authors with LIKE '%...%' predicates, ...
+# ...which scans the whole 'books' table on every search
+LIKE_MODE = "like"
+
+# Search mode matching titles and authors by whole tokens and token ...
+# ...prefixes through the full-text index
+TOKEN_MODE = "token"
+
+# Search mode matching titles and authors by arbitrary substrings through ...
+# ...a trigram full-text index
+TRIGRAM_MODE = "trigram"
+
+# Search mode tolerating typos in titles and authors: the words entered are
+# ...expanded into the close terms found through a trigram index of the ...
+# ...vocabulary (see fuzzy.py), and the best matches are ranked first
+FUZZY_MODE = "fuzzy"
+
+# Every search mode, e.g. to offer as command line choices
+SEARCH_MODES = [TRIGRAM_MODE, TOKEN_MODE, FUZZY_MODE, LIKE_MODE]
+
+# Search modes matching titles and authors as case-insensitive substrings
+SUBSTRING_MODES = (TRIGRAM_MODE, LIKE_MODE)
+
+# FTS5 tokenizer used to build the full-text index for each search mode
+FTS_TOKENIZERS = {
+    TOKEN_MODE: "unicode61 remove_diacritics 2",
+    TRIGRAM_MODE: "trigram",
+    FUZZY_MODE: "trigram",
+}
+
+# Default number of best-ranked records returned by a ranked or fuzzy search
+RANKED_LIMIT = 50
+
+# The trigram tokenizer can only match search terms of at least 3 characters
+TRIGRAM_MIN_LENGTH = 3
+
+# Translation table lower-casing the ASCII letters only, the way SQLite's ...
+# ...LOWER() function and LIKE operator do
+ASCII_LOWERCASE = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+# Regular expression matching a number in the rating entry field
+_NUMBER = r"(\d+(?:\.\d*)?|\.\d+)"
+
+# Regular expression matching a single rating bound, e.g. '4.5' or '>=4'
+RATING_BOUND_PATTERN = re.compile(r"^(>=|<=|>|<|=)?\s*" + _NUMBER + r"$")
+
+# Regular expression matching an inclusive rating range, e.g. '3.5-4.5' ...
+# ...or '3.5..4.5'
+RATING_RANGE_PATTERN = re.compile(
+    r"^" + _NUMBER + r"\s*(?:-|\.\.|to)\s*" + _NUMBER + r"$")
+
+# Weights of the Title and Author columns in the BM25 relevance score of ...
+# ...ranked searches, a title match counting twice as much
+BM25_WEIGHTS = (2.0, 1.0)
+
+# Relevance boost per rating point in ranked searches: a 5-star book ...
+# ...scores 1 + 5 * RATING_BOOST times as much as the same match unrated
+RATING_BOOST = 0.1
+
+
+
+def ensure_fts_index(conn, search_mode):
+    """Function to make sure the 'books_fts' and 'authors_fts' full-text
+    indexes exist and are built with the tokenizer of the given search
+    mode. They are (re)created and populated from the 'books' and
+    'authors' tables only when they are missing or were built with a
+    different tokenizer; from then on the triggers keep them in sync with
+    every insert, update and delete.
+    Returns the search mode that can actually be used, falling back on
+    LIKE_MODE when this SQLite build lacks FTS5 or the tokenizer.
+    """
+    if search_mode == LIKE_MODE:
+        return LIKE_MODE
+
+    tokenizer = FTS_TOKENIZERS[search_mode]
+    cur = conn.cursor()
+    # Nothing to do if the index has already been built with this ...
+    # ...tokenizer, but recreate any trigger replaced by a migration
+    cur.execute(sql_queries.FTS_TABLE_EXISTS)
+    if cur.fetchone()[0] == 2 \
+            and ingest.read_metadata(cur).get("fts_tokenizer") == tokenizer:
+        for statement in sql_queries.CREATE_FTS_TRIGGERS:
+            cur.execute(statement)
+        return search_mode
+
+    try:
+        with conn:
+            # Drop the index built with another tokenizer, if any
+            for statement in sql_queries.DROP_FTS:
+                cur.execute(statement)
+            cur.execute(sql_queries.CREATE_FTS_TABLE.format(
+                tokenizer=tokenizer))
+            cur.execute(sql_queries.CREATE_AUTHORS_FTS_TABLE.format(
+                tokenizer=tokenizer))
+            for statement in sql_queries.CREATE_FTS_TRIGGERS:
+                cur.execute(statement)
+            # Index the records already present in the 'books' and ...
+            # ...'authors' tables
+            for statement in sql_queries.REBUILD_FTS:
+                cur.execute(statement)
+            cur.execute(sql_queries.UPSERT_METADATA,
+                        ("fts_tokenizer", tokenizer))
+    except sqlite3.OperationalError:
+        # FTS5, or the trigram tokenizer (SQLite < 3.34), is not available
+        return LIKE_MODE
+    return search_mode
+
+
+def quote_fts_phrase(text):
+    """Function to quote text as an FTS5 phrase so that punctuation and
+    query syntax in user input are matched literally.
+    """
+    return '"' + text.replace('"', '""') + '"'
+
+
+def fts_column_query(column, text, search_mode):
+    """Function to build the FTS5 query matching text in a single column.
+    Returns None when the index cannot serve the search, i.e. a term
+    shorter than 3 characters in trigram mode.
+    """
+    if FTS_TOKENIZERS[search_mode] == "trigram":
+        if len(text) < TRIGRAM_MIN_LENGTH:
+            return None
+        # The whole input is one phrase, which the trigram tokenizer ...
+        # ...matches as a case-insensitive substring
+        return "{%s} : %s" % (column, quote_fts_phrase(text))
+    # Every word must match the start of a token in the column
+    terms = " ".join(quote_fts_phrase(word) + "*" for word in text.split())
+    return "{%s} : (%s)" % (column, terms)
+
+
+def fold_ascii(text):
+    """Function to lower-case the ASCII letters of text, leaving any other
+    character as it is, the way SQLite's LOWER() and LIKE compare text.
+    """
+    return text.translate(ASCII_LOWERCASE)
+
+
+def fold_case(text):
+    """Function to case-fold text one character at a time, accents kept,
+    the way the trigram tokenizer compares text: 'É' matches 'é' but not
+    'e', and a character folding into several ('ß') is kept as it is.
+    """
+    folded = text.casefold()
+    if len(folded) == len(text):
+        return folded
+    return "".join(char.casefold() if len(char.casefold()) == 1
+                   else char.lower() if len(char.lower()) == 1 else char
+                   for char in text)
+
+
+def substring_fold(text, search_mode):
+    """Function to return the function folding titles and authors the way
+    a substring search for text compares them: fold_case through the
+    trigram index, or fold_ascii with a LIKE scan, i.e. in LIKE_MODE or
+    for text too short for the index.
+    """
+    if FTS_TOKENIZERS.get(search_mode) == "trigram" \
+            and len(text.strip()) >= TRIGRAM_MIN_LENGTH:
+        return fold_case
+    return fold_ascii
+
+
+def parse_rating(text):
+    """Function to parse the rating entry field into a list of (operator,
+    value) comparisons that a rating must all satisfy. Accepted forms are
+    an exact rating ('4.5'), a bound ('>=4', '<3') and an inclusive range
+    ('3.5-4.5' or '3.5..4.5'). Raises ValueError for anything else.
+    """
+    text = text.strip()
+    match = RATING_BOUND_PATTERN.match(text)
+    if match:
+        operator, value = match.groups()
+        return [(operator or "=", float(value))]
+    match = RATING_RANGE_PATTERN.match(text)
+    if match:
+        low, high = sorted(float(value) for value in match.groups())
+        return [(">=", low), ("<=", high)]
+    raise ValueError(f"Invalid rating: {text!r}. Use e.g. 4, >=4 or 3.5-4.5")
+
+
+def normalize_isbn(isbn):
+    """Function to normalize an ISBN the same way as the ISBN_KEY SQL
+    expression, so that it can be compared with the indexed key.
+    """
+    return isbn.strip().replace("-", "").replace(" ", "").upper()
+
+
+def prefix_upper_bound(prefix):
+    """Function to return the smallest string greater than every string
+    starting with prefix, turning a prefix match into an index range.
+    """
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def build_search_conditions(title, author, rating, isbn,
+                            search_mode=TRIGRAM_MODE):
+    """Function to build the SQL conditions and the corresponding parameter
+    values for a search on the 'books' table from the user input. Empty
+    fields are ignored. Titles and author names are matched through the
+    full-text indexes unless the search mode is LIKE_MODE, ratings may be
+    exact values, bounds or ranges and ISBNs are matched by prefix, a
+    complete ISBN included, all through B-tree indexes.
+    Returns a tuple (conditions, values) whose conditions are to be
+    joined with AND. Raises ValueError if the rating is invalid.
+    """
+    # Initiate empty lists for SQL query conditions and ...
+    # ...corresponding values
+    list_conditions = []
+    list_entry_values = []
+    # FTS5 query for the title on 'books_fts'
+    fts_queries = []
+
+    title = title.strip()
+    if title:
+        fts_query = None
+        if search_mode != LIKE_MODE:
+            fts_query = fts_column_query("Title", title, search_mode)
+        if fts_query is not None:
+            fts_queries.append(fts_query)
+        else:
+            # Fall back on a substring scan of the 'books' table
+            list_conditions.append("LOWER(Title) LIKE ?")
+            list_entry_values.append(f"%{title}%")
+
+    # Match the author against each author name on its own, through the ...
+    # ...full-text index of the 'authors' table and the 'book_authors' ...
+    # ...index, or a substring scan of the much smaller 'authors' table
+    author = author.strip()
+    if author:
+        fts_query = None
+        if search_mode != LIKE_MODE:
+            fts_query = fts_column_query("Name", author, search_mode)
+        if fts_query is not None:
+            list_conditions.append(sql_queries.AUTHOR_MATCH_CONDITION)
+            list_entry_values.append(fts_query)
+        else:
+            list_conditions.append(sql_queries.AUTHOR_LIKE_CONDITION)
+            list_entry_values.append(f"%{author}%")
+
+    # Look up the matching IDs in the full-text index
+    if fts_queries:
+        list_conditions.insert(0, sql_queries.FTS_MATCH_CONDITION)
+        list_entry_values.insert(0, " AND ".join(fts_queries))
+
+    # Append the SQL query conditions and values for Rating to ...
+    # ...corresponding lists if the rating entry field is not empty
+    if rating.strip():
+        for operator, value in parse_rating(rating):
+            list_conditions.append(f"rating {operator} ?")
+            list_entry_values.append(value)
+
+    # Append the SQL query conditions and values for ISBN to ...
+    # ...corresponding lists if the isbn entry field is not empty
+    isbn_key = normalize_isbn(isbn)
+    if isbn_key:
+        # Match every key starting with the input as an index range, ...
+        # ...which includes the exact ISBN, so that the first 10 digits ...
+        # ...of an ISBN-13 still match while it is being typed
+        list_conditions.append(f"{sql_queries.ISBN_KEY} >= ?")
+        list_conditions.append(f"{sql_queries.ISBN_KEY} < ?")
+        list_entry_values.append(isbn_key)
+        list_entry_values.append(prefix_upper_bound(isbn_key))
+
+    return tuple(list_conditions), tuple(list_entry_values)
+
+
+def build_search_query(conditions):
+    """Function to form the full SQL query selecting the book records that
+    meet all the given conditions.
+    """
+    return "SELECT * FROM books WHERE " + " AND ".join(conditions)
+
+
+def build_page_query(conditions, after_id=None, before_id=None, limit=True):
+    """Function to form the SQL query fetching one page of the book
+    records that meet all the given conditions, using keyset pagination
+    on the ID column: the page after after_id in ascending ID order, or
+    the page before before_id in descending ID order. The query takes
+    the condition values followed by the key, if any, and the page size
+    unless limit is False, in which case every following record is read.
+    """
+    conditions = list(conditions)
+    if after_id is not None:
+        conditions.append("ID > ?")
+    elif before_id is not None:
+        conditions.append("ID < ?")
+    query = "SELECT * FROM books"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    order = "DESC" if before_id is not None else "ASC"
+    query += f" ORDER BY ID {order}"
+    return query + " LIMIT ?" if limit else query
+
+
+def build_ranked_query(conditions):
+    """Function to form the SQL query fetching the records that meet all
+    the given conditions, most relevant first: by BM25 score of the title
+    and author weighted by rating when the conditions include a
+    full-text match, by rating otherwise. The query takes the condition
+    values followed by the number of records to return and the number of
+    best records to skip. Only the requested records are sorted, so the
+    cost of ranking does not grow with the number of matches beyond
+    scoring them.
+    """
+    conditions = list(conditions)
+    if conditions and conditions[0] == sql_queries.FTS_MATCH_CONDITION:
+        # The full-text match drives the query and scores every match
+        where = " AND ".join(conditions[1:])
+        return sql_queries.RANKED_MATCHES.format(
+            weights=", ".join(str(weight) for weight in BM25_WEIGHTS),
+            boost=RATING_BOOST,
+            where="WHERE " + where if where else "",
+        )
+    where = " AND ".join(conditions)
+    return sql_queries.RANKED_BY_RATING.format(
+        where="WHERE " + where if where else "")
+
+
+def build_author_query(text, search_mode=TRIGRAM_MODE):
+    """Function to form the SQL query listing the authors whose name
+    matches text, with their number of books, and its value. The query
+    also takes the number of authors to return.
+    """
+    text = text.strip()
+    fts_query = None
+    if search_mode != LIKE_MODE:
+        fts_query = fts_column_query("Name", text, search_mode)
+    if fts_query is not None:
+        return (sql_queries.SELECT_MATCHING_AUTHORS.format(
+            where=sql_queries.AUTHOR_NAME_MATCH), fts_query)
+    return (sql_queries.SELECT_MATCHING_AUTHORS.format(
+        where=sql_queries.AUTHOR_NAME_LIKE), f"%{text.lower()}%")
+
+
+def explain_query_plan(conn, query, values=()):
+    """Function to return the steps of the SQLite query plan of a query,
+    as the list of detail strings reported by EXPLAIN QUERY PLAN.
+    """
+    rows = conn.execute("EXPLAIN QUERY PLAN " + query, values).fetchall()
+    return [row[-1] for row in rows]
+
+
+def full_table_scans(conn, query, values=()):
+    """Function to return the steps of the query plan that scan the whole
+    'books' table instead of seeking through an index. An empty list
+    means every predicate of the query is served by an index.
+    """
+    return [step for step in explain_query_plan(conn, query, values)
+            if re.match(r"^SCAN books\b", step)]
@@ -43,3 +43,627 @@ UPDATE_RECORD = """
                         Rating = ?, ISBN = ?
                     WHERE ID = ?
                  """
+
+# SQL statement to check whether the 'books' table holds any record, ...
+# ...stopping at the first one instead of counting them all
+HAS_RECORDS = """SELECT EXISTS (SELECT 1 FROM books)"""
+
+# SQL statement to create a key-value table named 'metadata' if it ...
+# ...does not already exist. It stores bookkeeping information such as ...
+# ...the fingerprint of the CSV file loaded into the 'books' table.
+CREATE_METADATA_TABLE = """
+                CREATE TABLE IF NOT EXISTS metadata (
+                            Key     VARCHAR PRIMARY KEY,
+                            Value   VARCHAR
+                        )
+               """
+
+# SQL statement to select all key-value pairs from the 'metadata' table.
+SELECT_METADATA = """SELECT Key, Value FROM metadata"""
+
+# SQL statement to insert a key-value pair into the 'metadata' table, ...
+# ...replacing the value if the key already exists.
+UPSERT_METADATA = """
+                    INSERT INTO metadata (Key, Value)
+                    VALUES(?, ?)
+                    ON CONFLICT(Key) DO UPDATE SET Value = excluded.Value
+                  """
+
+# SQL statement to create the 'books_fts' full-text index over the Title ...
+# ...and Author columns of the 'books' table. It is an external content ...
+# ...table, so the text itself is only stored once, in 'books'. The ...
+# ...{tokenizer} placeholder is filled in with the FTS5 tokenizer to use.
+CREATE_FTS_TABLE = """
+                CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+                            Title,
+                            Author,
+                            content='books',
+                            content_rowid='ID',
+                            tokenize='{tokenizer}'
+                        )
+               """
+
+# SQL statements to create the triggers keeping 'books_fts' in sync with ...
+# ...the 'books' table whenever a record is inserted (INSERT_RECORD), ...
+# ...deleted (DELETE_RECORD, TRUNCATE_TABLE) or updated (UPDATE_RECORD).
+CREATE_FTS_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books
+    BEGIN
+        INSERT INTO books_fts (rowid, Title, Author)
+        VALUES (new.ID, new.Title, new.Author);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books
+    BEGIN
+        INSERT INTO books_fts (books_fts, rowid, Title, Author)
+        VALUES ('delete', old.ID, old.Title, old.Author);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_update
+    AFTER UPDATE OF Title, Author ON books
+    WHEN old.Title IS NOT new.Title OR old.Author IS NOT new.Author
+    BEGIN
+        INSERT INTO books_fts (books_fts, rowid, Title, Author)
+        VALUES ('delete', old.ID, old.Title, old.Author);
+        INSERT INTO books_fts (rowid, Title, Author)
+        VALUES (new.ID, new.Title, new.Author);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS authors_fts_insert AFTER INSERT ON authors
+    BEGIN
+        INSERT INTO authors_fts (rowid, Name) VALUES (new.ID, new.Name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS authors_fts_delete AFTER DELETE ON authors
+    BEGIN
+        INSERT INTO authors_fts (authors_fts, rowid, Name)
+        VALUES ('delete', old.ID, old.Name);
+    END
+    """,
+]
+
+# SQL statement to create the 'authors_fts' full-text index over the ...
+# ...names of the 'authors' table, with the same tokenizer as 'books_fts'.
+CREATE_AUTHORS_FTS_TABLE = """
+                CREATE VIRTUAL TABLE IF NOT EXISTS authors_fts USING fts5(
+                            Name,
+                            content='authors',
+                            content_rowid='ID',
+                            tokenize='{tokenizer}'
+                        )
+               """
+
+# SQL statements to drop the triggers keeping the full-text indexes in ...
+# ...sync, e.g. while a bulk load replaces every record at once.
+DROP_FTS_TRIGGERS = [
+    """DROP TRIGGER IF EXISTS books_fts_insert""",
+    """DROP TRIGGER IF EXISTS books_fts_delete""",
+    """DROP TRIGGER IF EXISTS books_fts_update""",
+    """DROP TRIGGER IF EXISTS authors_fts_insert""",
+    """DROP TRIGGER IF EXISTS authors_fts_delete""",
+]
+
+# SQL statement to drop the update trigger of 'books_fts', so that it is ...
+# ...recreated from CREATE_FTS_TRIGGERS, which now skips the updates ...
+# ...leaving the title and author unchanged.
+DROP_FTS_UPDATE_TRIGGER = """DROP TRIGGER IF EXISTS books_fts_update"""
+
+# SQL statements to drop the full-text indexes and their triggers.
+DROP_FTS = DROP_FTS_TRIGGERS + [
+    """DROP TABLE IF EXISTS books_fts""",
+    """DROP TABLE IF EXISTS authors_fts""",
+]
+
+# SQL statement to count how many of the 'books_fts' and 'authors_fts' ...
+# ...tables exist.
+FTS_TABLE_EXISTS = """
+                    SELECT COUNT(*) FROM sqlite_master
+                    WHERE type = 'table'
+                      AND name IN ('books_fts', 'authors_fts')
+                   """
+
+# SQL statements to rebuild the full-text indexes from the content of the ...
+# ...'books' and 'authors' tables.
+REBUILD_FTS = [
+    """INSERT INTO books_fts (books_fts) VALUES ('rebuild')""",
+    """INSERT INTO authors_fts (authors_fts) VALUES ('rebuild')""",
+]
+
+# SQL condition restricting a search on the 'books' table to the records ...
+# ...matching an FTS5 query. A placeholder (?) is used for the query.
+FTS_MATCH_CONDITION = \
+    "ID IN (SELECT rowid FROM books_fts WHERE books_fts MATCH ?)"
+
+# SQL statement to count the records matching an FTS5 query, stopping at ...
+# ...the given limit, from the full-text index alone. Placeholders (?) are ...
+# ...used for the query and the limit.
+COUNT_FTS_MATCHES = """
+                    SELECT COUNT(*) FROM (
+                        SELECT rowid FROM books_fts WHERE books_fts MATCH ?
+                        LIMIT ?
+                    )
+                    """
+
+# SQL expression normalizing the ISBN of a record: surrounding whitespace, ...
+# ...hyphens and inner spaces are removed and a trailing 'x' check digit ...
+# ...is upper-cased, so that '0-439-78596-x' and '043978596X' are equal. ...
+# ...Searches must use this exact expression to be served by the index.
+ISBN_KEY = "UPPER(REPLACE(REPLACE(TRIM(ISBN), '-', ''), ' ', ''))"
+
+# SQL statement to read the schema version of the database.
+GET_SCHEMA_VERSION = """PRAGMA user_version"""
+
+# SQL statement to set the schema version of the database. PRAGMA ...
+# ...statements do not accept placeholders, hence the {version} field.
+SET_SCHEMA_VERSION = """PRAGMA user_version = {version}"""
+
+# SQL statement to create a B-tree index on the Rating column, serving ...
+# ...both exact and range rating searches.
+CREATE_RATING_INDEX = """
+                CREATE INDEX IF NOT EXISTS idx_books_rating
+                ON books (Rating)
+               """
+
+# SQL statement to create a B-tree index on the normalized ISBN, serving ...
+# ...both exact and prefix ISBN searches.
+CREATE_ISBN_INDEX = f"""
+                CREATE INDEX IF NOT EXISTS idx_books_isbn_key
+                ON books ({ISBN_KEY})
+               """
+
+# SQL statement to switch the database to write-ahead logging, so that ...
+# ...readers are not blocked while a transaction is being written.
+ENABLE_WAL = """PRAGMA journal_mode = WAL"""
+
+# SQL statement to switch a copy of the database back to a rollback ...
+# ...journal, so that it is a single file which may be opened as immutable.
+DISABLE_WAL = """PRAGMA journal_mode = DELETE"""
+
+# SQL statement to sync every commit to disk before it returns, so that ...
+# ...no acknowledged edit can be lost.
+SYNCHRONOUS_FULL = """PRAGMA synchronous = FULL"""
+
+# SQL statements to open a savepoint inside the current transaction, ...
+# ...to merge it into the transaction, and to undo the edits made since ...
+# ...it was opened, leaving the earlier edits of the transaction pending.
+SAVEPOINT = """SAVEPOINT {name}"""
+RELEASE_SAVEPOINT = """RELEASE {name}"""
+ROLLBACK_TO_SAVEPOINT = """ROLLBACK TO {name}"""
+
+# SQL statement to read the database file through a memory map of up to ...
+# ...the given number of bytes instead of read() calls, e.g. on the ...
+# ...read-only connections serving searches.
+SET_MMAP_SIZE = """PRAGMA mmap_size = {size}"""
+
+# SQL statement to create the vocabulary of the fuzzy search: every ...
+# ...distinct term of the titles and authors, its length and the number ...
+# ...of records containing it.
+CREATE_FUZZY_TERMS_TABLE = """
+                CREATE TABLE IF NOT EXISTS fuzzy_terms (
+                            Term        VARCHAR PRIMARY KEY,
+                            Length      INTEGER,
+                            Frequency   INTEGER
+                        )
+               """
+
+# SQL statement to create the character-trigram inverted index of the ...
+# ...fuzzy search vocabulary, mapping every trigram to the terms ...
+# ...containing it.
+CREATE_FUZZY_TRIGRAMS_TABLE = """
+                CREATE TABLE IF NOT EXISTS fuzzy_trigrams (
+                            Trigram     VARCHAR,
+                            Term        VARCHAR,
+                            PRIMARY KEY (Trigram, Term)
+                        ) WITHOUT ROWID
+               """
+
+# SQL statements to empty the fuzzy search index.
+CLEAR_FUZZY_INDEX = [
+    """DELETE FROM fuzzy_terms""",
+    """DELETE FROM fuzzy_trigrams""",
+]
+
+# SQL statement to add a new term to the fuzzy search vocabulary.
+INSERT_FUZZY_TERM = """
+                    INSERT INTO fuzzy_terms (Term, Length, Frequency)
+                    VALUES(?, ?, ?)
+                    """
+
+# SQL statement to add a (trigram, term) pair to the inverted index.
+INSERT_FUZZY_TRIGRAM = """
+                    INSERT OR IGNORE INTO fuzzy_trigrams (Trigram, Term)
+                    VALUES(?, ?)
+                    """
+
+# SQL statement to adjust the number of records containing a term. ...
+# ...Placeholders are used for the change and the term.
+UPDATE_FUZZY_FREQUENCY = """
+                    UPDATE fuzzy_terms
+                    SET Frequency = Frequency + ?
+                    WHERE Term = ?
+                    """
+
+# SQL statement to drop a term once no record contains it any more.
+DELETE_FUZZY_TERM = """
+                    DELETE FROM fuzzy_terms
+                    WHERE Term = ? AND Frequency <= 0
+                    """
+
+# SQL statement to drop a (trigram, term) pair from the inverted index.
+DELETE_FUZZY_TRIGRAM = """
+                    DELETE FROM fuzzy_trigrams
+                    WHERE Trigram = ? AND Term = ?
+                    """
+
+# SQL statement to find the terms sharing at least a given number of ...
+# ...trigrams with a search word, within a range of lengths. The ...
+# ...{placeholders} field is filled in with one placeholder per trigram.
+SELECT_FUZZY_CANDIDATES = """
+                    SELECT t.Term, t.Frequency
+                    FROM fuzzy_trigrams g
+                    JOIN fuzzy_terms t ON t.Term = g.Term
+                    WHERE g.Trigram IN ({placeholders})
+                      AND t.Length BETWEEN ? AND ?
+                    GROUP BY t.Term
+                    HAVING COUNT(*) >= ?
+                    """
+
+# SQL statement to select the title and author of a record by ID.
+SELECT_TITLE_AUTHOR = """SELECT Title, Author FROM books WHERE ID = ?"""
+
+# SQL statement to select the title and author of the records added ...
+# ...after a given ID.
+SELECT_TITLES_AUTHORS_AFTER = """
+                    SELECT Title, Author FROM books
+                    WHERE ID > ?
+                    """
+
+# SQL statement to find the highest ID of the 'books' table.
+MAX_ID = """SELECT MAX(ID) FROM books"""
+
+# SQL expression of the rating of a record as a number, 0 for malformed ...
+# ...ratings stored as text.
+NUMERIC_RATING = \
+    "(CASE WHEN typeof(Rating) IN ('integer', 'real') THEN Rating ELSE 0 END)"
+
+# SQL statement to select the records matching an FTS5 query, most ...
+# ...relevant first. Relevance is the BM25 score of the title and author ...
+# ...(negative, lower is better) scaled up with the rating. The {weights} ...
+# ...and {boost} fields are filled in with the column weights and the ...
+# ...rating boost, {where} with any further conditions. Placeholders are ...
+# ...used for the FTS5 query, the condition values, the limit and the ...
+# ...offset.
+RANKED_MATCHES = f"""
+                    SELECT books.* FROM books
+                    JOIN (SELECT rowid AS ID,
+                                 bm25(books_fts, {{weights}}) AS Score
+                          FROM books_fts
+                          WHERE books_fts MATCH ?) AS matches USING (ID)
+                    {{where}}
+                    ORDER BY matches.Score * (1 + {{boost}} * {NUMERIC_RATING}),
+                             ID
+                    LIMIT ? OFFSET ?
+                    """
+
+# SQL statement to select the records meeting the {where} conditions, ...
+# ...best rated first, when no title or author is searched for.
+RANKED_BY_RATING = f"""
+                    SELECT * FROM books
+                    {{where}}
+                    ORDER BY {NUMERIC_RATING} DESC, ID
+                    LIMIT ? OFFSET ?
+                    """
+
+# SQL statement to create the 'authors' table, holding every distinct ...
+# ...author once. NameKey is the case-folded name, unique so that an ...
+# ...author is found by name through an index.
+CREATE_AUTHORS_TABLE = """
+                CREATE TABLE IF NOT EXISTS authors (
+                            ID          INTEGER PRIMARY KEY,
+                            Name        VARCHAR,
+                            NameKey     VARCHAR UNIQUE
+                        )
+               """
+
+# SQL statement to create the 'book_authors' join table linking every ...
+# ...book to each of its authors, in the order they are credited.
+CREATE_BOOK_AUTHORS_TABLE = """
+                CREATE TABLE IF NOT EXISTS book_authors (
+                            BookID      INTEGER,
+                            AuthorID    INTEGER,
+                            Position    INTEGER,
+                            PRIMARY KEY (BookID, AuthorID)
+                        ) WITHOUT ROWID
+               """
+
+# SQL statement to create the index listing the books of an author.
+CREATE_BOOK_AUTHORS_INDEX = """
+                CREATE INDEX IF NOT EXISTS idx_book_authors_author
+                ON book_authors (AuthorID, BookID)
+               """
+
+# SQL statements to empty the 'authors' and 'book_authors' tables.
+CLEAR_AUTHORS = [
+    """DELETE FROM book_authors""",
+    """DELETE FROM authors""",
+]
+
+# SQL statement to select the ID of an author by case-folded name.
+SELECT_AUTHOR_ID = """SELECT ID FROM authors WHERE NameKey = ?"""
+
+# SQL statement to add an author. NULL is used for the ID column to ...
+# ...utilize SQLite's auto-increment functionality.
+INSERT_AUTHOR = """
+                    INSERT INTO authors (ID, Name, NameKey)
+                    VALUES(NULL, ?, ?)
+                    """
+
+# SQL statement to link a book to one of its authors.
+INSERT_BOOK_AUTHOR = """
+                    INSERT OR IGNORE INTO book_authors
+                    (BookID, AuthorID, Position)
+                    VALUES(?, ?, ?)
+                    """
+
+# SQL statement to select the IDs of the authors of a book.
+SELECT_BOOK_AUTHOR_IDS = """
+                    SELECT AuthorID FROM book_authors
+                    WHERE BookID = ?
+                    """
+
+# SQL statement to unlink a book from all of its authors.
+DELETE_BOOK_AUTHORS = """DELETE FROM book_authors WHERE BookID = ?"""
+
+# SQL statement to drop an author once no book is linked to it any more.
+DELETE_UNUSED_AUTHOR = """
+                    DELETE FROM authors
+                    WHERE ID = ?
+                      AND NOT EXISTS (SELECT 1 FROM book_authors
+                                      WHERE AuthorID = ?)
+                    """
+
+# SQL statement to select the ID and author of the records after a ...
+# ...given ID, to link them to their authors.
+SELECT_IDS_AUTHORS_AFTER = """
+                    SELECT ID, Author FROM books
+                    WHERE ID > ?
+                    """
+
+# SQL conditions restricting a search on the 'books' table to the books ...
+# ...by an author whose name matches an FTS5 query on 'authors_fts', or ...
+# ...a LIKE pattern when the full-text index cannot serve the search. ...
+# ...Each name is matched on its own, never across two authors.
+AUTHOR_MATCH_CONDITION = """ID IN (SELECT BookID FROM book_authors
+                 WHERE AuthorID IN (SELECT rowid FROM authors_fts
+                                    WHERE authors_fts MATCH ?))"""
+AUTHOR_LIKE_CONDITION = """ID IN (SELECT BookID FROM book_authors
+                 WHERE AuthorID IN (SELECT ID FROM authors
+                                    WHERE LOWER(Name) LIKE ?))"""
+
+# SQL condition restricting a search on the 'books' table to the books ...
+# ...by the author with the given case-folded name.
+BY_AUTHOR_CONDITION = """ID IN (SELECT BookID FROM book_authors
+                 WHERE AuthorID = (SELECT ID FROM authors
+                                   WHERE NameKey = ?))"""
+
+# SQL statement to select the authors whose name matches the {where} ...
+# ...condition, with their number of books, most prolific first.
+SELECT_MATCHING_AUTHORS = """
+                    SELECT a.ID, a.Name, COUNT(*) AS Books
+                    FROM authors a
+                    JOIN book_authors ba ON ba.AuthorID = a.ID
+                    WHERE {where}
+                    GROUP BY a.ID
+                    ORDER BY Books DESC, a.Name
+                    LIMIT ?
+                    """
+
+# SQL conditions selecting the authors whose name matches an FTS5 query ...
+# ...or a LIKE pattern, for SELECT_MATCHING_AUTHORS.
+AUTHOR_NAME_MATCH = \
+    "a.ID IN (SELECT rowid FROM authors_fts WHERE authors_fts MATCH ?)"
+AUTHOR_NAME_LIKE = "LOWER(a.Name) LIKE ?"
+
+# SQL statement to select every record of the 'books' table in ID order, ...
+# ...e.g. to load the columnar snapshot.
+VIEW_RECORDS_BY_ID = """SELECT * FROM books ORDER BY ID"""
+
+# SQL statement to select the record with the given ID, as stored.
+SELECT_RECORD = """SELECT * FROM books WHERE ID = ?"""
+
+# SQL statement to select the records after a given ID, in ID order.
+SELECT_RECORDS_AFTER = """SELECT * FROM books WHERE ID > ? ORDER BY ID"""
+
+# SQL statement returning a counter which changes whenever another ...
+# ...connection commits a change to the database.
+GET_DATA_VERSION = """PRAGMA data_version"""
+
+# SQL statement to insert a record with a given ID into the 'books' ...
+# ...table, e.g. an upsert of a batch file keyed by an unknown ID.
+INSERT_RECORD_WITH_ID = """
+                    INSERT INTO books
+                    VALUES(?, ?, ?, ?, ?)
+                """
+
+# SQL statement to select the records whose normalized ISBN equals the ...
+# ...given key, through the ISBN index.
+SELECT_RECORDS_BY_ISBN = f"""SELECT * FROM books WHERE {ISBN_KEY} = ?"""
+
+# SQL expression of the rating band of a record, for the {row} prefix ...
+# ...('new.', 'old.' or ''): the lower bound of its half-star band, e.g. ...
+# ...4.0 for ratings from 4.0 to 4.49 and 4.5 up to 5.0, or 'unrated' ...
+# ...when the rating is not a number.
+RATING_BAND = """CASE WHEN typeof({row}Rating) IN ('integer', 'real')
+                 THEN MIN(MAX(CAST({row}Rating * 2 AS INTEGER), 0), 9) / 2.0
+                 ELSE 'unrated' END"""
+
+# SQL expression of the initial of the title of a record, for the {row} ...
+# ...prefix: its first letter upper-cased, or '#' for anything but A to Z.
+TITLE_INITIAL = """CASE WHEN UPPER(SUBSTR(LTRIM({row}Title), 1, 1))
+                        BETWEEN 'A' AND 'Z'
+                   THEN UPPER(SUBSTR(LTRIM({row}Title), 1, 1))
+                   ELSE '#' END"""
+
+# SQL statement to create the 'facets' table holding the number of books ...
+# ...of every rating band, title initial and author (by author ID), kept ...
+# ...up to date by the facet triggers.
+CREATE_FACETS_TABLE = """
+                CREATE TABLE IF NOT EXISTS facets (
+                            Facet       VARCHAR,
+                            Value,
+                            Books       INTEGER,
+                            PRIMARY KEY (Facet, Value)
+                        ) WITHOUT ROWID
+               """
+
+# SQL statement to create an index of the facet values by number of ...
+# ...books, so that the most prolific authors are read without sorting.
+CREATE_FACETS_INDEX = """
+                CREATE INDEX IF NOT EXISTS idx_facets_books
+                ON facets (Facet, Books)
+               """
+
+
+# SQL statement of a facet trigger adding one book to a {facet} {value}.
+FACET_INCREMENT = """INSERT INTO facets (Facet, Value, Books)
+        VALUES ('{facet}', {value}, 1)
+        ON CONFLICT (Facet, Value) DO UPDATE SET Books = Books + 1;"""
+
+# SQL statements of a facet trigger removing one book from a {facet} ...
+# ...{value}, dropping the value once it has no book left.
+FACET_DECREMENT = """UPDATE facets SET Books = Books - 1
+        WHERE Facet = '{facet}' AND Value = {value};
+        DELETE FROM facets
+        WHERE Facet = '{facet}' AND Value = {value} AND Books <= 0;"""
+
+# SQL statements to create the triggers keeping the 'facets' table in ...
+# ...sync with the 'books' and 'book_authors' tables on every insert, ...
+# ...update and delete.
+CREATE_FACET_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS facets_books_insert AFTER INSERT ON books
+    BEGIN
+        {FACET_INCREMENT.format(
+            facet="rating", value=RATING_BAND.format(row="new."))}
+        {FACET_INCREMENT.format(
+            facet="initial", value=TITLE_INITIAL.format(row="new."))}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS facets_books_delete AFTER DELETE ON books
+    BEGIN
+        {FACET_DECREMENT.format(
+            facet="rating", value=RATING_BAND.format(row="old."))}
+        {FACET_DECREMENT.format(
+            facet="initial", value=TITLE_INITIAL.format(row="old."))}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS facets_books_update
+    AFTER UPDATE OF Title, Rating ON books
+    WHEN {RATING_BAND.format(row="old.")} IS NOT
+         {RATING_BAND.format(row="new.")}
+      OR {TITLE_INITIAL.format(row="old.")} IS NOT
+         {TITLE_INITIAL.format(row="new.")}
+    BEGIN
+        {FACET_INCREMENT.format(
+            facet="rating", value=RATING_BAND.format(row="new."))}
+        {FACET_DECREMENT.format(
+            facet="rating", value=RATING_BAND.format(row="old."))}
+        {FACET_INCREMENT.format(
+            facet="initial", value=TITLE_INITIAL.format(row="new."))}
+        {FACET_DECREMENT.format(
+            facet="initial", value=TITLE_INITIAL.format(row="old."))}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS facets_authors_insert
+    AFTER INSERT ON book_authors
+    BEGIN
+        {FACET_INCREMENT.format(
+            facet="author", value="new.AuthorID")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS facets_authors_delete
+    AFTER DELETE ON book_authors
+    BEGIN
+        {FACET_DECREMENT.format(
+            facet="author", value="old.AuthorID")}
+    END
+    """,
+]
+
+# SQL statements to drop the facet triggers, e.g. while a bulk load ...
+# ...replaces every record at once.
+DROP_FACET_TRIGGERS = [
+    """DROP TRIGGER IF EXISTS facets_books_insert""",
+    """DROP TRIGGER IF EXISTS facets_books_delete""",
+    """DROP TRIGGER IF EXISTS facets_books_update""",
+    """DROP TRIGGER IF EXISTS facets_authors_insert""",
+    """DROP TRIGGER IF EXISTS facets_authors_delete""",
+]
+
+# SQL statements to recount every facet value from the 'books' and ...
+# ...'book_authors' tables.
+REBUILD_FACETS = [
+    """DELETE FROM facets""",
+    f"""
+    INSERT INTO facets (Facet, Value, Books)
+    SELECT 'rating', {RATING_BAND.format(row="")} AS Band, COUNT(*)
+    FROM books GROUP BY Band
+    """,
+    f"""
+    INSERT INTO facets (Facet, Value, Books)
+    SELECT 'initial', {TITLE_INITIAL.format(row="")} AS Initial, COUNT(*)
+    FROM books GROUP BY Initial
+    """,
+    """
+    INSERT INTO facets (Facet, Value, Books)
+    SELECT 'author', AuthorID, COUNT(*)
+    FROM book_authors GROUP BY AuthorID
+    """,
+]
+
+# SQL statement to select the values of a facet with their number of ...
+# ...books, from the 'facets' table.
+SELECT_FACET = """SELECT Value, Books FROM facets WHERE Facet = ?"""
+
+# SQL statement to select the authors with the most books, from the ...
+# ...'facets' table, ties in alphabetical order.
+SELECT_TOP_AUTHORS = """
+                    SELECT a.Name, f.Books
+                    FROM facets f
+                    JOIN authors a ON a.ID = f.Value
+                    WHERE f.Facet = 'author'
+                    ORDER BY f.Books DESC, a.Name
+                    LIMIT ?
+                    """
+
+# SQL statement to count the books of every (rating band, title ...
+# ...initial) pair among the records meeting the {where} condition, so ...
+# ...that both facets are counted in a single pass over the matches.
+COUNT_BANDS_INITIALS = f"""
+                    SELECT {RATING_BAND.format(row="")} AS Band,
+                           {TITLE_INITIAL.format(row="")} AS Initial,
+                           COUNT(*)
+                    FROM books WHERE {{where}} GROUP BY Band, Initial
+                    """
+
+# SQL statement to select the authors with the most books among the ...
+# ...records meeting the {where} condition, through the 'book_authors' ...
+# ...primary key.
+COUNT_MATCHING_AUTHORS = """
+                    SELECT a.Name, COUNT(*) AS Books
+                    FROM book_authors ba
+                    JOIN authors a ON a.ID = ba.AuthorID
+                    WHERE ba.BookID IN (SELECT ID FROM books WHERE {where})
+                    GROUP BY ba.AuthorID
+                    ORDER BY Books DESC, a.Name
+                    LIMIT ?
+                    """
@@ -0,0 +1,134 @@
+"""Checks of the batch files of upserts and deletes: records keyed by ID or
+ISBN, values cleaned like the CSV load, operations applied in file order,
+invalid rows reported by line and chunks committed one at a time.
+"""
+import json
+import sqlite3
+import pytest
+import batch
+from book_store import BookStore
+
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Fixture returning a store holding two records sharing an ISBN and a
+    third one.
+    """
+    store = BookStore(str(tmp_path / "books.db"))
+    store.add("Dune", "Frank Herbert", 4.3, "0441172717")
+    store.add("Dune (reissue)", "Frank Herbert", 4.2, "0441172717")
+    store.add("Emma", "Jane Austen", 4.0, "0141439580")
+    store.commit()
+    yield store
+    store.close()
+
+
+def write_jsonl(tmp_path, rows):
+    """Function to write rows, dictionaries or raw lines, to a JSON-lines
+    batch file. Returns its path.
+    """
+    path = tmp_path / "batch.jsonl"
+    path.write_text("".join((row if isinstance(row, str) else json.dumps(row))
+                            + "\n" for row in rows), encoding="utf-8")
+    return str(path)
+
+
+def records(store):
+    """Function to return every record of the store, in ID order."""
+    return store.conn.execute("SELECT * FROM books ORDER BY ID").fetchall()
+
+
+def test_upsert_by_id_updates_given_fields_only(store, tmp_path):
+    report = batch.apply_file(store, write_jsonl(tmp_path, [
+        {"id": 3, "rating": "4.5"},
+        {"id": 10, "title": "Ulysses", "author": "James Joyce"},
+    ]))
+    assert (report["inserted"], report["updated"]) == (1, 1)
+    assert records(store)[2:] == [
+        (3, "Emma", "Jane Austen", 4.5, "0141439580"),
+        (10, "Ulysses", "James Joyce", None, None),
+    ]
+
+
+def test_upsert_by_isbn_updates_every_record_with_it(store, tmp_path):
+    report = batch.apply_file(store, write_jsonl(tmp_path, [
+        {"isbn": "0-441-17271-7", "rating": "5"},
+        {"isbn": "978-0-14-143951-8", "title": "Persuasion"},
+    ]))
+    assert (report["inserted"], report["updated"]) == (1, 2)
+    assert [record[3] for record in records(store)[:2]] == [5.0, 5.0]
+    assert records(store)[3] == (4, "Persuasion", None, None,
+                                 "9780141439518")
+
+
+def test_isbn_and_rating_are_cleaned_like_the_csv_load(store, tmp_path):
+    batch.apply_file(store, write_jsonl(tmp_path, [
+        {"title": "Ulysses", "isbn": " 999-111 ", "rating": "3"},
+        {"isbn": "999 111", "author": "James Joyce"},
+    ]))
+    assert records(store)[3] == (4, "Ulysses", "James Joyce", 3.0, "999111")
+
+
+def test_delete_by_id_and_isbn(store, tmp_path):
+    report = batch.apply_file(store, write_jsonl(tmp_path, [
+        {"op": "delete", "isbn": "0441172717"},
+        {"op": "delete", "id": 3},
+        {"op": "delete", "id": 3},
+    ]))
+    assert report["deleted"] == 3
+    assert report["errors"] == [{"line": 3, "error": "no such record"}]
+    assert records(store) == []
+
+
+def test_invalid_rows_are_reported_by_line(store, tmp_path):
+    report = batch.apply_file(store, write_jsonl(tmp_path, [
+        {"op": "rename", "id": 1},
+        {"title": "No key"},
+        {"id": "one", "title": "Dune"},
+        {"id": 1, "rating": "9"},
+        "{not json",
+        {"id": 20, "author": "Nobody"},
+        {"id": 1, "title": "Dune Messiah"},
+    ]))
+    assert [error["line"] for error in report["errors"]] == [1, 2, 3, 4, 5,
+                                                             6]
+    assert report["errors"][5]["error"] == \
+        "a title is required to add a record"
+    # The valid row is applied all the same
+    assert (report["rows"], report["updated"]) == (7, 1)
+    assert records(store)[0][1] == "Dune Messiah"
+
+
+def test_operations_apply_in_file_order(store, tmp_path):
+    report = batch.apply_file(store, write_jsonl(tmp_path, [
+        {"isbn": "123", "title": "Draft"},
+        {"isbn": "123", "title": "Final"},
+        {"op": "delete", "id": 3},
+        {"id": 3, "title": "Emma", "author": "Jane Austen"},
+        {"id": 4, "rating": "2"},
+    ]))
+    assert (report["inserted"], report["updated"], report["deleted"]) \
+        == (2, 2, 1)
+    assert records(store)[2:] == [
+        (3, "Emma", "Jane Austen", None, None),
+        (4, "Final", None, 2.0, "123"),
+    ]
+
+
+def test_each_chunk_is_committed(store, tmp_path):
+    path = write_jsonl(tmp_path, [{"id": record_id, "rating": "1"}
+                                  for record_id in (1, 2, 3)])
+    committed = []
+
+    def progress(report, fraction):
+        # Read the committed ratings from another connection
+        conn = sqlite3.connect(store.database)
+        try:
+            committed.append([rating for rating, in conn.execute(
+                "SELECT Rating FROM books ORDER BY ID")])
+        finally:
+            conn.close()
+
+    batch.apply_file(store, path, chunk_size=2, progress=progress)
+    assert committed == [[1.0, 1.0, 4.0], [1.0, 1.0, 1.0]]
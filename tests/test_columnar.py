@@ -0,0 +1,100 @@
+"""Checks of the columnar snapshot: its substring searches fold titles and
+author names the way the SQL search of each substring mode does, so that
+the records it finds, and the statistics computed over them, are those of
+the SQL search.
+"""
+import pytest
+import search
+from book_store import BookStore
+
+
+
+# Records of the checks, accented, upper-cased and holding wildcards alike
+RECORDS = [
+    ("Café Müller", "Zoé Dupont", "4.1", "111"),
+    ("CAFÉ MÜLLER", "ZOÉ DUPONT", "3.9", "112"),
+    ("Cafe Muller", "Zoe Dupont", "4.5", "113"),
+    ("Straße", "Émile Zola", "2.0", "114"),
+    ("STRASSE", "EMILE ZOLA", "3.0", "115"),
+    ("Café_Crème", "émile zola-Zoé Dupont", "4.0", "116"),
+    ("100% Cotton", "Ann O'Neil", "3.5", "117"),
+]
+
+# Searches, as entry field values
+SEARCHES = [
+    ("café", "", "", ""),
+    ("CAFÉ", "", "", ""),
+    ("cafe", "", "", ""),
+    ("é", "", "", ""),
+    ("ca", "", "", ""),
+    ("müll", "", "", ""),
+    ("straße", "", "", ""),
+    ("strasse", "", "", ""),
+    ("c_f", "", "", ""),
+    ("é_", "", "", ""),
+    ("f%m", "", "", ""),
+    ("0%", "", "", ""),
+    ("100%", "", "", ""),
+    ("", "zoé", "", ""),
+    ("", "ZOÉ", "", ""),
+    ("", "zo", "", ""),
+    ("", "ÉMILE", "", ""),
+    ("", "émile", "", ""),
+    ("", "é", "", ""),
+    ("", "a%z", "", ""),
+    ("", "o'n", "", ""),
+    ("caf", "dupont", ">=4", ""),
+    ("", "", "", "11"),
+]
+
+
+
+@pytest.fixture(scope="module", params=search.SUBSTRING_MODES)
+def store(request, tmp_path_factory):
+    """Fixture returning a store of the records in each substring search
+    mode, with its snapshot loaded.
+    """
+    store = BookStore(str(tmp_path_factory.mktemp("db") / "books.db"),
+                      request.param)
+    for record in RECORDS:
+        store.add(*record)
+    store.commit()
+    store.current_snapshot()
+    yield store
+    store.close()
+
+
+def sql_search(store, fields):
+    """Function to return every record the SQL search for the entry field
+    values finds, in ID order.
+    """
+    conditions, values = store.build_search(*fields)
+    return store.fetch_complete(conditions, values, 100)
+
+
+@pytest.mark.parametrize("fields", SEARCHES)
+def test_snapshot_search_matches_sql_search(store, fields):
+    assert store.snapshot_search(*fields) == sql_search(store, fields)
+
+
+@pytest.mark.parametrize("fields", SEARCHES)
+def test_snapshot_stats_count_the_sql_search(store, fields):
+    summary, _, _ = store.snapshot_stats(*fields)
+    assert summary["count"] == len(sql_search(store, fields))
+
+
+def test_snapshot_search_matches_sql_search_after_edits(tmp_path):
+    store = BookStore(str(tmp_path / "books.db"))
+    try:
+        for record in RECORDS:
+            store.add(*record)
+        snapshot = store.current_snapshot()
+        store.add("Zoé's Café", "ZOÉ DUPONT-Hélène Roy", "", "118")
+        store.update(3, "Café Muller", "Zoé Dupont", "4.5", "113")
+        store.delete(1)
+        # The edits are applied to the snapshot in place
+        assert store.current_snapshot() is snapshot
+        for fields in SEARCHES + [("", "hél", "", ""), ("zoé's", "", "", "")]:
+            assert store.snapshot_search(*fields) == sql_search(store, fields)
+    finally:
+        store.close()
@@ -0,0 +1,85 @@
+"""Checks of the facet counts: the 'facets' table maintained by triggers
+row by row matches a full recount after every kind of edit, and the
+counts served from the query cache cannot be modified by the caller.
+"""
+import pytest
+import batch
+import facets
+from book_store import BookStore
+
+
+
+# Records of the store, by one or several authors, rated or not
+RECORDS = [
+    ("Dune", "Frank Herbert", "4.3", "0441172717"),
+    ("Dune Messiah", "Frank Herbert", "3.9", "0593098234"),
+    ("Good Omens", "Terry Pratchett-Neil Gaiman", "4.25", "0060853980"),
+    ("emma", "Jane Austen", "", "0141439580"),
+    ("1984", "George Orwell", "5", "0451524934"),
+]
+
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Fixture returning a store holding the records."""
+    store = BookStore(str(tmp_path / "books.db"))
+    for record in RECORDS:
+        store.add(*record)
+    store.commit()
+    yield store
+    store.close()
+
+
+def facet_rows(store):
+    """Function to return the non-zero counts of the 'facets' table."""
+    return store.conn.execute(
+        "SELECT Facet, Value, Books FROM facets WHERE Books > 0 "
+        "ORDER BY Facet, Value").fetchall()
+
+
+def assert_matches_recount(store):
+    """Function to check that the 'facets' table matches a full recount of
+    the records, which is then rolled back, and that the counts it serves
+    match the counts aggregated over the records themselves.
+    """
+    maintained = facet_rows(store)
+    with pytest.raises(InterruptedError):
+        with store.savepoint("recount"):
+            facets.rebuild(store.cur)
+            assert facet_rows(store) == maintained
+            raise InterruptedError
+    # A condition true of every record aggregates over the records
+    assert facets.count(store.conn) == facets.count(store.conn, ("1",))
+
+
+def test_facets_match_recount_after_edits(store):
+    assert_matches_recount(store)
+    store.add("Emma", "Jane Austen-Fay Weldon", "3.5", "0141439581")
+    assert_matches_recount(store)
+    # Rating band, initial and authors of a record all change
+    store.update(1, "Children of Dune", "Brian Herbert", "2", "0441172717")
+    assert_matches_recount(store)
+    store.update(3, "Good Omens", "Neil Gaiman", None, "0060853980")
+    assert_matches_recount(store)
+    store.delete(2)
+    store.delete(5)
+    assert_matches_recount(store)
+    store.import_records([("Neverwhere", "Neil Gaiman", "4.17", "")] * 3)
+    assert_matches_recount(store)
+    store.apply_operations([
+        (1, batch.parse_operation({"id": 4, "rating": "4.5"})),
+        (2, batch.parse_operation({"op": "delete", "isbn": "0060853980"})),
+    ])
+    assert_matches_recount(store)
+    store.commit()
+    assert_matches_recount(store)
+
+
+def test_facet_counts_are_a_copy_of_the_cached_counts(store):
+    counts = store.facet_counts()
+    counts["total"] = 0
+    counts[facets.AUTHOR].clear()
+    counts[facets.RATING][0]["books"] = 0
+    assert store.facet_counts() == facets.count(store.conn)
+    assert store.facet_counts()["total"] == len(RECORDS)
@@ -0,0 +1,132 @@
+"""Checks of the fuzzy search: the edit distance between a word and a term,
+transpositions included, the expansion of a search word into the close
+terms of the vocabulary, and the vocabulary maintained by every edit,
+which must match the one rebuilt from scratch.
+"""
+import sqlite3
+import pytest
+import batch
+import fuzzy
+import search
+from book_store import BookStore
+
+
+
+# Records of the store, some of whose terms are a typo away from others
+RECORDS = [
+    ("The Hobbit", "J.R.R. Tolkien", "4.3", "0618260307"),
+    ("The Silmarillion", "J.R.R. Tolkien", "3.9", "0618391118"),
+    ("Unfinished Tales", "Christopher Tolkien", "4.0", "0618154051"),
+    ("Dune", "Frank Herbert", "4.3", "0441172717"),
+    ("June", "Jane Doe", "3.0", "0000000001"),
+    ("Dane Law", "John Roe", "3.5", "0000000002"),
+]
+
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Fixture returning a store of the records in the fuzzy search mode,
+    whose vocabulary is maintained by every edit.
+    """
+    store = BookStore(str(tmp_path / "books.db"), search.FUZZY_MODE)
+    for record in RECORDS:
+        store.add(*record)
+    store.commit()
+    yield store
+    store.close()
+
+
+def vocabulary(conn):
+    """Function to return the terms of the vocabulary with their length and
+    frequency, and the (trigram, term) pairs of its inverted index.
+    """
+    return (conn.execute("SELECT Term, Length, Frequency FROM fuzzy_terms "
+                         "ORDER BY Term").fetchall(),
+            conn.execute("SELECT Trigram, Term FROM fuzzy_trigrams "
+                         "ORDER BY Trigram, Term").fetchall())
+
+
+def assert_matches_rebuild(store):
+    """Function to commit the edits of the store and check that its
+    vocabulary matches the one rebuilt from scratch on a copy of the
+    database.
+    """
+    store.commit()
+    copy = sqlite3.connect(":memory:")
+    try:
+        store.conn.backup(copy)
+        fuzzy.rebuild_index(copy)
+        assert vocabulary(store.conn) == vocabulary(copy)
+    finally:
+        copy.close()
+
+
+@pytest.mark.parametrize("a, b, limit, distance", [
+    ("tolkien", "tolkien", 2, 0),
+    ("tolkein", "tolkien", 2, 1),
+    ("ab", "ba", 1, 1),
+    ("hebrert", "herbert", 2, 1),
+    ("teh", "the", 1, 1),
+    ("dune", "june", 1, 1),
+    ("dune", "dun", 1, 1),
+    ("dune", "dunes", 1, 1),
+    ("kitten", "sitting", 3, 3),
+    ("", "abc", 3, 3),
+    # Optimal string alignment: a transposed pair is not edited again
+    ("ca", "abc", 3, 3),
+])
+def test_edit_distance(a, b, limit, distance):
+    assert fuzzy.edit_distance(a, b, limit) == distance
+    assert fuzzy.edit_distance(b, a, limit) == distance
+
+
+@pytest.mark.parametrize("a, b, limit", [
+    ("kitten", "sitting", 2),
+    ("tolkien", "tolkien christopher", 2),
+    ("abcdef", "badcfe", 2),
+])
+def test_edit_distance_stops_past_the_limit(a, b, limit):
+    assert fuzzy.edit_distance(a, b, limit) == limit + 1
+
+
+def test_expand_word_finds_transpositions_and_typos(store):
+    assert fuzzy.expand_word(store.cur, "tolkein") == [(1, "tolkien")]
+    assert fuzzy.expand_word(store.cur, "silmarilion") \
+        == [(1, "silmarillion")]
+    assert fuzzy.expand_word(store.cur, "hebrert") == [(1, "herbert")]
+
+
+def test_expand_word_ranks_closest_then_most_frequent(store):
+    store.add("June Bride", "Jane Roe", "", "")
+    # 'june' is in two records, 'dane' in one; 'jane' and 'john' are ...
+    # ...two edits away, more than a word this short tolerates
+    assert fuzzy.expand_word(store.cur, "dune") \
+        == [(0, "dune"), (1, "june"), (1, "dane")]
+
+
+def test_expand_word_tolerates_no_typo_in_very_short_words(store):
+    store.add("It", "Stephen King", "", "")
+    assert fuzzy.expand_word(store.cur, "it") == [(0, "it")]
+    assert fuzzy.expand_word(store.cur, "ti") == []
+
+
+def test_vocabulary_matches_rebuild_after_edits(store):
+    assert_matches_rebuild(store)
+    store.add("The Children of Hurin", "J.R.R. Tolkien", "4.0", "")
+    assert_matches_rebuild(store)
+    # A term no other record holds is dropped, a new one is added
+    store.update(6, "Dane Geld", "John Roe", "3.5", "0000000002")
+    store.update(5, "June", "Jane Doe", "3.0", "0000000001")
+    assert_matches_rebuild(store)
+    store.delete(2)
+    store.delete(4)
+    assert_matches_rebuild(store)
+    store.import_records([("Dune Messiah", "Frank Herbert", "3.9", "")] * 2)
+    assert_matches_rebuild(store)
+    store.apply_operations([
+        (1, batch.parse_operation({"id": 1, "title": "The Hobbit Annotated"})),
+        (2, batch.parse_operation({"op": "delete", "id": 3})),
+        (3, batch.parse_operation({"isbn": "123", "title": "Dune"})),
+    ])
+    assert_matches_rebuild(store)
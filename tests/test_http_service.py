@@ -0,0 +1,96 @@
+"""Checks of the validation of the requests to the HTTP service, sent over
+a real connection to a service on a temporary database: fields of the
+wrong type and malformed paging parameters are answered with 400 and a
+clean message, and a PUT keeps the fields its body omits.
+"""
+import asyncio
+import json
+import pytest
+from http_service import BookService
+
+
+
+@pytest.fixture
+def database(tmp_path):
+    """Fixture returning the path of a temporary book database."""
+    return str(tmp_path / "books.db")
+
+
+async def request(port, method, target, payload=None):
+    """Function to send one request to the service on the port. Returns
+    the status and the decoded JSON body of the response.
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode("utf-8") if payload is not None \
+        else b""
+    writer.write(f"{method} {target} HTTP/1.1\r\nConnection: close\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1")
+                 + body)
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(body)
+
+
+def serve(database, requests):
+    """Function to start a service on the database, add a record to it and
+    send it the (method, target, payload) requests in turn. Returns the
+    status and JSON body of each response.
+    """
+    async def run():
+        service = BookService(database, pool_size=1)
+        server = await service.start("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            await request(port, "POST", "/books", {
+                "title": "Dune", "author": "Frank Herbert",
+                "rating": 4.3, "isbn": "0441172717"})
+            return [await request(port, *request_args)
+                    for request_args in requests]
+        finally:
+            await service.close()
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("payload, message", [
+    ({"title": "Dune", "rating": {}}, "rating must be a number or a string "
+                                      "or null"),
+    ({"title": ["Dune"]}, "title must be a string or null"),
+    ({"title": "Dune", "isbn": 441172717}, "isbn must be a string or null"),
+    ({"title": "Dune", "rating": True}, "rating must be a number or a "
+                                        "string or null"),
+])
+def test_fields_of_the_wrong_type_are_rejected(database, payload, message):
+    responses = serve(database, [("POST", "/books", payload),
+                                 ("PUT", "/books/1", payload),
+                                 ("GET", "/books", None)])
+    assert responses[:2] == [(400, {"error": message})] * 2
+    # Nothing was written
+    assert [record["title"] for record in responses[2][1]["records"]] \
+        == ["Dune"]
+
+
+@pytest.mark.parametrize("query, message", [
+    ("after=abc", "after must be an integer, not 'abc'"),
+    ("ranked=1&offset=1.5", "offset must be an integer, not '1.5'"),
+    ("ranked=1&offset=-1", "offset must be at least 0"),
+    ("limit=0", "limit must be at least 1"),
+])
+def test_malformed_paging_parameters_are_rejected(database, query, message):
+    assert serve(database, [("GET", "/books?" + query, None)]) \
+        == [(400, {"error": message})]
+
+
+def test_partial_put_keeps_the_omitted_fields(database):
+    responses = serve(database, [
+        ("PUT", "/books/1", {"rating": "4.5"}),
+        ("PUT", "/books/1", {"isbn": None}),
+        ("PUT", "/books/2", {"rating": 3}),
+        ("GET", "/books", None),
+    ])
+    assert responses[:3] == [(200, {"id": 1}), (200, {"id": 1}),
+                             (404, {"error": "no book with ID 2"})]
+    assert responses[3][1]["records"] == [
+        {"id": 1, "title": "Dune", "author": "Frank Herbert", "rating": 4.5,
+         "isbn": None}]
@@ -0,0 +1,240 @@
+"""Checks of the live search: refinements filtered in memory return what
+the SQL search does, and the debounced search run as the entry fields of
+the GUI are edited, driven through stand-ins for the Tk widgets so that
+no display is needed.
+"""
+import sqlite3
+import time
+import types
+import pytest
+import main
+import search
+import live_search
+from book_store import BookStore
+from query_worker import QueryWorker
+from result_view import PagedResultView
+
+
+
+# Seconds to wait for the query worker before failing
+TIMEOUT = 5.0
+
+# Records of the refinement checks, accented and upper-cased alike
+RECORDS = [
+    ("Café Müller", "Zoé Dupont", "4.1", "111"),
+    ("CAFÉ MÜLLER", "ZOÉ DUPONT", "3.9", "112"),
+    ("Cafe Muller", "Zoe Dupont", "4.5", "113"),
+    ("Straße", "Émile Zola", "2.0", "114"),
+    ("STRASSE", "EMILE ZOLA", "3.0", "115"),
+    ("Café_Crème", "émile zola", "4.0", "116"),
+]
+
+# Searches followed by a search narrowing them down, as entry field values
+REFINEMENTS = [
+    (("caf", "", "", ""), ("café", "", "", "")),
+    (("CAF", "", "", ""), ("CAFÉ M", "", "", "")),
+    (("é", "", "", ""), ("ém", "", "", "")),
+    (("ü", "", "", ""), ("mül", "", "", "")),
+    (("st", "", "", ""), ("stra", "", "", "")),
+    (("c_f", "", "", ""), ("c_fé", "", "", "")),
+    (("", "zo", "", ""), ("", "zoé", "", "")),
+    (("", "ÉMI", "", ""), ("", "ÉMILE", "", "")),
+    (("", "emile", "", ""), ("", "emile z", "", "")),
+]
+
+
+
+class FakeWindow:
+    """A stand-in for the Tk window, whose after() callbacks run when
+    run_pending() is called.
+    """
+
+    def __init__(self):
+        self.pending = {}
+        self.next_id = 0
+
+    def after(self, delay, callback):
+        self.next_id += 1
+        self.pending[self.next_id] = callback
+        return self.next_id
+
+    def after_cancel(self, after_id):
+        self.pending.pop(after_id, None)
+
+    def run_pending(self):
+        pending, self.pending = self.pending, {}
+        for callback in pending.values():
+            callback()
+
+
+class FakeListBox:
+    """A stand-in for the Tk list box, holding its rows in a list."""
+
+    def __init__(self):
+        self.rows = []
+        self.selection = ()
+
+    def configure(self, **options):
+        pass
+
+    config = configure
+
+    def insert(self, index, *items):
+        index = len(self.rows) if index == main.END else index
+        self.rows[index:index] = items
+
+    def delete(self, first, last=None):
+        last = len(self.rows) - 1 if last == main.END \
+            else first if last is None else last
+        del self.rows[first:last + 1]
+        self.selection = ()
+
+    def size(self):
+        return len(self.rows)
+
+    def nearest(self, y):
+        return 0
+
+    def yview(self, *args):
+        pass
+
+    def curselection(self):
+        return self.selection
+
+
+class FakeEntry:
+    """A stand-in for an entry field and its StringVar, calling on_change
+    whenever its text changes, like a traced StringVar.
+    """
+
+    def __init__(self, on_change=None):
+        self.text = ""
+        self.on_change = on_change
+
+    def get(self):
+        return self.text
+
+    def insert(self, index, value):
+        self.set(self.text + str(value))
+
+    def delete(self, first, last=None):
+        self.set("")
+
+    def set(self, text):
+        self.text = text
+        if self.on_change is not None:
+            self.on_change()
+
+
+class FakeScrollbar:
+    """A stand-in for the scrollbar of the list box."""
+
+    def set(self, first, last):
+        pass
+
+
+
+def settle(worker):
+    """Function to wait until the query worker has run every task queued
+    and committed the pending writes, delivering their results.
+    """
+    done = []
+    worker.flush(done.append)
+    deadline = time.monotonic() + TIMEOUT
+    while not done:
+        assert time.monotonic() < deadline, "the query worker timed out"
+        time.sleep(0.005)
+        worker.deliver()
+
+
+@pytest.fixture(scope="module", params=[search.TRIGRAM_MODE,
+                                        search.TOKEN_MODE, search.LIKE_MODE])
+def store(request, tmp_path_factory):
+    """Fixture returning a store of the refinement records in each search
+    mode with a substring or token semantics.
+    """
+    store = BookStore(str(tmp_path_factory.mktemp("db") / "books.db"),
+                      request.param)
+    for record in RECORDS:
+        store.add(*record)
+    store.commit()
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """Fixture returning a BookSearchEngine on a database of three records,
+    wired to stand-ins for its widgets.
+    """
+    database = str(tmp_path / "books.db")
+    monkeypatch.setattr(main, "DATABASE_PATH", database)
+    engine = main.BookSearchEngine()
+    for record in (("Dune", "Frank Herbert", "4.3", "0441172717"),
+                   ("Emma", "Jane Austen", "4.0", "0141439580"),
+                   ("Ulysses", "James Joyce", "3.7", "0679722769")):
+        engine.store.add(*record)
+    engine.store.commit()
+    engine.window = FakeWindow()
+    engine.worker = QueryWorker(
+        lambda: main.BookStore(database, engine.search_mode,
+                               engine.store.cache))
+    engine.list_box = FakeListBox()
+    engine.result_view = PagedResultView(engine.list_box, FakeScrollbar(),
+                                         engine.worker)
+    engine.rank_results = types.SimpleNamespace(get=lambda: False)
+    # Each entry field stands for both the widget and its StringVar
+    for name, entry_name in (("title", "title_entry"),
+                             ("author", "author_entry"),
+                             ("rating", "rating_entry"),
+                             ("isbn", "ISBN_entry")):
+        entry = FakeEntry(engine.schedule_live_search)
+        setattr(engine, name, entry)
+        setattr(engine, entry_name, entry)
+    yield engine
+    engine.worker.close()
+    engine.store.close()
+
+
+def sql_search(store, fields):
+    """Function to return every record the SQL search for the entry field
+    values finds, in ID order.
+    """
+    conditions, values = search.build_search_conditions(
+        *fields, search_mode=store.search_mode)
+    return store.fetch_complete(conditions, values, len(RECORDS))
+
+
+@pytest.mark.parametrize("previous, current", REFINEMENTS)
+def test_refinement_matches_sql_search(store, previous, current):
+    searcher = live_search.LiveSearch(store.search_mode)
+    searcher.remember(previous, sql_search(store, previous))
+    records = searcher.refine(current)
+    # A refinement the SQL search folds differently is queried again
+    if records is not None:
+        assert records == sql_search(store, current)
+
+
+def test_selected_record_is_updated_after_live_search(engine):
+    engine.view_all_records()
+    settle(engine.worker)
+    # Select the second record, which fills in the entry fields
+    engine.list_box.selection = (1,)
+    engine.get_selected_row(None)
+    assert engine.title.get() == "Emma"
+
+    # Edit its title, then let the debounced live search run
+    engine.title.set("Emma, revised")
+    assert engine.window.pending
+    engine.window.run_pending()
+    settle(engine.worker)
+
+    engine.update_record()
+    settle(engine.worker)
+    conn = sqlite3.connect(main.DATABASE_PATH)
+    try:
+        assert conn.execute("SELECT Title FROM books WHERE Author = ?",
+                            ("Jane Austen",)).fetchall() \
+            == [("Emma, revised",)]
+    finally:
+        conn.close()
@@ -0,0 +1,148 @@
+"""Checks of the query cache of the book store: a cached search is served
+again until the books are edited, and is never served stale after an add,
+update, delete, import, batch, reset or rollback, or after a commit made
+by another connection sharing the cache.
+"""
+import pytest
+import batch
+import search
+from book_store import BookStore
+from query_cache import QueryCache
+
+
+
+# Records of the store, all found by the search for their author
+RECORDS = [
+    ("Dune", "Frank Herbert", "4.3", "0441172717"),
+    ("Dune Messiah", "Frank Herbert", "3.9", "0593098234"),
+    ("Children of Dune", "Frank Herbert", "3.9", "0593098242"),
+]
+
+# Entry field values of the search cached by the checks
+FIELDS = ("", "Herbert", "", "")
+
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Fixture returning a store holding the records by Frank Herbert."""
+    store = BookStore(str(tmp_path / "books.db"))
+    for record in RECORDS:
+        store.add(*record)
+    store.commit()
+    yield store
+    store.close()
+
+
+def cached_search(store, fields=FIELDS):
+    """Function to run the search for the entry field values through the
+    query cache, both as a complete result and as a first page, and check
+    that it matches the same search read directly from the database.
+    Returns the titles found.
+    """
+    conditions, values = search.build_search_conditions(
+        *fields, search_mode=store.search_mode)
+    expected = store.conn.execute(
+        search.build_search_query(conditions) + " ORDER BY ID",
+        values).fetchall()
+    assert store.fetch_complete(conditions, values, 100) == expected
+    assert store.fetch_page(conditions, values) == expected
+    return [record[1] for record in expected]
+
+
+def prime(store):
+    """Function to cache the search and check that it is then served from
+    the cache.
+    """
+    cached_search(store)
+    hits = store.cache.stats()["hits"]
+    cached_search(store)
+    assert store.cache.stats()["hits"] == hits + 2
+
+
+def test_add_is_not_served_stale(store):
+    prime(store)
+    store.add("God Emperor of Dune", "Frank Herbert", "3.8", "0441294677")
+    assert "God Emperor of Dune" in cached_search(store)
+
+
+def test_update_is_not_served_stale(store):
+    prime(store)
+    store.update(2, "Dune Messiah", "Brian Herbert", "3.9", "0593098234")
+    store.update(3, "Children of Dune", "Kevin J. Anderson", "3.9",
+                 "0593098242")
+    assert cached_search(store) == ["Dune", "Dune Messiah"]
+
+
+def test_delete_is_not_served_stale(store):
+    prime(store)
+    store.delete(1)
+    assert cached_search(store) == ["Dune Messiah", "Children of Dune"]
+
+
+def test_import_is_not_served_stale(store):
+    prime(store)
+    store.import_records([("Heretics of Dune", "Frank Herbert", "3.9",
+                           "0441328008")])
+    assert cached_search(store)[-1] == "Heretics of Dune"
+
+
+def test_batch_is_not_served_stale(store):
+    prime(store)
+    store.apply_operations(
+        [(1, batch.parse_operation({"op": "delete", "id": 2}))])
+    assert cached_search(store) == ["Dune", "Children of Dune"]
+
+
+def test_reset_is_not_served_stale(store, tmp_path):
+    csv_path = tmp_path / "books.csv"
+    csv_path.write_text("title,author,rating,isbn,\n"
+                        "The Dragon in the Sea,Frank Herbert,3.6,1234,\n",
+                        encoding="utf-8")
+    prime(store)
+    assert store.reset(force=True, csv_path=str(csv_path))
+    assert cached_search(store) == ["The Dragon in the Sea"]
+
+
+def test_rollback_leaves_no_stale_entries(store):
+    # Results read while the edits were pending must not outlive them
+    store.add("Whipping Star", "Frank Herbert", "3.7", "0441894984")
+    store.delete(1)
+    prime(store)
+    store.rollback()
+    assert cached_search(store) == ["Dune", "Dune Messiah",
+                                    "Children of Dune"]
+
+
+def test_failed_savepoint_leaves_no_stale_entries(store):
+    with pytest.raises(RuntimeError):
+        with store.savepoint():
+            store.delete(1)
+            prime(store)
+            raise RuntimeError("edit failed")
+    assert cached_search(store) == ["Dune", "Dune Messiah",
+                                    "Children of Dune"]
+
+
+def test_commit_of_another_connection_is_not_served_stale(store):
+    # The GUI and the query worker share a cache over two connections
+    other = BookStore(store.database, store.search_mode, store.cache)
+    try:
+        prime(store)
+        other.delete(3)
+        other.commit()
+        assert cached_search(store) == ["Dune", "Dune Messiah"]
+    finally:
+        other.close()
+
+
+def test_result_computed_during_an_edit_is_not_cached():
+    cache = QueryCache()
+
+    def compute():
+        # The table is edited while the result is being read
+        cache.invalidate("books")
+        return [(1, "Dune")]
+
+    assert cache.cached("key", compute) == [(1, "Dune")]
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,55 @@
+"""Checks that every indexed search is served by index seeks, never by a
+full scan of the 'books' table, using EXPLAIN QUERY PLAN.
+"""
+import sqlite3
+import pytest
+import sql_queries
+import migrations
+import search
+import authors
+from benchmarks.check_query_plans import INDEXED_SEARCHES, INDEXED_AUTHORS
+
+
+
+@pytest.fixture(scope="module", params=[search.TOKEN_MODE,
+                                        search.TRIGRAM_MODE])
+def database(request):
+    """Fixture returning an empty database with the current schema and the
+    full-text index of each search mode, with the mode actually used.
+    """
+    conn = sqlite3.connect(":memory:")
+    conn.execute(sql_queries.CREATE_TABLE)
+    conn.execute(sql_queries.CREATE_METADATA_TABLE)
+    migrations.migrate(conn)
+    search_mode = search.ensure_fts_index(conn, request.param)
+    yield conn, search_mode
+    conn.close()
+
+
+@pytest.mark.parametrize("fields", INDEXED_SEARCHES)
+def test_search_uses_indexes(database, fields):
+    conn, search_mode = database
+    conditions, values = search.build_search_conditions(
+        *fields, search_mode=search_mode)
+    query = search.build_search_query(conditions)
+    assert search.full_table_scans(conn, query, values) == []
+
+
+@pytest.mark.parametrize("name", INDEXED_AUTHORS)
+def test_author_listing_uses_indexes(database, name):
+    conn, _ = database
+    conditions, values = authors.by_author_conditions(name)
+    query = search.build_search_query(conditions)
+    assert search.full_table_scans(conn, query, values) == []
+
+
+def test_isbn_prefix_of_any_length_matches(database):
+    conn, search_mode = database
+    conn.execute(sql_queries.INSERT_RECORD,
+                 ("Title", "Author", 4.0, "978-0-439-78596-2"))
+    for isbn in ("978043978", "9780439785", "97804397859", "9780439785962"):
+        conditions, values = search.build_search_conditions(
+            "", "", "", isbn, search_mode)
+        query = search.build_search_query(conditions)
+        assert len(conn.execute(query, values).fetchall()) == 1
+    conn.rollback()
@@ -0,0 +1,142 @@
+"""Checks of the group commit of the query worker against a temporary
+database: a failed write task rolls back only its own savepoint, and the
+writes grouped in a transaction are committed and acknowledged together,
+or rolled back and reported together, whether the group is committed by
+a flush, by close() or not at all.
+"""
+import sqlite3
+import time
+import pytest
+from book_store import BookStore
+from query_worker import QueryWorker
+
+
+
+# Seconds to wait for the query worker before failing
+TIMEOUT = 5.0
+
+
+
+@pytest.fixture
+def database(tmp_path):
+    """Fixture returning the path of an empty book database."""
+    database = str(tmp_path / "books.db")
+    BookStore(database).close()
+    return database
+
+
+@pytest.fixture
+def worker(database):
+    """Fixture returning a query worker which only commits its writes when
+    flushed or closed, so that every write of a check joins one group.
+    """
+    worker = QueryWorker(lambda: BookStore(database), commit_interval=60)
+    yield worker
+    worker.close()
+
+
+def committed_titles(database):
+    """Function to return the titles committed to the database, read from
+    another connection, in ID order.
+    """
+    conn = sqlite3.connect(database)
+    try:
+        return [title for title, in conn.execute(
+            "SELECT Title FROM books ORDER BY ID")]
+    finally:
+        conn.close()
+
+
+def submit_add(worker, outcomes, title, fail=False):
+    """Function to submit a write task adding a record with the title, which
+    raises after adding it if fail is set. Its acknowledgement or error is
+    appended to outcomes.
+    """
+    def add(store):
+        store.add(title, "Frank Herbert", "4.0", "")
+        if fail:
+            raise ValueError(f"{title} failed")
+        return title
+
+    worker.submit(add, lambda title: outcomes.append(("added", title)),
+                  errback=lambda error: outcomes.append(("error", str(error))),
+                  write=True)
+
+
+def settle(worker):
+    """Function to wait until the query worker has run every task queued
+    and committed the pending writes, delivering their results.
+    """
+    done = []
+    worker.flush(done.append)
+    deadline = time.monotonic() + TIMEOUT
+    while not done:
+        assert time.monotonic() < deadline, "the query worker timed out"
+        time.sleep(0.005)
+        worker.deliver()
+
+
+def test_failed_write_rolls_back_only_its_own_savepoint(worker, database):
+    outcomes = []
+    submit_add(worker, outcomes, "Dune")
+    submit_add(worker, outcomes, "Dune Messiah", fail=True)
+    submit_add(worker, outcomes, "Children of Dune")
+    settle(worker)
+    assert outcomes == [("error", "Dune Messiah failed"),
+                        ("added", "Dune"), ("added", "Children of Dune")]
+    assert committed_titles(database) == ["Dune", "Children of Dune"]
+
+
+def test_grouped_writes_are_held_back_until_committed(worker, database):
+    outcomes = []
+    for title in ("Dune", "Dune Messiah"):
+        submit_add(worker, outcomes, title)
+    # A read task runs after the writes, in the same transaction
+    read = []
+    worker.submit(lambda store: store.fetch_page(), read.append)
+    deadline = time.monotonic() + TIMEOUT
+    while not read:
+        assert time.monotonic() < deadline, "the query worker timed out"
+        time.sleep(0.005)
+        worker.deliver()
+    assert [record[1] for record in read[0]] == ["Dune", "Dune Messiah"]
+    # Neither write is committed nor acknowledged before the group is
+    assert committed_titles(database) == []
+    assert outcomes == []
+    settle(worker)
+    assert committed_titles(database) == ["Dune", "Dune Messiah"]
+    assert outcomes == [("added", "Dune"), ("added", "Dune Messiah")]
+
+
+def test_failed_commit_rolls_back_every_grouped_write(worker, database):
+    def fail():
+        raise sqlite3.OperationalError("database or disk is full")
+
+    # The commit of the worker's own store fails once
+    commit = worker.store.commit
+    worker.store.commit = fail
+    outcomes = []
+    for title in ("Dune", "Dune Messiah"):
+        submit_add(worker, outcomes, title)
+    settle(worker)
+    assert outcomes == [("error", "database or disk is full")] * 2
+    assert committed_titles(database) == []
+
+    # Nothing of the failed group is committed with the next one
+    worker.store.commit = commit
+    submit_add(worker, outcomes, "Children of Dune")
+    settle(worker)
+    assert committed_titles(database) == ["Children of Dune"]
+
+
+def test_close_commits_the_pending_writes(database):
+    worker = QueryWorker(lambda: BookStore(database), commit_interval=60)
+    outcomes = []
+    for title in ("Dune", "Dune Messiah"):
+        submit_add(worker, outcomes, title)
+    submit_add(worker, outcomes, "Children of Dune", fail=True)
+    worker.close()
+    assert committed_titles(database) == ["Dune", "Dune Messiah"]
+    worker.deliver()
+    assert outcomes == [("error", "Children of Dune failed"),
+                        ("added", "Dune"), ("added", "Dune Messiah")]
@@ -0,0 +1,53 @@
+"""Checks that importing the application stays cheap: none of the heavy
+optional dependencies of the ingest paths is loaded, and the import fits
+in a time budget. Each check runs in a fresh interpreter, since modules
+already imported by the test run would otherwise be reused.
+"""
+import json
+import pathlib
+import subprocess
+import sys
+import pytest
+
+
+
+# Root of the repository, from which main is imported
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+# Modules only the ingest paths may load, never the application at startup
+HEAVY_MODULES = ["pandas", "numpy"]
+
+# Largest time in milliseconds that importing main may take, generous ...
+# ...enough for a slow machine (it takes well under 100 ms on a laptop)
+IMPORT_BUDGET_MS = 500
+
+# Script importing main in a fresh interpreter and reporting how long it ...
+# ...took and which of the heavy modules were loaded
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({"ms": elapsed,
+                  "loaded": [name for name in %r if name in sys.modules]}))
+"""
+
+
+
+@pytest.fixture(scope="module")
+def startup():
+    """Fixture returning the import time of main and the heavy modules it
+    loaded, as measured in a fresh interpreter.
+    """
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT % (HEAVY_MODULES,)],
+        cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_import_loads_no_heavy_modules(startup):
+    assert startup["loaded"] == []
+
+
+def test_import_fits_in_budget(startup):
+    assert startup["ms"] < IMPORT_BUDGET_MS